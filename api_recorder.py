@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+iKuai API 录制与回放
+录制模式把 call_api 的每次请求/响应和耗时追加到夹具文件（JSON Lines），
+回放模式从夹具文件中按请求取出响应，按录制时的耗时（或加速后）返回，
+用于在没有路由器的情况下离线、可重复地测试不同固件返回的数据格式
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_VERSION = 1
+
+
+def request_key(func_name: str, action: str, params: Optional[Dict]) -> str:
+    """请求的唯一键，参数按键排序后序列化"""
+    return f"{func_name}:{action}:{json.dumps(params or {}, sort_keys=True, ensure_ascii=False)}"
+
+
+class ApiRecorder:
+    def __init__(self, path: str, base_url: str = ""):
+        """
+        打开夹具文件用于录制（追加写入）
+
+        Args:
+            path: 夹具文件路径
+            base_url: 路由器地址，只写入文件头用于区分来源
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.records = 0
+        self.file = open(path, "a", encoding="utf-8")
+        self.write({"type": "meta", "version": FIXTURE_VERSION, "base_url": base_url, "recorded_at": self.started})
+        logger.info(f"录制iKuai API请求到: {path}")
+
+    def write(self, entry: Dict[str, Any]):
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def record(self, func_name: str, action: str, params: Optional[Dict], status: int,
+               response: Any, elapsed: float):
+        """
+        记录一次API调用
+
+        Args:
+            status: HTTP状态码
+            response: 解析后的响应（非JSON响应记录为None）
+            elapsed: 请求耗时（秒）
+        """
+        self.records += 1
+        self.write({
+            "type": "call",
+            "offset": round(time.time() - self.started, 6),
+            "func_name": func_name,
+            "action": action,
+            "params": params or {},
+            "status": status,
+            "elapsed": round(elapsed, 6),
+            "response": response
+        })
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class ReplayTransport:
+    def __init__(self, path: str, speed: float = 1.0):
+        """
+        加载夹具文件用于回放
+
+        Args:
+            path: 夹具文件路径
+            speed: 回放速度倍数，1为按录制耗时返回，0为不等待
+        """
+        self.path = path
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.meta: Dict[str, Any] = {}
+        self.calls: Dict[str, List[Dict[str, Any]]] = {}
+        self.cursors: Dict[str, int] = {}
+        self.misses = deque(maxlen=32)  # 夹具中没有的请求，便于排查
+        self.replayed = 0
+        self.load()
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"夹具文件第{line_number}行格式错误，已跳过")
+                    continue
+                if entry.get("type") == "meta":
+                    # 多次录制追加到同一文件时保留第一段的信息
+                    self.meta = self.meta or entry
+                elif entry.get("type") == "call":
+                    response = entry.get("response")
+                    # 会话过期的响应在录制时已由重新登录处理，回放时跳过
+                    if isinstance(response, dict) and response.get("Result") == 10014:
+                        continue
+                    key = request_key(entry["func_name"], entry["action"], entry.get("params"))
+                    self.calls.setdefault(key, []).append(entry)
+        logger.info(f"从 {self.path} 加载 {sum(len(c) for c in self.calls.values())} 条录制的API响应")
+
+    def call(self, func_name: str, action: str, params: Optional[Dict]) -> Optional[Dict]:
+        """
+        回放一次API调用，同一请求的多条录制按顺序循环返回
+
+        Returns:
+            Dict: 录制的响应，夹具中没有该请求或录制时失败返回None
+        """
+        key = request_key(func_name, action, params)
+        with self.lock:
+            entries = self.calls.get(key)
+            if not entries:
+                if key not in self.misses:
+                    self.misses.append(key)
+                    logger.warning(f"夹具中没有该请求的录制: {key}")
+                return None
+            cursor = self.cursors.get(key, 0)
+            self.cursors[key] = (cursor + 1) % len(entries)
+            self.replayed += 1
+        entry = entries[cursor]
+
+        if self.speed > 0 and entry.get("elapsed"):
+            time.sleep(entry["elapsed"] / self.speed)
+
+        response = entry.get("response")
+        if entry.get("status") != 200 or not isinstance(response, dict) or response.get("Result") != 30000:
+            return None
+        return response
+
+    def rewind(self):
+        """从头开始回放"""
+        with self.lock:
+            self.cursors.clear()
@@ -0,0 +1,1056 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+iKuai Komari Agent 性能基准测试
+不依赖真实路由器和Komari服务器，使用合成数据评估各项优化的效果
+
+用法:
+    python benchmark.py compression --samples 3600
+    python benchmark.py interfaces --counts 10 100 1000
+    python benchmark.py top-talkers --hosts 100 1000 10000
+    python benchmark.py replay --fixtures fixtures/*.jsonl
+    python benchmark.py fleet --agents 500
+    python benchmark.py snapshot --seconds 3
+    python benchmark.py fanout --slow-delay 0.5
+    python benchmark.py deadline --slow-api disk_mgmt --slow-delay 3
+    python benchmark.py keepalive --ping-interval 5 --ping-timeout 3
+    python benchmark.py coldstart --runs 5
+    python benchmark.py conntrack --entries 10000 100000 300000
+    python benchmark.py ledger --ticks 100000 --kills 20
+    python benchmark.py memory --routers 1 20 --budget-mb 48
+    python benchmark.py archive --samples 100000
+"""
+
+import argparse
+import gzip
+import ipaddress
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List
+from ws_compression import PerMessageDeflate, frame_size
+from iface_index import InterfaceIndex
+from top_talkers import TopTalkers
+from conntrack import count_stream, counts_from_data
+from traffic_ledger import TrafficLedger
+from sample_record import MonitoringSample, NAMES as SAMPLE_FIELDS
+from snapshot_export import FIELDS, SnapshotWriter, SnapshotReader
+from metrics_archive import ArchiveWriter, ArchiveReader, aggregate
+from jitter import basic_info_due, reconnect_delay, first_tick, tick_deadline
+
+
+def make_monitoring_samples(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """生成与format_monitoring_data结构一致的合成监控数据（随机游走）"""
+    rng = random.Random(seed)
+    cpu = 12.0
+    mem_used = 1.2 * 1024 ** 3
+    up, down = 200_000, 2_000_000
+    total_up, total_down = 50 * 1024 ** 3, 800 * 1024 ** 3
+    connections = 3000
+    uptime = 864000
+
+    samples = []
+    for _ in range(count):
+        cpu = min(max(cpu + rng.uniform(-2, 2), 0), 100)
+        mem_used = min(max(mem_used + rng.uniform(-5e6, 5e6), 0.5 * 1024 ** 3), 3.5 * 1024 ** 3)
+        up = max(int(up + rng.uniform(-50_000, 50_000)), 0)
+        down = max(int(down + rng.uniform(-500_000, 500_000)), 0)
+        total_up += up
+        total_down += down
+        connections = max(connections + rng.randint(-50, 50), 0)
+        uptime += 1
+
+        samples.append({
+            "cpu": {"usage": round(cpu, 2)},
+            "ram": {"total": 4 * 1024 ** 3, "used": int(mem_used)},
+            "swap": {"total": 0, "used": 0},
+            "load": {"load1": round(cpu / 100, 2), "load5": round(cpu / 100 * 0.8, 2), "load15": round(cpu / 100 * 0.6, 2)},
+            "disk": {"total": 64 * 1024 ** 3, "used": 12 * 1024 ** 3},
+            "network": {"up": int(up / 3), "down": int(down / 3), "totalUp": total_up, "totalDown": total_down},
+            "connections": {"tcp": connections, "udp": 0},
+            "uptime": uptime,
+            "process": 45,
+            "message": f"ikuai监控 - CPU: {cpu:.1f}%, 内存: {mem_used/1024/1024/1024:.1f}GB, 连接数: {connections}"
+        })
+    return samples
+
+
+def bench_compression(args):
+    """每个样本在线路上的字节数：未压缩 / permessage-deflate（有无上下文保持）/ gzip基础信息"""
+    messages = [json.dumps(sample) for sample in make_monitoring_samples(args.samples)]
+
+    plain = sum(frame_size(len(m.encode("utf-8"))) for m in messages)
+
+    results = {"未压缩": (plain, 0.0)}
+    for name, no_context in (("deflate(上下文保持)", False), ("deflate(无上下文保持)", True)):
+        deflate = PerMessageDeflate()
+        deflate.accept({"sec-websocket-extensions": "permessage-deflate" + ("; client_no_context_takeover" if no_context else "")})
+        started = time.perf_counter()
+        total = sum(frame_size(len(deflate.build_frame(m).data)) for m in messages)
+        results[name] = (total, time.perf_counter() - started)
+
+    print(f"样本数: {len(messages)}")
+    print(f"{'传输方式':<24}{'字节/样本':>12}{'压缩率':>10}{'CPU(us/样本)':>16}")
+    for name, (total, elapsed) in results.items():
+        print(f"{name:<24}{total / len(messages):>12.1f}{total / plain:>10.1%}{elapsed / len(messages) * 1e6:>16.1f}")
+
+    basic_info = {
+        "arch": "x86_64", "cpu_cores": 4, "cpu_name": "Intel(R) Celeron(R) J4125 CPU @ 2.00GHz",
+        "disk_total": 64 * 1024 ** 3, "gpu_name": "Unknown", "ipv4": "203.0.113.10", "ipv6": "",
+        "mem_total": 4 * 1024 ** 3, "os": "iKuai (3.7.15 x64 Build202409101144)", "kernel_version": "5.15.0",
+        "swap_total": 0, "version": "ikuai-agent-1.0.0", "virtualization": "None"
+    }
+    body = json.dumps(basic_info).encode("utf-8")
+    print(f"\nuploadBasicInfo 请求体: 未压缩 {len(body)} 字节, gzip {len(gzip.compress(body))} 字节")
+
+
+def make_iface_payload(count: int, rng: random.Random, wans: int = 1) -> bytes:
+    """
+    生成 monitor_iface 响应体：count-wans 个VLAN/PPPoE子接口 + wans 条WAN线路
+
+    WAN口放在列表末尾，对应原实现线性扫描的最坏情况
+    """
+    stream = []
+    for index in range(1, count - wans + 1):
+        stream.append({
+            "interface": f"vlan{index}", "ip_addr": f"10.{index // 250}.{index % 250}.1",
+            "comment": "", "parent_interface": "lan1", "updatetime": "1729300000",
+            "upload": rng.randint(0, 100_000), "download": rng.randint(0, 1_000_000),
+            "total_up": rng.randint(0, 10 ** 10), "total_down": rng.randint(0, 10 ** 11),
+            "connect_num": rng.randint(0, 500)
+        })
+    for line in range(wans):
+        stream.append({
+            "interface": f"wan{line + 1}", "ip_addr": f"203.0.113.{10 + line}", "comment": "", "parent_interface": "",
+            "updatetime": "1729300000", "upload": rng.randint(100_000, 500_000),
+            "download": rng.randint(1_000_000, 5_000_000), "total_up": 50 * 1024 ** 3,
+            "total_down": 800 * 1024 ** 3, "connect_num": rng.randint(2000, 4000)
+        })
+    check = [{"interface": i["interface"], "ip_addr": i["ip_addr"], "result": "success", "errmsg": ""} for i in stream]
+    return json.dumps({"Result": 30000, "ErrMsg": "Success", "Data": {"iface_check": check, "iface_stream": stream}}).encode("utf-8")
+
+
+def is_private_ip(ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(ip).is_private
+    except ValueError:
+        return False
+
+
+def legacy_interface_tick(body: bytes):
+    """原实现：公网IP和WAN口统计各自请求并完整解析一次响应，再线性扫描接口列表"""
+    public_ip = ""
+    data = json.loads(body)["Data"]
+    for iface in data.get("iface_check", []) + data.get("iface_stream", []):
+        ip_addr = iface.get("ip_addr", "")
+        if ip_addr and not is_private_ip(ip_addr):
+            public_ip = ip_addr
+            break
+
+    data = json.loads(body)["Data"]
+    wan = None
+    for iface in data.get("iface_stream", []):
+        if iface.get("interface", "").startswith("wan"):
+            wan = iface
+            break
+    if wan is None:
+        for iface in data.get("iface_stream", []):
+            ip_addr = iface.get("ip_addr", "")
+            if ip_addr and not is_private_ip(ip_addr):
+                wan = iface
+                break
+    stats = {key: wan.get(key, 0) for key in ("upload", "download", "total_up", "total_down", "connect_num")} if wan else None
+    return public_ip, stats
+
+
+def indexed_interface_tick(body: bytes, index: InterfaceIndex):
+    """新实现：每次采集解析一次响应并增量更新索引"""
+    index.update(json.loads(body)["Data"])
+    return index.public_ip, index.wan_stats()
+
+
+def bench_interfaces(args):
+    """不同接口数量下每次采集处理 monitor_iface 响应的耗时和索引占用的内存"""
+    rng = random.Random(1)
+    print(f"{'接口数':>8}{'响应大小':>12}{'原实现(us/次)':>16}{'索引(us/次)':>14}{'解析(us/次)':>14}{'索引内存':>12}")
+    for count in args.counts:
+        # 每次采集计数器都会变化，轮换几份响应体模拟连续采集
+        bodies = [make_iface_payload(count, rng, args.wans) for _ in range(4)]
+        rounds = max(args.rounds // count, 20)
+
+        # 单线路时两种实现的结果一致；多线路时原实现只统计第一条线路
+        # （lines、totals 是各线路的明细，原实现没有）
+        legacy_ip, legacy_stats = legacy_interface_tick(bodies[0])
+        indexed_ip, indexed_stats = indexed_interface_tick(bodies[0], InterfaceIndex())
+        assert legacy_ip == indexed_ip
+        assert len(indexed_stats["lines"]) == len(indexed_stats["totals"]) == args.wans
+        if args.wans == 1:
+            assert legacy_stats == {key: value for key, value in indexed_stats.items() if key not in ("lines", "totals")}
+
+        started = time.perf_counter()
+        for i in range(rounds):
+            legacy_interface_tick(bodies[i % 4])
+        legacy = (time.perf_counter() - started) / rounds
+
+        index = InterfaceIndex()
+        started = time.perf_counter()
+        for i in range(rounds):
+            indexed_interface_tick(bodies[i % 4], index)
+        indexed = (time.perf_counter() - started) / rounds
+
+        started = time.perf_counter()
+        for i in range(rounds):
+            json.loads(bodies[i % 4])
+        parse = (time.perf_counter() - started) / rounds
+
+        # 解析结果在更新后即被释放，常驻的只有索引本身
+        tracemalloc.start()
+        index = InterfaceIndex()
+        for body in bodies:
+            index.update(json.loads(body)["Data"])
+        index_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print(f"{count:>8}{len(bodies[0]) / 1024:>10.1f}KB{legacy * 1e6:>16.1f}{indexed * 1e6:>14.1f}"
+              f"{parse * 1e6:>14.1f}{index_memory / 1024:>10.1f}KB")
+
+
+def make_lan_hosts(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """生成 monitor_lanip 主机列表，速率为长尾分布"""
+    return [{
+        "ip_addr": f"192.168.{index // 250}.{index % 250 + 2}", "mac": f"02:00:00:{index // 65536:02x}:{index // 256 % 256:02x}:{index % 256:02x}",
+        "hostname": f"host-{index}", "comment": "",
+        "upload": int(rng.paretovariate(1.2) * 2000), "download": int(rng.paretovariate(1.2) * 20000),
+        "connect_num": rng.randint(0, 200)
+    } for index in range(count)]
+
+
+def bench_top_talkers(args):
+    """不同主机数量下堆排行与整表排序的耗时，以及排行常驻的内存"""
+    rng = random.Random(1)
+    print(f"{'主机数':>8}{'整表排序(us)':>16}{'堆排行(us)':>14}{'每主机(ns)':>14}{'排行内存':>12}")
+    for count in args.hosts:
+        hosts = make_lan_hosts(count, rng)
+        rounds = max(args.rounds // count, 5)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            sorted(hosts, key=lambda h: h["upload"], reverse=True)[:args.top]
+            sorted(hosts, key=lambda h: h["download"], reverse=True)[:args.top]
+        full_sort = (time.perf_counter() - started) / rounds
+
+        tracker = TopTalkers(args.top)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            tracker.update(hosts)
+        heap = (time.perf_counter() - started) / rounds
+
+        expected = [h["download"] for h in sorted(hosts, key=lambda h: h["download"], reverse=True)[:args.top]]
+        assert [rate for rate, _ in tracker.top_download] == [rate for rate in expected if rate > 0]
+
+        # 主机列表本身在每次刷新后释放，常驻的只有排行
+        tracemalloc.start()
+        tracker = TopTalkers(args.top)
+        tracker.update(hosts)
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print(f"{count:>8}{full_sort * 1e6:>16.1f}{heap * 1e6:>14.1f}{heap / count * 1e9:>14.0f}{retained:>10}B")
+    print(f"\n示例摘要: {tracker.summary()}")
+
+
+def bench_conntrack(args):
+    """连接跟踪响应整体解析与分块统计的耗时和内存峰值"""
+    from stub_servers import StubIkuaiServer
+    print(f"{'连接数':>8}{'响应大小':>10}{'整体解析(ms)':>14}{'峰值内存':>10}{'分块统计(ms)':>14}{'峰值内存':>10}"
+          f"{'每小时开销(s)':>14}")
+    for count in args.entries:
+        stub = StubIkuaiServer(conntrack=count)
+        body = json.dumps({"Result": 30000, "ErrMsg": "Success", "Data": stub.respond("conntrack", {})}).encode()
+        del stub
+
+        def chunks():
+            # 与 iter_content 一样每次产生一个新的数据块
+            for offset in range(0, len(body), args.chunk):
+                yield body[offset:offset + args.chunk]
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        expected = counts_from_data(json.loads(body)["Data"])
+        full = time.perf_counter() - started
+        full_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        counter = count_stream(chunks())
+        stream = time.perf_counter() - started
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert counter.counts() == expected and counter.result == 30000
+
+        hourly = stream * 3600 / args.interval
+        print(f"{count:>8}{len(body) / 1024 / 1024:>8.1f}MB{full * 1000:>14.1f}{full_peak / 1024 / 1024:>8.1f}MB"
+              f"{stream * 1000:>14.1f}{stream_peak / 1024:>8.0f}KB{hourly:>14.2f}")
+    print(f"\n每小时开销按每 {args.interval:g} 秒读取一次计算，两次读取之间按首页的总连接数估算TCP/UDP")
+    print(f"示例: {expected}")
+
+
+LEDGER_WRITER = """
+import sys, time
+from traffic_ledger import TrafficLedger
+ledger = TrafficLedger(sys.argv[1], flush_interval=0)
+up = 0
+while True:
+    up += 1000
+    ledger.update([("wan1", up, up * 10), ("wan2", up, up * 5)], int(time.time()))
+"""
+
+
+def bench_ledger(args):
+    """流量账本每次采集的开销、路由器重启时总流量是否单调，以及写入过程中被强制结束后文件是否完整"""
+    import logging
+    logging.getLogger("traffic_ledger").setLevel(logging.ERROR)
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        # 模拟双WAN线路运行，期间路由器重启若干次
+        # 写入文件的开销单独统计（默认每60秒一次）
+        ledger = TrafficLedger(os.path.join(directory, "ledger.json"), flush_interval=float("inf"))
+        reboot_at = set(rng.sample(range(1, args.ticks), args.reboots))
+        counters = {"wan1": [0, 0], "wan2": [0, 0]}
+        uptime, now, clock = 3600, time.time(), time.monotonic()
+        actual_up = actual_down = 0
+        reported, monotonic, update_time = [], True, 0.0
+        for tick in range(args.ticks):
+            if tick in reboot_at:
+                counters = {name: [0, 0] for name in counters}
+                uptime = 0
+            for name, values in counters.items():
+                up, down = rng.randint(0, 300_000), rng.randint(0, 3_000_000)
+                values[0] += up
+                values[1] += down
+                actual_up += up
+                actual_down += down
+            uptime += 1
+            now += 1
+            clock += 1
+            started = time.perf_counter()
+            ledger.update([(name, up, down) for name, (up, down) in counters.items()], uptime, now, clock)
+            update_time += time.perf_counter() - started
+            total_up = ledger.sums["total_up"]
+            if reported and total_up < reported[-1]:
+                monotonic = False
+            reported.append(total_up)
+        started = time.perf_counter()
+        for _ in range(20):
+            ledger.dirty = True
+            ledger.flush()
+        flush_time = (time.perf_counter() - started) / 20
+        router_total = sum(values[0] for values in counters.values())
+        print(f"{args.ticks} 次采集（约 {args.ticks / 86400:.1f} 天@1秒），路由器重启 {args.reboots} 次，检测到 {ledger.resets} 次")
+        print(f"  每次更新: {update_time / args.ticks * 1e6:.1f}us，写入文件: {flush_time * 1000:.2f}ms"
+              f"（{os.path.getsize(ledger.path)} 字节，含fsync）")
+        print(f"  账本总上传: {ledger.sums['total_up']}，实际: {actual_up}，路由器计数器: {router_total}")
+        print(f"  总流量单调递增: {'是' if monotonic else '否'}，与实际一致: "
+              f"{'是' if (ledger.sums['total_up'], ledger.sums['total_down']) == (actual_up, actual_down) else '否'}")
+
+        # 代理停机期间路由器重启，恢复时的运行时间已超过停机前
+        resumed = TrafficLedger(ledger.path, flush_interval=float("inf"))
+        downtime = uptime + 7200
+        rebooted = resumed.update([(name, 1000, 1000) for name in counters], uptime + 3600, now + downtime,
+                                  clock + downtime)
+        print(f"  停机 {downtime} 秒期间重启、恢复后运行时间 {uptime + 3600} 秒 > 停机前 {uptime} 秒: "
+              f"{'检测到重启' if rebooted else '未检测到重启'}")
+        # 本机时钟被校正（向前跳2小时），路由器没有重启
+        rebooted = resumed.update([(name, 2000, 2000) for name in counters], uptime + 3601, now + downtime + 7201,
+                                  clock + downtime + 1)
+        print(f"  本机时钟跳变7200秒、路由器未重启: {'误判为重启' if rebooted else '未误判'}")
+
+        # 写入过程中随机强制结束进程，检查账本文件始终可读
+        path = os.path.join(directory, "crash.json")
+        intact = 0
+        for _ in range(args.kills):
+            process = subprocess.Popen([sys.executable, "-c", LEDGER_WRITER, path],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+            time.sleep(0.3 + rng.random() * 0.3)
+            process.kill()
+            process.wait()
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    json.load(f)
+                intact += 1
+            except (OSError, ValueError):
+                pass
+        print(f"\n写入中强制结束 {args.kills} 次，账本文件完整 {intact} 次")
+
+
+def process_memory() -> Dict[str, int]:
+    """本进程的常驻内存（KB）、峰值和线程数（读取 /proc/self/status）"""
+    status = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.split()[0] if value.split() else "0"
+    return {"rss": int(status["VmRSS"]), "hwm": int(status["VmHWM"]), "threads": int(status["Threads"])}
+
+
+def memory_probe(ikuai_url: str, komari_url: str, routers: int, low_memory: bool, seconds: float, results):
+    """在独立进程中运行若干个代理（与多路由器部署的工作进程相同），返回内存占用"""
+    import gc
+    import logging
+    import threading
+    logging.disable(logging.CRITICAL)
+    from ikuai_komari_agent import IkuaiAgent
+    gc.collect()
+    base = process_memory()
+    agents = []
+    for index in range(routers):
+        agent = IkuaiAgent(
+            komari_config={"endpoint": komari_url, "token": f"memory-{index}", "websocket_interval": 1, "jitter": False},
+            ikuai_config={"base_url": ikuai_url, "username": "admin", "password": "admin", "low_memory": low_memory,
+                          "fetch_workers": 2 if low_memory else 4, "lan_hosts_interval": 5},
+            name=f"memory-{index}", configure_logging=False, watch_config=False, watchdog_config={"enabled": False}
+        )
+        threading.Thread(target=agent.start, daemon=True).start()
+        agents.append(agent)
+    time.sleep(seconds)
+    gc.collect()
+    if low_memory:
+        agents[0].release_memory()
+    results.put({"base": base, "final": process_memory(), "ticks": sum(agent.ticks_completed for agent in agents)})
+
+
+def bench_memory(args):
+    """默认模式和低内存模式下，代理进程的常驻内存和每台路由器增加的内存"""
+    from stub_servers import StubIkuaiServer, StubKomariServer
+    ikuai_server = StubIkuaiServer(interfaces=8, hosts=args.hosts).start()
+    komari_server = StubKomariServer().start()
+    # spawn 启动干净的进程，不继承本进程中模拟服务器的内存
+    context = multiprocessing.get_context("spawn")
+
+    print(f"每种情况运行 {args.seconds:g} 秒，局域网主机 {args.hosts} 台（每5秒读取一次排行）\n")
+    print(f"{'模式':<10}{'路由器':>6}{'启动后(MB)':>12}{'运行中(MB)':>12}{'峰值(MB)':>10}{'线程':>6}{'每台(KB)':>10}")
+    over_budget = []
+    for low_memory in (False, True):
+        label = "低内存" if low_memory else "默认"
+        previous = None
+        for routers in sorted(args.routers):
+            results = context.Queue()
+            process = context.Process(target=memory_probe, args=(ikuai_server.url, komari_server.url, routers,
+                                                                  low_memory, args.seconds, results))
+            process.start()
+            result = results.get(timeout=args.seconds + 60)
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+            base, final = result["base"], result["final"]
+            # 每台路由器的增量按相邻两种台数之差计算，1台时的数字还包含首次导入、连接池等一次性开销
+            per_router = None
+            if previous is not None:
+                per_router = (final["rss"] - previous[1]) / (routers - previous[0])
+            previous = (routers, final["rss"])
+            per_router_text = f"{per_router:.0f}" if per_router is not None else "-"
+            print(f"{label:<10}{routers:>6}{base['rss'] / 1024:>12.1f}{final['rss'] / 1024:>12.1f}"
+                  f"{final['hwm'] / 1024:>10.1f}{final['threads']:>6}{per_router_text:>10}")
+            if low_memory:
+                if args.budget_mb and final["rss"] / 1024 > args.budget_mb:
+                    over_budget.append(f"{routers}台路由器时常驻内存 {final['rss'] / 1024:.1f}MB 超过 {args.budget_mb:g}MB")
+                if args.budget_per_router_kb and per_router is not None and per_router > args.budget_per_router_kb:
+                    over_budget.append(f"{routers}台路由器时每台 {per_router:.0f}KB 超过 {args.budget_per_router_kb:g}KB")
+    ikuai_server.stop()
+    komari_server.stop()
+
+    # 每次采集生成上报JSON：扁平记录直接拼接 vs 嵌套字典再序列化
+    sample = MonitoringSample()
+    for index, name in enumerate(SAMPLE_FIELDS):
+        setattr(sample, name, index * 1_000_003 if index % 2 else index + 0.25)
+    sample.message = "ikuai监控 - CPU: 12.5%, 内存: 1.4GB, 连接数: 2380"
+    assert sample.to_json() == json.dumps(sample.to_dict())
+    rounds = 20000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        sample.to_json()
+    record_time = (time.perf_counter() - started) / rounds
+    started = time.perf_counter()
+    for _ in range(rounds):
+        json.dumps(sample.to_dict())
+    dict_time = (time.perf_counter() - started) / rounds
+    print(f"\n生成上报JSON: 记录直接拼接 {record_time * 1e6:.1f}us，嵌套字典+json.dumps {dict_time * 1e6:.1f}us")
+
+    if over_budget:
+        print("\n低内存模式超出内存预算:")
+        for line in over_budget:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\n低内存模式在预算内（常驻 ≤ {args.budget_mb:g}MB，每台路由器 ≤ {args.budget_per_router_kb:g}KB）")
+
+
+def bench_archive(args):
+    """归档每个样本的字节数（与原始JSON帧、gzip对比）、追加开销，以及全量/范围扫描和聚合的吞吐量"""
+    samples = make_monitoring_samples(args.samples)
+    rng = random.Random(2)
+    records, timestamps = [], []
+    now = time.time() - args.samples * args.interval
+    for data in samples:
+        sample = MonitoringSample()
+        for name, path in FIELDS:
+            value = data
+            for key in path:
+                value = value[key]
+            setattr(sample, name, value)
+        records.append(sample)
+        # 采集时刻有几毫秒到几十毫秒的抖动
+        now += args.interval + rng.uniform(-0.03, 0.03)
+        timestamps.append(now)
+
+    json_bytes = sum(len(json.dumps(data).encode("utf-8")) for data in samples)
+    gzip_bytes = len(gzip.compress("\n".join(json.dumps(data) for data in samples).encode("utf-8")))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "archive.ika")
+        writer = ArchiveWriter(path, flush_interval=args.flush_interval)
+        started = time.perf_counter()
+        for sample, ts in zip(records, timestamps):
+            writer.append(sample, ts)
+        append_time = (time.perf_counter() - started) / args.samples
+        writer.close()
+        archive_bytes = os.path.getsize(path)
+
+        reader = ArchiveReader(path)
+        started = time.perf_counter()
+        rows = list(reader.scan())
+        scan_time = time.perf_counter() - started
+        exact = len(rows) == len(records) and all(
+            round(ts * 1000) == int(expected * 1000) and values == [getattr(sample, name) for name in reader.fields]
+            for (ts, values), sample, expected in zip(rows, records, timestamps))
+
+        # 最近一天的范围扫描：只解码与范围相交的块
+        day_start = timestamps[-1] - 86400
+        started = time.perf_counter()
+        day_rows = sum(1 for _ in reader.scan(day_start, None, ["cpu_usage", "net_down"]))
+        range_time = time.perf_counter() - started
+
+        fields = ["cpu_usage", "ram_used", "net_down", "net_total_down"]
+        started = time.perf_counter()
+        hours = sum(1 for _ in aggregate(reader.scan(fields=fields), fields, 3600))
+        aggregate_time = time.perf_counter() - started
+        reader.close()
+
+    days = args.samples * args.interval / 86400
+    print(f"{args.samples} 个样本（每 {args.interval:g} 秒一个，约 {days:.1f} 天）")
+    print(f"{'存储方式':<20}{'字节/样本':>12}{'总大小':>14}")
+    for name, size in (("原始JSON帧", json_bytes), ("JSON Lines + gzip", gzip_bytes), ("归档（含块头/空余）", archive_bytes)):
+        print(f"{name:<20}{size / args.samples:>12.1f}{size / 1024 / 1024:>12.2f}MB")
+    print(f"  按此估算一年: {archive_bytes / days * 365 / 1024 / 1024:.1f}MB（每台路由器）")
+    print(f"\n追加: {append_time * 1e6:.1f}us/样本，写入文件约每 {args.flush_interval:g} 秒一次（一个块）")
+    print(f"全量扫描: {len(rows) / scan_time:,.0f} 样本/秒（{scan_time:.2f}秒），解码结果与原始数据一致: {'是' if exact else '否'}")
+    print(f"最近一天范围扫描: {day_rows} 个样本，{range_time * 1000:.1f}ms")
+    print(f"按小时聚合 {len(fields)} 个字段: {hours} 个区间，{aggregate_time:.2f}秒")
+    if not exact:
+        sys.exit(1)
+
+
+def validate_monitoring_data(data: Dict[str, Any]) -> List[str]:
+    """检查一次监控数据的结构和取值范围，返回发现的问题"""
+    problems = []
+    expected = {"cpu": ["usage"], "ram": ["total", "used"], "swap": ["total", "used"],
+                "load": ["load1", "load5", "load15"], "disk": ["total", "used"],
+                "network": ["up", "down", "totalUp", "totalDown"], "connections": ["tcp", "udp"]}
+    for section, keys in expected.items():
+        for key in keys:
+            value = data.get(section, {}).get(key)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                problems.append(f"{section}.{key} 类型错误: {value!r}")
+            elif value < 0:
+                problems.append(f"{section}.{key} 为负数: {value}")
+    if not problems:
+        if not 0 <= data["cpu"]["usage"] <= 100:
+            problems.append(f"cpu.usage 超出范围: {data['cpu']['usage']}")
+        if data["ram"]["used"] > data["ram"]["total"]:
+            problems.append("ram.used 大于 ram.total")
+        if data["disk"]["used"] > data["disk"]["total"]:
+            problems.append("disk.used 大于 disk.total")
+        if data["ram"]["total"] == 0:
+            problems.append("ram.total 为0（内存单位解析失败？）")
+    if not isinstance(data.get("uptime"), int) or data["uptime"] <= 0:
+        problems.append(f"uptime 异常: {data.get('uptime')!r}")
+    return problems
+
+
+def record_stub_fixture(path: str, ticks: int):
+    """没有提供夹具时，从本地模拟路由器录制一份"""
+    from ikuai_komari_agent import IkuaiAgent
+    from stub_servers import StubIkuaiServer
+
+    server = StubIkuaiServer(interfaces=8, wans=2).start()
+    agent = IkuaiAgent(
+        komari_config={"endpoint": "http://127.0.0.1:9", "token": "benchmark"},
+        ikuai_config={"base_url": server.url, "username": "admin", "password": "admin", "record_file": path},
+        configure_logging=False, watch_config=False, watchdog_config={"enabled": False}
+    )
+    agent.format_basic_info()
+    for _ in range(ticks):
+        agent.format_monitoring_data()
+    agent.ikuai_client.logout()
+    server.stop()
+
+
+def bench_replay(args):
+    """回放录制的iKuai API响应，离线测试 format_monitoring_data 的吞吐量和输出正确性"""
+    import logging
+    from ikuai_komari_agent import IkuaiAgent
+    logging.getLogger("ikuai_komari_agent").setLevel(logging.ERROR)
+    logging.getLogger("ikuai_client").setLevel(logging.ERROR)
+
+    fixtures = args.fixtures
+    if not fixtures:
+        handle, path = tempfile.mkstemp(prefix="ikuai-stub-", suffix=".jsonl")
+        os.close(handle)
+        record_stub_fixture(path, args.record_ticks)
+        fixtures = [path]
+        print(f"未指定夹具，已从本地模拟路由器录制: {path}\n")
+
+    print(f"{'夹具':<36}{'固件':<36}{'次/秒':>10}{'调用/次':>10}{'问题':>6}")
+    failed = False
+    for path in fixtures:
+        agent = IkuaiAgent(
+            komari_config={"endpoint": "http://127.0.0.1:9", "token": "benchmark"},
+            ikuai_config={"replay_file": path, "replay_speed": args.speed},
+            configure_logging=False, watch_config=False, watchdog_config={"enabled": False}
+        )
+        replay = agent.ikuai_client.replay
+        basic_info = agent.format_basic_info()
+
+        problems = {}
+        started = time.perf_counter()
+        replayed = replay.replayed
+        for _ in range(args.ticks):
+            for problem in validate_monitoring_data(agent.format_monitoring_data()):
+                problems[problem] = problems.get(problem, 0) + 1
+        elapsed = time.perf_counter() - started
+        calls = (replay.replayed - replayed) / args.ticks
+
+        failed = failed or bool(problems)
+        print(f"{os.path.basename(path)[:35]:<36}{basic_info['os'][:35]:<36}{args.ticks / elapsed:>10.0f}"
+              f"{calls:>10.1f}{len(problems):>6}")
+        for problem, count in problems.items():
+            print(f"    {problem}（{count}次）")
+        for key in replay.misses:
+            print(f"    夹具缺少请求: {key}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+def simulate_fleet(args, jitter: bool) -> Dict[str, List[float]]:
+    """
+    模拟整站同时重启后的请求时间点
+
+    所有代理在 [0, start_spread) 内启动，按各自令牌安排基础信息上报；
+    Komari在 restart_at 时重启，所有连接同时断开后重连
+
+    Returns:
+        Dict: 各类请求（基础信息/重连/数据帧）发生的时间列表
+    """
+    rng = random.Random(1)
+    interval = args.basic_info_interval
+    events = {"basic_info": [], "reconnect": [], "tick": []}
+    for index in range(args.agents):
+        token = f"token-{index:05d}"
+        now = rng.uniform(0, args.start_spread)
+
+        due = basic_info_due(now, interval, token, jitter, args.window, startup=True)
+        while due < args.duration:
+            events["basic_info"].append(due)
+            due = basic_info_due(due, interval, token, jitter, args.window)
+
+        events["reconnect"].append(args.restart_at + reconnect_delay(args.reconnect_delay, token, jitter, args.window))
+
+        # 采集时刻只模拟一分钟
+        tick = first_tick(now, args.tick_interval, token) if jitter else now
+        while tick < now + 60:
+            events["tick"].append(tick)
+            tick = tick_deadline(tick, args.tick_interval, token) if jitter else tick + args.tick_interval
+    return events
+
+
+def peak_rate(times: List[float], bucket: float) -> float:
+    """按bucket秒分桶后的峰值请求速率（次/秒）"""
+    counts = Counter(int(t // bucket) for t in times)
+    return max(counts.values()) / bucket if counts else 0
+
+
+def bench_fleet(args):
+    """整站重启和Komari重启时，错开前后服务端收到的请求峰值"""
+    plain = simulate_fleet(args, jitter=False)
+    jittered = simulate_fleet(args, jitter=True)
+
+    rows = [
+        ("基础信息上报", "basic_info", 1.0, args.agents / args.window),
+        ("WebSocket重连", "reconnect", 1.0, args.agents / args.window),
+        ("数据帧(TICK_PHASE)", "tick", 0.1, args.agents / args.tick_interval)
+    ]
+    print(f"代理数: {args.agents}, 启动时间差: {args.start_spread}秒, 分散窗口: {args.window}秒")
+    print(f"{'请求类型':<20}{'不错开峰值(次/秒)':>20}{'错开峰值(次/秒)':>18}{'理想均匀(次/秒)':>18}")
+    for name, key, bucket, ideal in rows:
+        print(f"{name:<20}{peak_rate(plain[key], bucket):>20.0f}{peak_rate(jittered[key], bucket):>18.0f}{ideal:>18.1f}")
+    print("\n理想均匀：启动上报和重连在分散窗口内完全均匀；数据帧按100ms分桶，为每秒帧数")
+
+
+def uniform_snapshot(value: float) -> Dict[str, Any]:
+    """所有字段都等于value的监控数据，读取方据此判断快照是否被撕裂"""
+    data = {}
+    for _, path in FIELDS:
+        node = data
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+    return data
+
+
+def snapshot_reader_process(path: str, seconds: float, results):
+    """在独立进程中持续读取快照并检查一致性"""
+    reader = SnapshotReader(path)
+    reads = torn = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        snapshot = reader.read()
+        if snapshot is None:
+            continue
+        reads += 1
+        if len(set(snapshot["values"].values())) != 1:
+            torn += 1
+    results.put((reads, torn, reader.retries))
+
+
+def bench_snapshot(args):
+    """共享内存快照的写入/读取耗时，以及多个读取进程并发读取时的一致性"""
+    handle, path = tempfile.mkstemp(prefix="ikuai-snapshot-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    os.close(handle)
+    writer = SnapshotWriter(path)
+    reader = SnapshotReader(path)
+
+    data = make_monitoring_samples(1)[0]
+    rounds = 100000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        writer.publish(data)
+    publish = (time.perf_counter() - started) / rounds
+    started = time.perf_counter()
+    for _ in range(rounds):
+        reader.read()
+    read = (time.perf_counter() - started) / rounds
+    print(f"快照文件: {path} ({os.path.getsize(path)} 字节, {len(FIELDS)} 个字段)")
+    print(f"写入: {publish * 1e6:.2f} us/次, 读取: {read * 1e6:.2f} us/次")
+
+    # 写入方不停写入所有字段相同的快照，读取方检查是否读到新旧混合的值
+    writer.publish(uniform_snapshot(0.0))
+    results = multiprocessing.Queue()
+    readers = [multiprocessing.Process(target=snapshot_reader_process, args=(path, args.seconds, results))
+               for _ in range(args.readers)]
+    for process in readers:
+        process.start()
+    writes = 0
+    deadline = time.time() + args.seconds
+    while time.time() < deadline:
+        writes += 1
+        writer.publish(uniform_snapshot(float(writes)))
+    totals = [results.get() for _ in readers]
+    for process in readers:
+        process.join()
+
+    print(f"并发 {args.seconds:g} 秒: 写入 {writes} 次, {args.readers} 个读取进程共读取 {sum(r[0] for r in totals)} 次, "
+          f"重试 {sum(r[2] for r in totals)} 次, 不一致 {sum(r[1] for r in totals)} 次")
+    reader.close()
+    writer.close()
+    os.remove(path)
+
+
+def bench_fanout(args):
+    """同时上报到一个正常和一个慢速Komari服务端，检查慢速服务端是否拖慢采集和正常服务端"""
+    import logging
+    import threading
+    from ikuai_komari_agent import IkuaiAgent
+    from stub_servers import StubIkuaiServer, StubKomariServer
+    logging.getLogger("komari_link").setLevel(logging.ERROR)
+
+    ikuai_server = StubIkuaiServer(interfaces=8).start()
+    fast = StubKomariServer().start()
+    slow = StubKomariServer(delay=args.slow_delay).start()
+    agent = IkuaiAgent(
+        komari_config={"endpoint": fast.url, "token": "fanout-primary", "mirrors": [(slow.url, "fanout-mirror")],
+                       "websocket_interval": args.interval, "jitter": False},
+        ikuai_config={"base_url": ikuai_server.url, "username": "admin", "password": "admin"},
+        configure_logging=False, watch_config=False, watchdog_config={"enabled": False}
+    )
+    threading.Thread(target=agent.start, daemon=True).start()
+
+    # 等两条连接都建立后再计时
+    deadline = time.time() + 10
+    while not agent.ws_connected and time.time() < deadline:
+        time.sleep(0.05)
+    ticks, fast_frames, slow_frames = agent.ticks_completed, fast.frames, slow.frames
+    longest = 0.0
+    deadline = time.time() + args.duration
+    while time.time() < deadline:
+        longest = max(longest, agent.last_tick_duration)
+        time.sleep(args.interval / 4)
+    ticks = agent.ticks_completed - ticks
+    fast_frames, slow_frames = fast.frames - fast_frames, slow.frames - slow_frames
+    links = agent.get_stats()["links"]
+    agent.stop()
+    for server in (ikuai_server, fast, slow):
+        server.stop()
+
+    print(f"{args.duration:g} 秒内采集 {ticks} 次（间隔 {args.interval:g} 秒），最长一次采集 {longest * 1000:.1f} ms")
+    print(f"{'服务端':<12}{'收到帧数':>10}{'替换丢弃':>10}{'基础信息':>10}")
+    for label, server, link in (("正常", fast, links[0]), (f"慢速({args.slow_delay:g}s/帧)", slow, links[1])):
+        frames = fast_frames if server is fast else slow_frames
+        print(f"{label:<12}{frames:>10}{link['dropped']:>10}{server.basic_info_uploads:>10}")
+
+
+def bench_deadline(args):
+    """某个路由器接口很慢时，对比不限时依次采集和按截止时间并行采集的上报间隔"""
+    import logging
+    import threading
+    from ikuai_komari_agent import IkuaiAgent
+    from stub_servers import StubIkuaiServer, StubKomariServer
+    logging.getLogger("ikuai_komari_agent").setLevel(logging.ERROR)
+
+    print(f"{args.slow_api} 每次延迟 {args.slow_delay:g} 秒，上报间隔 {args.interval:g} 秒，各运行 {args.duration:g} 秒\n")
+    print(f"{'模式':<16}{'采集次数':>10}{'收到帧数':>10}{'最长采集(ms)':>14}  超时次数")
+    for label, ratio in (("依次采集(不限时)", 0), (f"截止时间({args.deadline * 100:.0f}%间隔)", args.deadline)):
+        ikuai_server = StubIkuaiServer(interfaces=8, slow={args.slow_api: args.slow_delay}).start()
+        komari_server = StubKomariServer().start()
+        agent = IkuaiAgent(
+            komari_config={"endpoint": komari_server.url, "token": "deadline", "websocket_interval": args.interval,
+                           "jitter": False},
+            ikuai_config={"base_url": ikuai_server.url, "username": "admin", "password": "admin",
+                          "fetch_deadline": ratio},
+            configure_logging=False, watch_config=False, watchdog_config={"enabled": False}
+        )
+        threading.Thread(target=agent.start, daemon=True).start()
+        deadline = time.time() + 10
+        while not agent.ws_connected and time.time() < deadline:
+            time.sleep(0.05)
+
+        ticks, frames = agent.ticks_completed, komari_server.frames
+        longest = 0.0
+        deadline = time.time() + args.duration
+        while time.time() < deadline:
+            longest = max(longest, agent.last_tick_duration)
+            time.sleep(0.05)
+        ticks, frames = agent.ticks_completed - ticks, komari_server.frames - frames
+        misses = agent.fetcher.get_stats()["misses"]
+        agent.stop()
+        ikuai_server.stop()
+        komari_server.stop()
+        print(f"{label:<16}{ticks:>10}{frames:>10}{longest * 1000:>14.0f}  {misses or '-'}")
+
+
+def bench_keepalive(args):
+    """模拟半开连接（服务端不再读取也不回应），对比不发送ping和启用ping时发现断线并重连的时间"""
+    import logging
+    import threading
+    from ikuai_komari_agent import IkuaiAgent
+    from stub_servers import StubIkuaiServer, StubKomariServer
+    logging.getLogger("komari_link").setLevel(logging.CRITICAL)
+
+    print(f"{'模式':<24}{'发现断线(s)':>12}{'距最后存活(s)':>14}{'重连完成(s)':>12}{'断线期间采集':>12}")
+    for label, ping_interval in (("不发送ping", 0), (f"ping {args.ping_interval:g}s/超时 {args.ping_timeout:g}s", args.ping_interval)):
+        ikuai_server = StubIkuaiServer().start()
+        komari_server = StubKomariServer().start()
+        agent = IkuaiAgent(
+            komari_config={"endpoint": komari_server.url, "token": "keepalive", "websocket_interval": args.interval,
+                           "jitter": False, "reconnect_delay": 0.5, "ping_interval": ping_interval,
+                           "ping_timeout": args.ping_timeout, "send_timeout": args.send_timeout},
+            ikuai_config={"base_url": ikuai_server.url, "username": "admin", "password": "admin"},
+            configure_logging=False, watch_config=False, watchdog_config={"enabled": False}
+        )
+        threading.Thread(target=agent.start, daemon=True).start()
+        deadline = time.time() + 10
+        while not agent.ws_connected and time.time() < deadline:
+            time.sleep(0.05)
+        link = agent.links[0]
+        time.sleep(args.interval * 2)
+
+        komari_server.freeze_connections()
+        frozen_at = time.time()
+        ticks = agent.ticks_completed
+        detected = reconnected = None
+        while time.time() - frozen_at < args.timeout:
+            if detected is None and link.disconnects:
+                detected = time.time() - frozen_at
+            if detected is not None and link.connected:
+                reconnected = time.time() - frozen_at
+                break
+            time.sleep(0.05)
+        ticks = agent.ticks_completed - ticks
+        agent.stop()
+        ikuai_server.stop()
+        komari_server.stop()
+
+        def seconds(value):
+            return f"{value:.1f}" if value is not None else f">{args.timeout:g}"
+        print(f"{label:<24}{seconds(detected):>12}{seconds(link.last_detect_seconds):>14}{seconds(reconnected):>12}{ticks:>12}")
+
+
+def bench_coldstart(args):
+    """从启动代理进程到Komari收到第一帧数据、第一次基础信息上报的时间"""
+    from stub_servers import StubIkuaiServer, StubKomariServer
+
+    agent_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ikuai_komari_agent.py")
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import ikuai_komari_agent"], cwd=os.path.dirname(agent_path), check=True)
+    print(f"导入 ikuai_komari_agent（含解释器启动）: {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(f"模拟路由器每次API调用延迟 {args.delay * 1000:.0f} ms，每种模式运行 {args.runs} 次取中位数\n")
+
+    print(f"{'模式':<20}{'第一帧(ms)':>12}{'基础信息(ms)':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, jitter in (("KOMARI_JITTER=False", "False"), ("KOMARI_JITTER=True", "True")):
+            first_frames, basic_infos = [], []
+            for _ in range(args.runs):
+                ikuai_server = StubIkuaiServer(interfaces=8, delay=args.delay).start()
+                komari_server = StubKomariServer().start()
+                basic_info_time = []
+                on_post = komari_server.basic_info_uploads
+                env = dict(os.environ, IKUAI_BASE_URL=ikuai_server.url, KOMARI_ENDPOINT=komari_server.url,
+                           KOMARI_TOKEN="coldstart", KOMARI_JITTER=jitter, LOG_LEVEL="ERROR",
+                           LOG_FILE=os.path.join(workdir, "agent.log"), CONFIG_FILE="", WATCHDOG_HEALTH_FILE="",
+                           EXPORT_SNAPSHOT_FILE="", TRAFFIC_LEDGER_FILE="")
+                process_started = time.time()
+                process = subprocess.Popen([sys.executable, agent_path], env=env, cwd=workdir,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                deadline = time.time() + args.timeout
+                while time.time() < deadline:
+                    if not basic_info_time and komari_server.basic_info_uploads > on_post:
+                        basic_info_time.append(time.time())
+                    if komari_server.first_frame_time and basic_info_time:
+                        break
+                    time.sleep(0.005)
+                process.terminate()
+                process.wait(timeout=10)
+                ikuai_server.stop()
+                komari_server.stop()
+                if komari_server.first_frame_time:
+                    first_frames.append(komari_server.first_frame_time - process_started)
+                if basic_info_time:
+                    basic_infos.append(basic_info_time[0] - process_started)
+
+            def median_ms(values):
+                return f"{statistics.median(values) * 1000:.0f}" if values else f">{args.timeout * 1000:.0f}"
+            print(f"{label:<20}{median_ms(first_frames):>12}{median_ms(basic_infos):>14}")
+    print("\n启用jitter时基础信息按令牌延后 [0, KOMARI_JITTER_WINDOW) 秒上报")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='iKuai Komari Agent 性能基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compression = subparsers.add_parser('compression', help='WebSocket/上报压缩效果')
+    compression.add_argument('--samples', type=int, default=3600, help='样本数量（默认1小时@1秒）')
+    compression.set_defaults(func=bench_compression)
+
+    interfaces = subparsers.add_parser('interfaces', help='monitor_iface 响应解析与接口索引')
+    interfaces.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000], help='接口数量')
+    interfaces.add_argument('--rounds', type=int, default=200000, help='总迭代量（按接口数折算每档的次数）')
+    interfaces.add_argument('--wans', type=int, default=1, help='其中WAN线路的数量')
+    interfaces.set_defaults(func=bench_interfaces)
+
+    top_talkers = subparsers.add_parser('top-talkers', help='局域网主机流量排行')
+    top_talkers.add_argument('--hosts', type=int, nargs='+', default=[100, 1000, 10000], help='主机数量')
+    top_talkers.add_argument('--top', type=int, default=3, help='排行保留的主机数量')
+    top_talkers.add_argument('--rounds', type=int, default=2000000, help='总迭代量（按主机数折算每档的次数）')
+    top_talkers.set_defaults(func=bench_top_talkers)
+
+    replay = subparsers.add_parser('replay', help='回放录制的iKuai API响应测试 format_monitoring_data')
+    replay.add_argument('--fixtures', nargs='*', default=[], help='夹具文件（IKUAI_RECORD_FILE录制），不指定时从模拟路由器录制')
+    replay.add_argument('--ticks', type=int, default=1000, help='每个夹具回放的采集次数')
+    replay.add_argument('--speed', type=float, default=0, help='回放速度倍数（1为录制时的速度，0为不等待）')
+    replay.add_argument('--record-ticks', type=int, default=20, help='从模拟路由器录制的采集次数')
+    replay.set_defaults(func=bench_replay)
+
+    fleet = subparsers.add_parser('fleet', help='多代理请求错开（jitter）效果模拟')
+    fleet.add_argument('--agents', type=int, default=500, help='代理数量')
+    fleet.add_argument('--duration', type=float, default=7200, help='模拟时长（秒）')
+    fleet.add_argument('--start-spread', type=float, default=0.5, help='各容器启动时间的差异（秒）')
+    fleet.add_argument('--basic-info-interval', type=float, default=300, help='基础信息上报间隔（秒）')
+    fleet.add_argument('--reconnect-delay', type=float, default=5, help='重连等待（秒）')
+    fleet.add_argument('--window', type=float, default=10, help='分散窗口（秒）')
+    fleet.add_argument('--tick-interval', type=float, default=1.0, help='采集间隔（秒）')
+    fleet.add_argument('--restart-at', type=float, default=3600, help='Komari重启的时间点（秒）')
+    fleet.set_defaults(func=bench_fleet)
+
+    snapshot = subparsers.add_parser('snapshot', help='共享内存监控快照')
+    snapshot.add_argument('--seconds', type=float, default=3, help='并发读写的时长（秒）')
+    snapshot.add_argument('--readers', type=int, default=2, help='读取进程数量')
+    snapshot.set_defaults(func=bench_snapshot)
+
+    fanout = subparsers.add_parser('fanout', help='同时上报到多个Komari服务端')
+    fanout.add_argument('--duration', type=float, default=5, help='运行时长（秒）')
+    fanout.add_argument('--interval', type=float, default=0.1, help='上报间隔（秒）')
+    fanout.add_argument('--slow-delay', type=float, default=0.5, help='慢速服务端每帧的处理延迟（秒）')
+    fanout.set_defaults(func=bench_fanout)
+
+    deadline = subparsers.add_parser('deadline', help='慢速路由器接口下按截止时间采集')
+    deadline.add_argument('--duration', type=float, default=10, help='每种模式的运行时长（秒）')
+    deadline.add_argument('--interval', type=float, default=1.0, help='上报间隔（秒）')
+    deadline.add_argument('--deadline', type=float, default=0.8, help='截止时间占上报间隔的比例')
+    deadline.add_argument('--slow-api', default='disk_mgmt', help='变慢的接口（func_name）')
+    deadline.add_argument('--slow-delay', type=float, default=3, help='该接口每次的延迟（秒）')
+    deadline.set_defaults(func=bench_deadline)
+
+    keepalive = subparsers.add_parser('keepalive', help='WebSocket半开连接的发现时间')
+    keepalive.add_argument('--interval', type=float, default=1.0, help='上报间隔（秒）')
+    keepalive.add_argument('--ping-interval', type=float, default=5, help='ping间隔（秒）')
+    keepalive.add_argument('--ping-timeout', type=float, default=3, help='等待pong的时间（秒）')
+    keepalive.add_argument('--send-timeout', type=float, default=5, help='发送阻塞超时（秒）')
+    keepalive.add_argument('--timeout', type=float, default=30, help='每种模式最多等待的时间（秒）')
+    keepalive.set_defaults(func=bench_keepalive)
+
+    coldstart = subparsers.add_parser('coldstart', help='启动到第一帧数据的时间')
+    coldstart.add_argument('--runs', type=int, default=5, help='每种模式运行的次数')
+    coldstart.add_argument('--delay', type=float, default=0.05, help='模拟路由器每次API调用的延迟（秒）')
+    coldstart.add_argument('--timeout', type=float, default=15, help='每次最多等待的时间（秒）')
+    coldstart.set_defaults(func=bench_coldstart)
+
+    conntrack = subparsers.add_parser('conntrack', help='连接跟踪表TCP/UDP统计')
+    conntrack.add_argument('--entries', type=int, nargs='+', default=[10000, 100000, 300000], help='连接跟踪条目数量')
+    conntrack.add_argument('--chunk', type=int, default=65536, help='分块下载的块大小（字节）')
+    conntrack.add_argument('--interval', type=float, default=60, help='读取间隔（秒），用于估算每小时开销')
+    conntrack.set_defaults(func=bench_conntrack)
+
+    ledger = subparsers.add_parser('ledger', help='流量累计账本')
+    ledger.add_argument('--ticks', type=int, default=100000, help='模拟的采集次数')
+    ledger.add_argument('--reboots', type=int, default=3, help='期间路由器重启的次数')
+    ledger.add_argument('--kills', type=int, default=20, help='写入过程中强制结束进程的次数')
+    ledger.set_defaults(func=bench_ledger)
+
+    memory = subparsers.add_parser('memory', help='常驻内存与低内存模式（超出预算时返回1）')
+    memory.add_argument('--routers', type=int, nargs='+', default=[1, 20], help='同一进程中运行的路由器数量')
+    memory.add_argument('--seconds', type=float, default=15, help='每种情况的运行时长（秒）')
+    memory.add_argument('--hosts', type=int, default=500, help='模拟的局域网主机数量')
+    memory.add_argument('--budget-mb', type=float, default=48, help='低内存模式的常驻内存预算（MB，0为不检查）')
+    memory.add_argument('--budget-per-router-kb', type=float, default=400, help='低内存模式每台路由器的内存预算（KB，0为不检查）')
+    memory.set_defaults(func=bench_memory)
+
+    archive = subparsers.add_parser('archive', help='监控数据长期归档')
+    archive.add_argument('--samples', type=int, default=100000, help='样本数量')
+    archive.add_argument('--interval', type=float, default=10, help='样本间隔（秒）')
+    archive.add_argument('--flush-interval', type=float, default=60, help='写入文件的间隔（秒）')
+    archive.set_defaults(func=bench_archive)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,212 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-iKuai连接配置信息
-支持环境变量配置
-"""
-
-import os
-
-def str_to_bool(value):
-    """将字符串转换为布尔值"""
-    if isinstance(value, bool):
-        return value
-    if isinstance(value, str):
-        return value.lower() in ('true', '1', 'yes', 'on')
-    return False
-
-# iKuai路由器配置
-IKUAI_CONFIG = {
-    "base_url": os.environ.get("IKUAI_BASE_URL", "http://192.168.1.1"),
-    "username": os.environ.get("IKUAI_USERNAME", "admin"),
-    "password": os.environ.get("IKUAI_PASSWORD", "admin"),
-    "timeout": int(os.environ.get("IKUAI_TIMEOUT", "10"))
-}
-
-# Komari服务器配置
-KOMARI_CONFIG = {
-    "endpoint": os.environ.get("KOMARI_ENDPOINT", "https://komari.server.com"),
-    "token": os.environ.get("KOMARI_TOKEN", "your_token_here"),
-    "websocket_interval": float(os.environ.get("KOMARI_WEBSOCKET_INTERVAL", "1.0")), # 监控数据上报间隔（默认 1.0秒）
-    "basic_info_interval": int(os.environ.get("KOMARI_BASIC_INFO_INTERVAL", "5")),  # 基础信息上报间隔（默认 5分钟）
-    "ignore_unsafe_cert": str_to_bool(os.environ.get("KOMARI_IGNORE_UNSAFE_CERT", "False")) # 忽略不安全的 SSL 证书
-}
-
-# 日志配置
-LOGGING_CONFIG = {
-    "level": os.environ.get("LOG_LEVEL", "WARNING"),  # 日志级别
-    "file": os.environ.get("LOG_FILE", "ikuai_agent.log"),
-    "max_bytes": int(os.environ.get("LOG_MAX_BYTES", "10485760")),  # 10MB
-    "backup_count": int(os.environ.get("LOG_BACKUP_COUNT", "3"))  # 备份文件数量
-} 
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+iKuai连接配置信息
+支持环境变量配置，也可以通过CONFIG_FILE指定配置文件（KEY=VALUE格式，与环境变量同名），
+配置文件中的值优先，修改后可以在运行中重新加载
+"""
+
+import os
+
+def str_to_bool(value):
+    """将字符串转换为布尔值"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes', 'on')
+    return False
+
+
+def parse_endpoints(value) -> list:
+    """
+    解析额外的Komari服务端列表
+
+    Args:
+        value: "地址|令牌" 以逗号或换行分隔的字符串，或JSON清单中的
+               [{"endpoint": ..., "token": ...}] / ["地址|令牌"] / [(地址, 令牌)] 列表
+
+    Returns:
+        list: [(地址, 令牌), ...]
+    """
+    if isinstance(value, str):
+        value = value.replace("\n", ",").split(",")
+    endpoints = []
+    for item in value or ():
+        if isinstance(item, dict):
+            endpoint, token = item.get("endpoint", ""), item.get("token", "")
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            endpoint, token = item
+        else:
+            endpoint, _, token = str(item).strip().partition("|")
+        endpoint, token = endpoint.strip().rstrip("/"), token.strip()
+        if endpoint and token:
+            endpoints.append((endpoint, token))
+    return endpoints
+
+
+def build_ikuai_config(env=os.environ) -> dict:
+    """iKuai路由器配置"""
+    low_memory = str_to_bool(env.get("LOW_MEMORY", "False"))
+    return {
+        "base_url": env.get("IKUAI_BASE_URL", "http://192.168.1.1"),
+        "username": env.get("IKUAI_USERNAME", "admin"),
+        "password": env.get("IKUAI_PASSWORD", "admin"),
+        "timeout": int(env.get("IKUAI_TIMEOUT", "10")),
+        "fetch_deadline": float(env.get("IKUAI_FETCH_DEADLINE", "0.8")),  # 每次采集等待各数据源的时间占上报间隔的比例（0表示不限时、依次采集）
+        "fetch_workers": int(env.get("IKUAI_FETCH_WORKERS", "2" if low_memory else "4")),  # 并行请求数据源的线程数
+        "low_memory": low_memory,  # 低内存模式：减少线程、只保留用到的响应字段、定期把空闲内存归还系统
+        "conntrack_interval": float(env.get("IKUAI_CONNTRACK_INTERVAL", "0")),  # 读取连接跟踪表统计TCP/UDP比例的间隔（秒，0表示不读取、全部计为TCP；固件接口未确认，默认关闭）
+        "conntrack_limit": int(env.get("IKUAI_CONNTRACK_LIMIT", "0")),  # 每次最多读取的连接数（0表示不限制）
+        "lan_hosts_interval": float(env.get("IKUAI_LAN_HOSTS_INTERVAL", "0")),  # 局域网主机流量排行的采集间隔（秒，0表示不采集）
+        "lan_hosts_limit": int(env.get("IKUAI_LAN_HOSTS_LIMIT", "5000")),  # 每次最多读取的主机数量
+        "top_hosts": int(env.get("IKUAI_TOP_HOSTS", "3")),  # 上报中列出的上传/下载速率最高的主机数量
+        "record_file": env.get("IKUAI_RECORD_FILE", ""),  # 录制API请求/响应的夹具文件（用于离线测试）
+        "replay_file": env.get("IKUAI_REPLAY_FILE", ""),  # 回放夹具文件代替真实路由器
+        "replay_speed": float(env.get("IKUAI_REPLAY_SPEED", "1"))  # 回放速度倍数（0为不等待）
+    }
+
+
+def build_komari_config(env=os.environ) -> dict:
+    """Komari服务器配置"""
+    return {
+        "endpoint": env.get("KOMARI_ENDPOINT", "https://komari.server.com"),
+        "token": env.get("KOMARI_TOKEN", "your_token_here"),
+        "mirrors": parse_endpoints(env.get("KOMARI_MIRRORS", "")),  # 同时上报的其他Komari服务端（"地址|令牌"，逗号分隔）
+        "websocket_interval": float(env.get("KOMARI_WEBSOCKET_INTERVAL", "1.0")), # 监控数据上报间隔（默认 1.0秒）
+        "basic_info_interval": int(env.get("KOMARI_BASIC_INFO_INTERVAL", "5")),  # 基础信息上报间隔（默认 5分钟）
+        "ignore_unsafe_cert": str_to_bool(env.get("KOMARI_IGNORE_UNSAFE_CERT", "False")), # 忽略不安全的 SSL 证书
+        "remote_control": str_to_bool(env.get("KOMARI_REMOTE_CONTROL", "True")),  # 是否响应服务端下发的调速/暂停指令
+        "min_interval": float(env.get("KOMARI_MIN_INTERVAL", "0.5")),  # 服务端可设置的最小上报间隔（秒）
+        "max_interval": float(env.get("KOMARI_MAX_INTERVAL", "300")),  # 服务端可设置的最大上报间隔（秒）
+        "ws_compression": str_to_bool(env.get("KOMARI_WS_COMPRESSION", "False")),  # WebSocket permessage-deflate 压缩
+        "gzip_upload": str_to_bool(env.get("KOMARI_GZIP_UPLOAD", "False")),  # 基础信息上报使用 gzip 请求体
+        "reconnect_delay": float(env.get("KOMARI_RECONNECT_DELAY", "5")),  # WebSocket断开后的重连等待时间（秒）
+        "ping_interval": float(env.get("KOMARI_PING_INTERVAL", "5")),  # WebSocket ping间隔（秒，0表示不发送）
+        "ping_timeout": float(env.get("KOMARI_PING_TIMEOUT", "3")),  # 等待pong的时间（秒），超时判定连接已断开
+        "send_timeout": float(env.get("KOMARI_SEND_TIMEOUT", "5")),  # 单条数据发送阻塞超过该时间（秒）判定连接已断开
+        "jitter": str_to_bool(env.get("KOMARI_JITTER", "True")),  # 按令牌错开启动上报、定期上报和重连的时间
+        "jitter_window": float(env.get("KOMARI_JITTER_WINDOW", "10")),  # 启动上报和重连的分散窗口（秒）
+        "tick_phase": str_to_bool(env.get("KOMARI_TICK_PHASE", "False"))  # 按令牌错开每次采集在间隔内的时刻
+    }
+
+
+def build_fleet_config(env=os.environ) -> dict:
+    """多路由器部署配置（fleet_supervisor.py）"""
+    return {
+        "inventory": env.get("FLEET_INVENTORY", "fleet.json"),  # 路由器清单文件
+        "workers": int(env.get("FLEET_WORKERS", "0")),  # 工作进程数（0表示按CPU核数）
+        "stats_interval": float(env.get("FLEET_STATS_INTERVAL", "10")),  # 工作进程上报统计的间隔（秒）
+        "max_restarts": int(env.get("FLEET_MAX_RESTARTS", "5")),  # 时间窗口内允许的工作进程重启次数
+        "restart_window": float(env.get("FLEET_RESTART_WINDOW", "300")),  # 重启次数统计窗口（秒）
+        "stats_file": env.get("FLEET_STATS_FILE", "")  # 汇总统计输出文件（为空则只写日志）
+    }
+
+
+def build_watchdog_config(env=os.environ) -> dict:
+    """采集线程看门狗配置"""
+    return {
+        "enabled": str_to_bool(env.get("WATCHDOG_ENABLED", "True")),
+        "check_interval": float(env.get("WATCHDOG_CHECK_INTERVAL", "5")),  # 检查间隔（秒）
+        "tick_budget": float(env.get("WATCHDOG_TICK_BUDGET", "0")),  # 单次采集的时间预算（秒，0表示取上报间隔的3倍且不少于10秒）
+        "stall_timeout": float(env.get("WATCHDOG_STALL_TIMEOUT", "60")),  # 同一阶段停留多久视为卡住（秒）
+        "restart_after": float(env.get("WATCHDOG_RESTART_AFTER", "0")),  # 卡住多久后重启采集线程（秒，0表示不重启）
+        "health_file": env.get("WATCHDOG_HEALTH_FILE", ""),  # 健康状态文件（供Docker健康检查使用）
+        "health_port": int(env.get("WATCHDOG_HEALTH_PORT", "0"))  # 健康检查HTTP端口（0表示不启用）
+    }
+
+
+def build_export_config(env=os.environ) -> dict:
+    """本机共享数据导出配置"""
+    return {
+        "snapshot_file": env.get("EXPORT_SNAPSHOT_FILE", "")  # 监控快照内存映射文件（如 /dev/shm/ikuai-agent.snap，可用 {name} 区分多个代理）
+    }
+
+
+def build_traffic_config(env=os.environ) -> dict:
+    """流量累计账本配置"""
+    return {
+        "ledger_file": env.get("TRAFFIC_LEDGER_FILE", ""),  # 流量累计账本文件（如 /app/logs/traffic-{name}.json，为空则不记录）
+        "flush_interval": float(env.get("TRAFFIC_LEDGER_FLUSH_INTERVAL", "60"))  # 写入账本文件的间隔（秒）
+    }
+
+
+def build_archive_config(env=os.environ) -> dict:
+    """监控数据长期归档配置"""
+    return {
+        "file": env.get("ARCHIVE_FILE", ""),  # 归档文件（如 /app/logs/archive-{name}.ika，为空则不归档）
+        "interval": float(env.get("ARCHIVE_INTERVAL", "10")),  # 归档一个样本的间隔（秒），不超过上报间隔时每次采集都归档
+        "flush_interval": float(env.get("ARCHIVE_FLUSH_INTERVAL", "60"))  # 把未写满的块写入文件的间隔（秒）
+    }
+
+
+def build_logging_config(env=os.environ) -> dict:
+    """日志配置"""
+    return {
+        "level": env.get("LOG_LEVEL", "WARNING"),  # 日志级别
+        "file": env.get("LOG_FILE", "ikuai_agent.log"),
+        "max_bytes": int(env.get("LOG_MAX_BYTES", "10485760")),  # 10MB
+        "backup_count": int(env.get("LOG_BACKUP_COUNT", "3"))  # 备份文件数量
+    }
+
+
+def read_config_file(path: str) -> dict:
+    """
+    读取KEY=VALUE格式的配置文件（可以直接使用.env文件）
+
+    Args:
+        path: 配置文件路径，为空或文件不存在时返回空字典
+
+    Returns:
+        dict: 配置项
+    """
+    values = {}
+    if not path or not os.path.exists(path):
+        return values
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            values[key.strip()] = value.strip().strip('"').strip("'")
+    return values
+
+
+def load_config(config_file: str = None) -> dict:
+    """
+    读取全部配置
+
+    Args:
+        config_file: 配置文件路径，默认使用CONFIG_FILE
+
+    Returns:
+        dict: 包含ikuai、komari、fleet、watchdog、export、traffic、archive、logging各部分配置
+    """
+    env = dict(os.environ)
+    env.update(read_config_file(CONFIG_FILE if config_file is None else config_file))
+    return {
+        "ikuai": build_ikuai_config(env),
+        "komari": build_komari_config(env),
+        "fleet": build_fleet_config(env),
+        "watchdog": build_watchdog_config(env),
+        "export": build_export_config(env),
+        "traffic": build_traffic_config(env),
+        "archive": build_archive_config(env),
+        "logging": build_logging_config(env)
+    }
+
+
+# 配置文件及热重载
+CONFIG_FILE = os.environ.get("CONFIG_FILE", "")  # 配置文件路径（为空则只使用环境变量）
+CONFIG_WATCH_INTERVAL = float(os.environ.get("CONFIG_WATCH_INTERVAL", "5"))  # 配置文件检查间隔（秒，0表示只响应SIGHUP）
+
+_config = load_config()
+IKUAI_CONFIG = _config["ikuai"]
+KOMARI_CONFIG = _config["komari"]
+FLEET_CONFIG = _config["fleet"]
+WATCHDOG_CONFIG = _config["watchdog"]
+EXPORT_CONFIG = _config["export"]
+TRAFFIC_CONFIG = _config["traffic"]
+ARCHIVE_CONFIG = _config["archive"]
+LOGGING_CONFIG = _config["logging"]
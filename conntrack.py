@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连接跟踪统计
+路由器的连接跟踪表可达数十万条，解析成JSON对象列表既慢又占内存。这里在下载响应的同时
+按块统计协议字段出现的次数（bytes.count），不构造任何条目；响应本身就带有各协议计数、
+或响应很小时直接解析。
+
+轮询按较低的频率进行，每次得到TCP/UDP占全部连接的比例，两次轮询之间
+用首页统计中开销很小的总连接数 connect_num 按比例估算
+"""
+
+import re
+import json
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+# 小于该大小的响应直接解析（与分块统计的结果一致，还能识别响应中现成的计数）
+PARSE_LIMIT = 65536
+
+# 各协议在条目中的写法，同时兼容紧凑和带空格的JSON（条目字段是两种写法的公共前缀）
+ENTRY_PATTERN = b'"protocol":'
+PROTOCOL_PATTERNS = {
+    "tcp": (b'"protocol":"tcp"', b'"protocol": "tcp"'),
+    "udp": (b'"protocol":"udp"', b'"protocol": "udp"')
+}
+OVERLAP = max(len(p) for patterns in PROTOCOL_PATTERNS.values() for p in patterns) - 1
+# 在转为小写的数据中查找，Result可能出现在响应的任何位置
+RESULT_PATTERN = re.compile(rb'"result"\s*:\s*(\d+)')
+RESULT_CARRY = 64  # 保留的上一块末尾，跨块的Result字段不会被漏掉
+
+
+def counts_from_data(data: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """
+    从已解析的 Data 中取得各协议计数
+
+    响应中已有 tcp/udp 计数时直接使用，否则遍历 data 列表
+    """
+    if not isinstance(data, dict):
+        return None
+    if isinstance(data.get("tcp"), int) and isinstance(data.get("udp"), int):
+        total = data.get("total")
+        return {"tcp": data["tcp"], "udp": data["udp"],
+                "total": total if isinstance(total, int) else data["tcp"] + data["udp"]}
+    entries = data.get("data")
+    if not isinstance(entries, list):
+        return None
+    counts = {"tcp": 0, "udp": 0, "total": len(entries)}
+    for entry in entries:
+        protocol = str(entry.get("protocol", "")).lower() if isinstance(entry, dict) else ""
+        if protocol in ("tcp", "udp"):
+            counts[protocol] += 1
+    return counts
+
+
+class ProtocolCounter:
+    """按块统计连接跟踪响应中各协议的条目数量，内存占用与响应大小无关"""
+
+    def __init__(self):
+        self.head = b""  # 响应开头，小响应直接解析
+        self.tail = b""  # 上一块末尾，避免跨块的字段被漏掉
+        self.result_code = None
+        self.result_carry = b""
+        self.size = 0
+        self.entries = 0
+        self.protocols = {name: 0 for name in PROTOCOL_PATTERNS}
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if len(self.head) < PARSE_LIMIT:
+            self.head += chunk[:PARSE_LIMIT - len(self.head)]
+        lowered = chunk.lower()
+        if self.result_code is None:
+            self.find_result(lowered)
+        tail = self.tail
+        buffer = tail + lowered
+        # 完整落在 tail 中的字段上一块已经统计过，减去后同一处字段只统计一次
+        self.entries += buffer.count(ENTRY_PATTERN) - tail.count(ENTRY_PATTERN)
+        for name, patterns in PROTOCOL_PATTERNS.items():
+            self.protocols[name] += sum(buffer.count(p) - tail.count(p) for p in patterns)
+        self.tail = buffer[-OVERLAP:]
+
+    def find_result(self, lowered: bytes):
+        """
+        边下载边查找Result：匹配到块的末尾时数字可能还没收完，保留到下一块再确认
+        """
+        buffer = self.result_carry + lowered
+        match = RESULT_PATTERN.search(buffer)
+        if match and match.end() < len(buffer):
+            self.result_code = int(match.group(1))
+            self.result_carry = b""
+        else:
+            self.result_carry = buffer[match.start():] if match else buffer[-RESULT_CARRY:]
+
+    @property
+    def result(self) -> Optional[int]:
+        """响应中的Result代码"""
+        if self.result_code is None and self.result_carry:
+            # 响应以Result结尾
+            match = RESULT_PATTERN.search(self.result_carry)
+            return int(match.group(1)) if match else None
+        return self.result_code
+
+    def counts(self) -> Optional[Dict[str, int]]:
+        if self.size < PARSE_LIMIT:
+            try:
+                return counts_from_data(json.loads(self.head).get("Data"))
+            except (ValueError, AttributeError):
+                return None
+        return {**self.protocols, "total": self.entries}
+
+
+def count_stream(chunks: Iterable[bytes]) -> ProtocolCounter:
+    """统计一个分块的响应"""
+    counter = ProtocolCounter()
+    for chunk in chunks:
+        if chunk:
+            counter.feed(chunk)
+    return counter
+
+
+class ConnectionSplit:
+    def __init__(self):
+        self.tcp_ratio = None  # 最近一次轮询中TCP连接占全部连接的比例
+        self.udp_ratio = None
+        self.polled_at = 0
+        self.polls = 0
+        self.last_counts: Dict[str, int] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.tcp_ratio is not None
+
+    def update(self, counts: Dict[str, int], polled_at: float):
+        """用一次轮询的计数更新比例"""
+        total = counts.get("total") or counts["tcp"] + counts["udp"]
+        if total <= 0:
+            return
+        self.tcp_ratio = counts["tcp"] / total
+        self.udp_ratio = counts["udp"] / total
+        self.polled_at = polled_at
+        self.polls += 1
+        self.last_counts = counts
+
+    def estimate(self, connect_num: int) -> Tuple[int, int]:
+        """按最近一次轮询的比例拆分当前的总连接数"""
+        return round(connect_num * self.tcp_ratio), round(connect_num * self.udp_ratio)
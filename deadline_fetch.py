@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+带截止时间的数据源采集
+每次采集的各个数据源（首页、接口、连接数、磁盘等）并行请求，只等到本次采集的截止时间。
+到时还没返回的数据源沿用上一次的值并标记为超时，请求留在后台继续完成，
+完成后的结果供下一次采集使用；同一数据源在后台未完成前不会重复请求。
+按数据源统计超时次数，便于找出拖慢采集的接口
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, Callable, Optional, List
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineFetcher:
+    def __init__(self, workers: int = 4, previous: "DeadlineFetcher" = None):
+        """
+        Args:
+            workers: 并行请求的线程数
+            previous: 替换的旧实例，沿用其上一次的值和统计
+        """
+        self.workers = max(workers, 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ikuai-source")
+        self.lock = threading.Lock()
+        self.last: Dict[str, Any] = dict(previous.last) if previous else {}  # 各数据源最近一次的结果
+        self.running: Dict[str, Any] = {}  # 仍在后台进行的请求
+        self.misses: Dict[str, int] = dict(previous.misses) if previous else {}  # 各数据源超时次数
+        self.late: List[str] = []  # 本次采集中超时、沿用旧值的数据源
+        self.durations: Dict[str, float] = {}  # 各数据源最近一次完成的耗时（秒）
+
+    def fetch(self, sources: Dict[str, Callable[[], Any]], deadline: Optional[float]) -> Dict[str, Any]:
+        """
+        采集一次全部数据源
+
+        Args:
+            sources: 数据源名称 → 无参数的采集函数
+            deadline: 截止时间戳，None表示不限时（在调用线程中依次采集）
+
+        Returns:
+            Dict: 数据源名称 → 结果；超时的数据源为上一次的结果（没有时为None），名称记录在 late 中
+        """
+        if deadline is None:
+            self.late = []
+            results = {name: self.call(name, func) for name, func in sources.items()}
+            with self.lock:
+                self.last.update(results)
+            return results
+
+        futures = {}
+        for name, func in sources.items():
+            with self.lock:
+                future = self.running.get(name)
+            if future is None or future.done():
+                future = self.executor.submit(self.call, name, func)
+                future.add_done_callback(lambda f, name=name: self.on_done(name, f))
+                with self.lock:
+                    self.running[name] = future
+            futures[name] = future
+
+        wait(futures.values(), timeout=max(deadline - time.time(), 0))
+
+        results, late = {}, []
+        with self.lock:
+            for name, future in futures.items():
+                if future.done():
+                    results[name] = future.result()
+                else:
+                    results[name] = self.last.get(name)
+                    self.misses[name] = self.misses.get(name, 0) + 1
+                    late.append(name)
+        if late:
+            logger.debug(f"数据源超过截止时间，沿用上一次的值: {', '.join(late)}")
+        self.late = late
+        return results
+
+    def call(self, name: str, func: Callable[[], Any]) -> Any:
+        """调用一个数据源，异常时返回None（与各采集函数失败时的返回值一致）"""
+        started = time.time()
+        try:
+            return func()
+        except Exception as e:
+            logger.error(f"采集数据源 {name} 异常: {e}")
+            return None
+        finally:
+            self.durations[name] = round(time.time() - started, 3)
+
+    def on_done(self, name: str, future):
+        """请求完成（包括超时后在后台完成的）时记录结果"""
+        with self.lock:
+            self.last[name] = future.result()
+            if self.running.get(name) is future:
+                del self.running[name]
+
+    def shutdown(self):
+        """不再接受新的请求，后台未完成的请求自行结束"""
+        self.executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "late": list(self.late),
+                "misses": dict(self.misses),
+                "durations": dict(self.durations)
+            }
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多路由器部署的进程分片监控
+按CPU核数启动工作进程，把路由器清单分片到各进程中运行IkuaiAgent，
+工作进程退出时自动重启或把路由器重新分配给其他进程，并汇总各进程的运行统计
+"""
+
+import os
+import json
+import time
+import queue
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from typing import Dict, Any, List
+from config import FLEET_CONFIG, LOGGING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def load_inventory(path: str) -> List[Dict[str, Any]]:
+    """
+    读取路由器清单
+
+    清单为JSON文件，可以是列表或 {"routers": [...]}，每个路由器的格式为:
+        {"name": "site-a", "ikuai": {"base_url": ..., "username": ..., "password": ...},
+         "komari": {"endpoint": ..., "token": ...,
+                    "mirrors": [{"endpoint": ..., "token": ...}]}}
+    ikuai/komari 中未填写的项使用环境变量中的默认配置；
+    镜像服务端的令牌是每台路由器各自的，不使用环境变量中的 KOMARI_MIRRORS
+
+    Args:
+        path: 清单文件路径
+
+    Returns:
+        List[Dict]: 路由器配置列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    routers = data.get("routers", []) if isinstance(data, dict) else data
+    names = set()
+    for index, router in enumerate(routers):
+        router.setdefault("name", f"router-{index + 1}")
+        if router["name"] in names:
+            raise ValueError(f"路由器名称重复: {router['name']}")
+        names.add(router["name"])
+        router.setdefault("ikuai", {})
+        router.setdefault("komari", {})
+        router["komari"].setdefault("mirrors", [])
+
+    return routers
+
+
+def worker_main(worker_id: int, routers: List[Dict[str, Any]], command_queue, stats_queue, stats_interval: float):
+    """
+    工作进程入口：每个路由器一个IkuaiAgent线程，定期上报统计
+
+    Args:
+        worker_id: 工作进程编号
+        routers: 分配给本进程的路由器
+        command_queue: 接收监控进程的指令（add/remove/stop）
+        stats_queue: 上报统计信息
+        stats_interval: 统计上报间隔（秒）
+    """
+    # 导入放在进程内，避免监控进程加载采集相关模块
+    from ikuai_komari_agent import IkuaiAgent
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    agents = {}
+
+    def add_router(router: Dict[str, Any]):
+        name = router["name"]
+        # 同一进程内的多个代理不共用健康状态文件和端口
+        agent = IkuaiAgent(router["komari"], router["ikuai"], name=name, configure_logging=False, watch_config=False,
+                           watchdog_config={"health_file": "", "health_port": 0})
+        thread = threading.Thread(target=agent.start, name=f"agent-{name}", daemon=True)
+        thread.start()
+        agents[name] = {"router": router, "agent": agent, "thread": thread, "started": time.time()}
+        logger.info(f"工作进程{worker_id}开始监控路由器: {name}")
+
+    def remove_router(name: str):
+        entry = agents.pop(name, None)
+        if entry:
+            entry["agent"].stop()
+            logger.info(f"工作进程{worker_id}停止监控路由器: {name}")
+
+    for router in routers:
+        add_router(router)
+
+    last_stats = 0
+    while not stop_event.is_set():
+        try:
+            command, payload = command_queue.get(timeout=1)
+        except queue.Empty:
+            command, payload = None, None
+
+        if command == "add":
+            if payload["name"] not in agents:
+                add_router(payload)
+        elif command == "remove":
+            remove_router(payload)
+        elif command == "stop":
+            break
+
+        now = time.time()
+        # 登录失败等原因退出的代理在一个统计周期后重新启动
+        for name, entry in list(agents.items()):
+            if not entry["agent"].running and now - entry["started"] >= stats_interval:
+                logger.warning(f"路由器{name}的监控已退出，重新启动")
+                entry["agent"].stop()
+                add_router(entry["router"])
+
+        if now - last_stats >= stats_interval:
+            stats_queue.put({
+                "worker_id": worker_id,
+                "pid": os.getpid(),
+                "time": now,
+                "agents": [entry["agent"].get_stats() for entry in agents.values()]
+            })
+            last_stats = now
+
+    for name in list(agents):
+        remove_router(name)
+
+
+class FleetSupervisor:
+    def __init__(self, routers: List[Dict[str, Any]], workers: int = None, stats_interval: float = None,
+                 max_restarts: int = None, restart_window: float = None, stats_file: str = None):
+        """
+        初始化多路由器监控进程
+
+        Args:
+            routers: 路由器清单
+            workers: 工作进程数，默认按CPU核数（不超过路由器数量）
+            stats_interval: 统计汇总间隔（秒）
+            max_restarts: 时间窗口内同一工作进程允许的重启次数，超过后把其路由器分配给其他进程
+            restart_window: 重启次数统计窗口（秒）
+            stats_file: 汇总统计输出文件
+        """
+        self.routers = routers
+        workers = workers or FLEET_CONFIG["workers"] or os.cpu_count() or 1
+        self.worker_count = max(1, min(workers, len(routers)))
+        self.stats_interval = stats_interval or FLEET_CONFIG["stats_interval"]
+        self.max_restarts = max_restarts if max_restarts is not None else FLEET_CONFIG["max_restarts"]
+        self.restart_window = restart_window or FLEET_CONFIG["restart_window"]
+        self.stats_file = stats_file if stats_file is not None else FLEET_CONFIG["stats_file"]
+
+        self.stats_queue = multiprocessing.Queue()
+        self.slots = {}  # worker_id -> 进程、指令队列、分配的路由器、重启记录
+        self.worker_stats = {}  # worker_id -> 最近一次统计
+        self.throughput = {}  # worker_id -> (时间, 已发送样本数, 样本/秒)
+        self.running = False
+
+    def shard(self) -> Dict[int, List[Dict[str, Any]]]:
+        """按名称排序后轮询分片，保证同一份清单每次分配结果一致"""
+        shards = {worker_id: [] for worker_id in range(self.worker_count)}
+        for index, router in enumerate(sorted(self.routers, key=lambda r: r["name"])):
+            shards[index % self.worker_count].append(router)
+        return shards
+
+    def spawn(self, worker_id: int, routers: List[Dict[str, Any]]):
+        """启动（或重启）一个工作进程"""
+        command_queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=worker_main,
+            args=(worker_id, routers, command_queue, self.stats_queue, self.stats_interval),
+            name=f"worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+
+        slot = self.slots.setdefault(worker_id, {"restarts": deque()})
+        slot.update({"process": process, "command_queue": command_queue, "routers": list(routers)})
+        logger.info(f"工作进程{worker_id}已启动 (pid={process.pid})，负责{len(routers)}台路由器")
+
+    def start(self):
+        """按分片启动所有工作进程"""
+        self.running = True
+        for worker_id, routers in self.shard().items():
+            self.spawn(worker_id, routers)
+        logger.info(f"已启动{self.worker_count}个工作进程，共{len(self.routers)}台路由器")
+
+    def handle_worker_exit(self, worker_id: int):
+        """
+        处理工作进程退出
+
+        重启次数在时间窗口内未超限时原地重启；
+        超限则认为该进程无法稳定运行，把它的路由器分配给负载最低的其他进程
+        """
+        slot = self.slots[worker_id]
+        now = time.time()
+        restarts = slot["restarts"]
+        restarts.append(now)
+        while restarts and now - restarts[0] > self.restart_window:
+            restarts.popleft()
+
+        logger.warning(f"工作进程{worker_id}已退出 (exitcode={slot['process'].exitcode})")
+        self.worker_stats.pop(worker_id, None)
+        self.throughput.pop(worker_id, None)
+
+        others = [wid for wid in self.slots if wid != worker_id]
+        if len(restarts) <= self.max_restarts or not others:
+            self.spawn(worker_id, slot["routers"])
+            return
+
+        logger.error(f"工作进程{worker_id}在{self.restart_window:.0f}秒内重启超过{self.max_restarts}次，重新分配其路由器")
+        del self.slots[worker_id]
+        for router in slot["routers"]:
+            target = min(others, key=lambda wid: len(self.slots[wid]["routers"]))
+            self.slots[target]["routers"].append(router)
+            self.slots[target]["command_queue"].put(("add", router))
+            logger.info(f"路由器{router['name']}已分配给工作进程{target}")
+
+    def check_workers(self):
+        """检查工作进程存活状态"""
+        for worker_id in list(self.slots):
+            if not self.slots[worker_id]["process"].is_alive():
+                self.handle_worker_exit(worker_id)
+
+    def drain_stats(self, timeout: float):
+        """接收工作进程上报的统计，最多等待timeout秒"""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                stats = self.stats_queue.get(timeout=max(deadline - time.time(), 0.01))
+            except queue.Empty:
+                return
+
+            worker_id = stats["worker_id"]
+            samples = sum(agent["samples_sent"] for agent in stats["agents"])
+            previous = self.throughput.get(worker_id)
+            rate = 0.0
+            if previous and samples >= previous[1] and stats["time"] > previous[0]:
+                rate = (samples - previous[1]) / (stats["time"] - previous[0])
+            self.throughput[worker_id] = (stats["time"], samples, rate)
+            self.worker_stats[worker_id] = stats
+
+            if time.time() >= deadline:
+                return
+
+    def aggregate(self) -> Dict[str, Any]:
+        """汇总各工作进程的健康状态和吞吐量"""
+        workers = []
+        for worker_id, slot in sorted(self.slots.items()):
+            stats = self.worker_stats.get(worker_id, {})
+            agents = stats.get("agents", [])
+            workers.append({
+                "worker_id": worker_id,
+                "pid": slot["process"].pid,
+                "alive": slot["process"].is_alive(),
+                "restarts": len(slot["restarts"]),
+                "routers": len(slot["routers"]),
+                "running": sum(1 for agent in agents if agent["running"]),
+                "connected": sum(1 for agent in agents if agent["ws_connected"]),
+                "tick_errors": sum(agent["tick_errors"] for agent in agents),
+                "samples_per_second": round(self.throughput.get(worker_id, (0, 0, 0.0))[2], 2),
+                "stats_age": round(time.time() - stats["time"], 1) if stats else None,
+                "agents": agents
+            })
+
+        return {
+            "time": time.time(),
+            "workers": len(workers),
+            "routers": sum(worker["routers"] for worker in workers),
+            "running": sum(worker["running"] for worker in workers),
+            "connected": sum(worker["connected"] for worker in workers),
+            "samples_per_second": round(sum(worker["samples_per_second"] for worker in workers), 2),
+            "worker_stats": workers
+        }
+
+    def write_stats(self, summary: Dict[str, Any]):
+        """写入汇总统计文件（先写临时文件再替换，避免读到半个文件）"""
+        tmp_file = f"{self.stats_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.stats_file)
+
+    def run(self):
+        """运行监控循环，直到stop被调用"""
+        self.start()
+        last_summary = time.time()
+
+        while self.running:
+            self.drain_stats(timeout=1)
+            if not self.running:
+                break
+            self.check_workers()
+
+            if time.time() - last_summary >= self.stats_interval:
+                summary = self.aggregate()
+                logger.info(f"汇总: {summary['workers']}个进程, {summary['running']}/{summary['routers']}台运行中, "
+                            f"{summary['connected']}台已连接, {summary['samples_per_second']}样本/秒")
+                if self.stats_file:
+                    try:
+                        self.write_stats(summary)
+                    except Exception as e:
+                        logger.error(f"写入统计文件失败: {e}")
+                last_summary = time.time()
+
+        self.shutdown()
+
+    def stop(self):
+        """请求停止（可在信号处理函数中调用）"""
+        self.running = False
+
+    def shutdown(self):
+        """通知所有工作进程停止并等待退出"""
+        logger.info("停止所有工作进程...")
+        for slot in self.slots.values():
+            try:
+                slot["command_queue"].put(("stop", None))
+            except Exception:
+                pass
+
+        deadline = time.time() + 15
+        for slot in self.slots.values():
+            slot["process"].join(timeout=max(deadline - time.time(), 0.1))
+            if slot["process"].is_alive():
+                slot["process"].terminate()
+        logger.info("所有工作进程已停止")
+
+
+def setup_logging():
+    """配置日志（格式中带进程名和线程名，便于区分各路由器）"""
+    formatter = logging.Formatter(
+        '%(asctime)s - %(processName)s - %(threadName)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    root_logger = logging.getLogger()
+    root_logger.handlers.clear()
+    for handler in (logging.FileHandler(LOGGING_CONFIG["file"], encoding='utf-8'), logging.StreamHandler()):
+        handler.setFormatter(formatter)
+        root_logger.addHandler(handler)
+    root_logger.setLevel(getattr(logging, LOGGING_CONFIG["level"]))
+
+    logging.getLogger('websocket').setLevel(logging.WARNING)
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+    logging.getLogger('requests').setLevel(logging.WARNING)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='iKuai多路由器监控')
+    parser.add_argument('--inventory', default=FLEET_CONFIG["inventory"], help='路由器清单文件(JSON)')
+    parser.add_argument('--workers', type=int, default=0, help='工作进程数（默认按CPU核数）')
+    parser.add_argument('--stats-file', default=None, help='汇总统计输出文件')
+    args = parser.parse_args()
+
+    setup_logging()
+
+    routers = load_inventory(args.inventory)
+    if not routers:
+        logger.error("路由器清单为空")
+        return
+
+    supervisor = FleetSupervisor(routers, workers=args.workers or None, stats_file=args.stats_file)
+
+    def signal_handler(signum, frame):
+        logger.info("收到停止信号，正在关闭所有工作进程...")
+        supervisor.stop()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接口索引模块
+把 monitor_iface 返回的接口列表整理成 接口名 → 计数器/IP 的紧凑索引。
+每次采集只解析一次响应，增量更新已有条目，只保留WAN口统计需要的字段，
+各条WAN线路、线路合计和公网IP在更新时顺带确定，读取时不再线性扫描
+"""
+
+import ipaddress
+from typing import Dict, Any, List, Optional
+
+
+class InterfaceStats:
+    """单个接口的计数器和IP"""
+
+    __slots__ = ("name", "ip_addr", "is_public", "upload", "download",
+                 "total_up", "total_down", "connect_num", "seen")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ip_addr = ""
+        self.is_public = False
+        self.upload = 0
+        self.download = 0
+        self.total_up = 0
+        self.total_down = 0
+        self.connect_num = 0
+        self.seen = 0
+
+    def set_ip(self, ip_addr: str):
+        """IP变化时才重新判断是否为公网地址"""
+        if ip_addr == self.ip_addr:
+            return
+        self.ip_addr = ip_addr
+        try:
+            self.is_public = bool(ip_addr) and not ipaddress.ip_address(ip_addr).is_private
+        except ValueError:
+            self.is_public = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload": self.upload,
+            "download": self.download,
+            "total_up": self.total_up,
+            "total_down": self.total_down,
+            "connect_num": self.connect_num
+        }
+
+
+class InterfaceIndex:
+    def __init__(self):
+        self.interfaces: Dict[str, InterfaceStats] = {}
+        self.wans: List[InterfaceStats] = []  # 所有WAN线路（多线负载均衡时有多条）
+        self.wan_total: Optional[Dict[str, Any]] = None  # 各线路计数器之和
+        self.public_ip = ""
+        self.generation = 0  # 每次更新递增，用于找出已消失的接口
+
+    def __len__(self) -> int:
+        return len(self.interfaces)
+
+    def entry(self, name: str) -> InterfaceStats:
+        """取出（或新建）接口条目并标记为本次可见"""
+        entry = self.interfaces.get(name)
+        if entry is None:
+            entry = self.interfaces[name] = InterfaceStats(name)
+        entry.seen = self.generation
+        return entry
+
+    def update(self, data: Dict[str, Any]):
+        """
+        用一次 monitor_iface 响应更新索引
+
+        WAN线路取所有名称以wan开头的接口，没有时取所有公网IP的接口；
+        公网IP优先取 iface_check 中的地址，与原先逐个列表扫描的顺序一致
+
+        Args:
+            data: monitor_iface 响应的 Data 部分（iface_check, iface_stream）
+        """
+        self.generation += 1
+        public_ip = ""
+        wans, public = [], []
+
+        for iface in data.get("iface_check") or ():
+            entry = self.entry(iface.get("interface", ""))
+            entry.set_ip(iface.get("ip_addr", ""))
+            if not public_ip and entry.is_public:
+                public_ip = entry.ip_addr
+
+        for iface in data.get("iface_stream") or ():
+            name = iface.get("interface", "")
+            entry = self.entry(name)
+            ip_addr = iface.get("ip_addr")
+            if ip_addr:
+                entry.set_ip(ip_addr)
+            entry.upload = iface.get("upload", 0)
+            entry.download = iface.get("download", 0)
+            entry.total_up = iface.get("total_up", 0)
+            entry.total_down = iface.get("total_down", 0)
+            entry.connect_num = iface.get("connect_num", 0)
+
+            if name.startswith("wan"):
+                wans.append(entry)
+            if entry.is_public:
+                public.append(entry)
+                if not public_ip:
+                    public_ip = entry.ip_addr
+
+        # 删除本次响应中已不存在的接口（例如拨号断开的PPPoE子接口）
+        generation = self.generation
+        stale = [name for name, entry in self.interfaces.items() if entry.seen != generation]
+        for name in stale:
+            del self.interfaces[name]
+
+        self.wans = wans or public
+        self.public_ip = public_ip
+        self.wan_total = self.sum_lines(self.wans) if self.wans else None
+
+    @staticmethod
+    def sum_lines(lines: List[InterfaceStats]) -> Dict[str, Any]:
+        """一次汇总各条线路的计数器，并附上每条线路的速率明细"""
+        upload = download = total_up = total_down = connect_num = 0
+        for line in lines:
+            upload += line.upload
+            download += line.download
+            total_up += line.total_up
+            total_down += line.total_down
+            connect_num += line.connect_num
+        return {
+            "upload": upload,
+            "download": download,
+            "total_up": total_up,
+            "total_down": total_down,
+            "connect_num": connect_num,
+            "lines": [(line.name, line.upload, line.download) for line in lines],
+            "totals": [(line.name, line.total_up, line.total_down) for line in lines]
+        }
+
+    @property
+    def wan(self) -> Optional[InterfaceStats]:
+        """第一条WAN线路"""
+        return self.wans[0] if self.wans else None
+
+    def wan_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        WAN口流量统计，格式与 get_wan_network_stats 一致
+
+        多条线路时为各线路之和，lines 为 (线路名, 上传, 下载) 明细，
+        totals 为 (线路名, 总上传, 总下载) 明细
+        """
+        return self.wan_total
@@ -1,637 +1,1257 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-iKuai监控代理 v1.0
-"""
-
-import logging
-import logging.handlers
-import json
-import time
-import threading
-import socket
-import platform
-import psutil
-import argparse
-import signal
-import sys
-import ipaddress
-from typing import Dict, Any, Optional
-import websocket
-import requests
-from ikuai_client import IkuaiClient
-from config import KOMARI_CONFIG, LOGGING_CONFIG
-
-logger = logging.getLogger(__name__)
-
-class IkuaiAgent:
-    def __init__(self):
-        """
-        初始化iKuai监控代理
-        使用config.py中的默认配置
-        """
-        # 使用配置文件中的默认值
-        self.endpoint = KOMARI_CONFIG["endpoint"]
-        self.token = KOMARI_CONFIG["token"]
-        self.interval = KOMARI_CONFIG["websocket_interval"]
-        self.info_report_interval = KOMARI_CONFIG["basic_info_interval"] * 60  # 转换为秒
-        self.ignore_unsafe_cert = KOMARI_CONFIG["ignore_unsafe_cert"]
-        
-        # 运行状态
-        self.running = False
-        self.ws = None
-        self.last_basic_info_report = 0
-        self.last_status_report = 0
-        
-        # 设置日志
-        self.setup_logging()
-        
-        # 创建ikuai客户端
-        self.ikuai_client = IkuaiClient()
-        
-        logger.info("iKuai监控代理初始化完成")
-    
-    def is_private_ip(self, ip: str) -> bool:
-        """判断IP是否为内网IP"""
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            return ip_obj.is_private
-        except:
-            return False
-    
-    def get_public_ip_from_ikuai(self) -> str:
-        """从iKuai路由器获取公网IP"""
-        try:
-            interface_info = self.ikuai_client.get_interface_info()
-            if interface_info:
-                iface_check = interface_info.get("iface_check", [])
-                for iface in iface_check:
-                    ip_addr = iface.get("ip_addr", "")
-                    if ip_addr and not self.is_private_ip(ip_addr):
-                        logger.debug(f"从WAN口获取到公网IP: {ip_addr}")
-                        return ip_addr
-                
-                iface_stream = interface_info.get("iface_stream", [])
-                for iface in iface_stream:
-                    ip_addr = iface.get("ip_addr", "")
-                    if ip_addr and not self.is_private_ip(ip_addr):
-                        logger.debug(f"从接口流获取到公网IP: {ip_addr}")
-                        return ip_addr
-            
-            return ""
-        except Exception as e:
-            logger.error(f"获取iKuai公网IP失败: {e}")
-            return ""
-    
-    def setup_logging(self):
-        """设置日志"""
-        log_config = LOGGING_CONFIG
-        
-        # 创建日志格式
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        
-        # 设置根日志级别
-        logging.basicConfig(level=getattr(logging, log_config["level"]))
-        
-        # 创建文件处理器
-        file_handler = logging.FileHandler(
-            log_config["file"],
-            encoding='utf-8'
-        )
-        file_handler.setFormatter(formatter)
-        
-        # 创建控制台处理器
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        
-        # 配置根日志器
-        root_logger = logging.getLogger()
-        root_logger.handlers.clear()  # 清除默认处理器
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(console_handler)
-        root_logger.setLevel(getattr(logging, log_config["level"]))
-        
-        # 设置特定模块的日志级别
-        logging.getLogger('websocket').setLevel(logging.WARNING)
-        logging.getLogger('urllib3').setLevel(logging.WARNING)
-        logging.getLogger('requests').setLevel(logging.WARNING)
-        
-        # 创建全局logger
-        global logger
-        logger = logging.getLogger(__name__)
-    
-    def get_ikuai_data(self) -> Dict[str, Any]:
-        """获取ikuai数据"""
-        try:
-            # 获取硬件信息
-            hardware_info = self.ikuai_client.get_hardware_info()
-            
-            # 获取系统状态信息
-            system_stats = self.ikuai_client.get_system_stats()
-            
-            # 获取网络统计信息
-            network_stats = self.ikuai_client.get_network_stats()
-            
-            # 获取CPU和内存统计信息
-            cpu_memory_stats = self.ikuai_client.get_cpu_memory_stats()
-            
-            return {
-                "hardware": hardware_info or {},
-                "system": system_stats or {},
-                "network": network_stats or {},
-                "cpu_memory": cpu_memory_stats or {}
-            }
-        except Exception as e:
-            logger.error(f"获取ikuai数据异常: {e}")
-            return {}
-    
-
-    
-    def format_basic_info(self) -> Dict[str, Any]:
-        """格式化基础信息上报数据"""
-        ikuai_data = self.get_ikuai_data()
-        
-        ipv4 = self.get_public_ip_from_ikuai()
-        
-        if not ipv4:
-            try:
-                hostname = socket.gethostname()
-                ipv4 = socket.gethostbyname(hostname)
-            except:
-                ipv4 = "127.0.0.1"
-        
-        hw_info = ikuai_data.get("hardware", {})
-        sys_info = ikuai_data.get("system", {})
-        verinfo = sys_info.get("verinfo", {})
-        
-        # 尝试从homepage API获取版本信息
-        try:
-            homepage_data = self.ikuai_client.get_homepage_stats()
-            if homepage_data and "sysstat" in homepage_data:
-                homepage_verinfo = homepage_data["sysstat"].get("verinfo", {})
-                if homepage_verinfo:
-                    verinfo = homepage_verinfo
-                    logger.debug(f"从homepage获取到版本信息: {verinfo}")
-        except Exception as e:
-            logger.error(f"获取homepage版本信息失败: {e}")
-        
-        logger.debug(f"iKuai系统信息: {sys_info}")
-        logger.debug(f"iKuai版本信息: {verinfo}")
-        
-        ikuai_version = verinfo.get("verstring", "")
-        if ikuai_version:
-            os_info = f"iKuai ({ikuai_version})"
-        else:
-            os_info = "iKuai"
-        
-        logger.debug(f"最终操作系统信息: {os_info}")
-        
-        mem_total_bytes = 0
-        try:
-            homepage_data = self.ikuai_client.get_homepage_stats()
-            if homepage_data and "sysstat" in homepage_data:
-                memory_data = homepage_data["sysstat"].get("memory", {})
-                mem_total_kb = memory_data.get("total", 0)
-                mem_total_bytes = mem_total_kb * 1024
-                logger.debug(f"从iKuai API获取内存: {mem_total_kb}KB = {mem_total_bytes}字节")
-            else:
-                if hw_info.get("memory"):
-                    mem_total_bytes = hw_info.get("memory") * 1024 * 1024
-                else:
-                    mem_total_bytes = 0
-        except Exception as e:
-            logger.error(f"获取内存数据失败: {e}")
-            if hw_info.get("memory"):
-                mem_total_bytes = hw_info.get("memory") * 1024 * 1024
-            else:
-                mem_total_bytes = local_info.get("memory", {}).get("mem_total", 0)
-        
-        disk_total_bytes = 0
-        hdd_info = hw_info.get("hdd", "")
-        if hdd_info and "GB" in hdd_info:
-            try:
-                import re
-                match = re.search(r'\((\d+\.?\d*)GB\)', hdd_info)
-                if match:
-                    disk_gb = float(match.group(1))
-                    disk_total_bytes = int(disk_gb * 1024 * 1024 * 1024)
-            except:
-                disk_total_bytes = 0
-        else:
-            disk_total_bytes = 0
-        
-        basic_info = {
-            "arch": platform.machine(),
-            "cpu_cores": hw_info.get("cpucores", 0),
-            "cpu_name": hw_info.get("cpumodel", "Unknown"),
-            "disk_total": disk_total_bytes,
-            "gpu_name": "Unknown",
-            "ipv4": ipv4,
-            "ipv6": "",
-            "mem_total": mem_total_bytes,
-            "os": os_info,
-            "kernel_version": platform.release(),
-            "swap_total": 0,
-            "version": "ikuai-agent-1.0.0",
-            "virtualization": "None"
-        }
-        
-        return basic_info
-    
-    def format_monitoring_data(self) -> Dict[str, Any]:
-        """格式化实时监控数据"""
-        ikuai_data = self.get_ikuai_data()
-        
-        cpu_usage = 0
-        sys_stats = ikuai_data.get("system", {})
-        if sys_stats.get("cpu"):
-            try:
-                cpu_values = [float(x.strip('%')) for x in sys_stats["cpu"] if x.strip('%').replace('.', '').isdigit()]
-                cpu_usage = sum(cpu_values) / len(cpu_values) if cpu_values else 0
-            except:
-                cpu_usage = psutil.cpu_percent(interval=1)
-        else:
-            cpu_usage = psutil.cpu_percent(interval=1)
-        
-        process_count = 0
-        try:
-            homepage_data = self.ikuai_client.get_homepage_stats()
-            if homepage_data and "sysstat" in homepage_data:
-                sysstat = homepage_data["sysstat"]
-                if sysstat.get("cputemp"):
-                    cpu_temp_values = sysstat["cputemp"]
-                    if cpu_temp_values and len(cpu_temp_values) > 0:
-                        process_count = int(float(cpu_temp_values[0]))
-        except Exception as e:
-            logger.error(f"获取CPU温度失败: {e}")
-            process_count = 0
-        
-        try:
-            homepage_data = self.ikuai_client.get_homepage_stats()
-            if homepage_data and "sysstat" in homepage_data:
-                memory_data = homepage_data["sysstat"].get("memory", {})
-                mem_total_kb = memory_data.get("total", 0)
-                mem_used_percent = memory_data.get("used", "0%").strip('%')
-                
-                try:
-                    mem_used_percent = float(mem_used_percent)
-                    mem_total_bytes = mem_total_kb * 1024
-                    mem_used_bytes = int(mem_total_bytes * mem_used_percent / 100)
-                    
-                    logger.debug(f"内存数据: 总内存={mem_total_kb}KB, 使用率={mem_used_percent}%, 总字节={mem_total_bytes}, 已用字节={mem_used_bytes}")
-                except Exception as e:
-                    logger.error(f"内存数据计算错误: {e}")
-                    mem_total_bytes = 0
-                    mem_used_bytes = 0
-            else:
-                mem_total_bytes = 0
-                mem_used_bytes = 0
-        except Exception as e:
-            logger.error(f"获取内存数据失败: {e}")
-            mem_total_bytes = 3 * 1024 * 1024 * 1024
-            mem_used_bytes = int(mem_total_bytes * 0.2)
-        
-        try:
-            wan_net_stats = self.ikuai_client.get_wan_network_stats()
-            if wan_net_stats:
-                net_up = wan_net_stats.get("upload", 0)
-                net_down = wan_net_stats.get("download", 0)
-                net_total_up = wan_net_stats.get("total_up", net_up)
-                net_total_down = wan_net_stats.get("total_down", net_down)
-                
-                net_up_rate = int(net_up / 3)
-                net_down_rate = int(net_down / 3)
-                
-                logger.debug(f"WAN口网络数据: 上传={net_up}, 下载={net_down}, 总上传={net_total_up}, 总下载={net_total_down}")
-            else:
-                net_stats = ikuai_data.get("network", {})
-                if net_stats:
-                    net_up = net_stats.get("upload", 0)
-                    net_down = net_stats.get("download", 0)
-                    net_total_up = net_stats.get("total_up", net_up)
-                    net_total_down = net_stats.get("total_down", net_down)
-                    
-                    net_up_rate = int(net_up / 3)
-                    net_down_rate = int(net_down / 3)
-                else:
-                    net_up = 0
-                    net_down = 0
-                    net_total_up = 0
-                    net_total_down = 0
-                    net_up_rate = 0
-                    net_down_rate = 0
-        except Exception as e:
-            logger.error(f"获取WAN口网络数据失败: {e}")
-            net_stats = ikuai_data.get("network", {})
-            if net_stats:
-                net_up = net_stats.get("upload", 0)
-                net_down = net_stats.get("download", 0)
-                net_total_up = net_stats.get("total_up", net_up)
-                net_total_down = net_stats.get("total_down", net_down)
-                
-                net_up_rate = int(net_up / 3)
-                net_down_rate = int(net_down / 3)
-            else:
-                net_up = 0
-                net_down = 0
-                net_total_up = 0
-                net_total_down = 0
-                net_up_rate = 0
-                net_down_rate = 0
-        
-        try:
-            connection_stats = self.ikuai_client.get_connection_stats()
-            if connection_stats:
-                tcp_connections = connection_stats.get("tcp", connection_stats.get("total", 0))
-                udp_connections = connection_stats.get("udp", 0)
-            else:
-                tcp_connections = 0
-                udp_connections = 0
-        except:
-            tcp_connections = 0
-            udp_connections = 0
-        
-        disk_info = {}
-        
-        try:
-            ikuai_disk_stats = self.ikuai_client.get_disk_usage_stats()
-            if ikuai_disk_stats:
-                disk_info = {
-                    "disk_total": ikuai_disk_stats.get("total", 0),
-                    "disk_used": ikuai_disk_stats.get("used", 0),
-                    "disk_free": ikuai_disk_stats.get("available", 0)
-                }
-            else:
-                hw_info = ikuai_data.get("hardware", {})
-                hdd_info = hw_info.get("hdd", "")
-                ikuai_disk_total = 0
-                
-                if hdd_info and "GB" in hdd_info:
-                    try:
-                        import re
-                        match = re.search(r'\((\d+\.?\d*)GB\)', hdd_info)
-                        if match:
-                            disk_gb = float(match.group(1))
-                            ikuai_disk_total = int(disk_gb * 1024 * 1024 * 1024)
-                    except:
-                        ikuai_disk_total = 0
-                else:
-                    ikuai_disk_total = 0
-                
-                ikuai_disk_used = int(ikuai_disk_total * 0.2)
-                
-                disk_info = {
-                    "disk_total": ikuai_disk_total,
-                    "disk_used": ikuai_disk_used,
-                    "disk_free": ikuai_disk_total - ikuai_disk_used
-                }
-        except Exception as e:
-            logger.error(f"获取ikuai磁盘信息失败: {e}")
-            pass
-        
-        load1, load5, load15 = 0, 0, 0
-        try:
-            load_stats = self.ikuai_client.get_load_from_homepage()
-            if load_stats:
-                load1 = load_stats.get("load1", 0)
-                load5 = load_stats.get("load5", 0)
-                load15 = load_stats.get("load15", 0)
-            else:
-                pass
-        except Exception as e:
-            logger.error(f"获取负载信息异常: {e}")
-            pass
-        
-        ikuai_uptime = 0
-        try:
-            ikuai_uptime = self.ikuai_client.get_uptime() or 0
-        except:
-            ikuai_uptime = int(time.time() - psutil.boot_time())
-        
-        monitoring_data = {
-            "cpu": {
-                "usage": round(cpu_usage, 2)
-            },
-            "ram": {
-                "total": mem_total_bytes,
-                "used": mem_used_bytes
-            },
-            "swap": {
-                "total": 0,
-                "used": 0
-            },
-            "load": {
-                "load1": load1,
-                "load5": load5,
-                "load15": load15
-            },
-            "disk": {
-                "total": disk_info.get("disk_total", 0),
-                "used": disk_info.get("disk_used", 0)
-            },
-            "network": {
-                "up": net_up_rate,
-                "down": net_down_rate,
-                "totalUp": net_total_up,
-                "totalDown": net_total_down
-            },
-            "connections": {
-                "tcp": tcp_connections,
-                "udp": udp_connections
-            },
-            "uptime": ikuai_uptime,
-            "process": process_count,
-            "message": f"ikuai监控 - CPU: {cpu_usage:.1f}%, 内存: {mem_used_bytes/1024/1024/1024:.1f}GB, 连接数: {tcp_connections}"
-        }
-        
-        return monitoring_data
-    
-    def report_basic_info(self):
-        """上报基础信息"""
-        try:
-            basic_info = self.format_basic_info()
-            url = f"{self.endpoint}/api/clients/uploadBasicInfo?token={self.token}"
-            
-            response = requests.post(url, json=basic_info, timeout=30, verify=not self.ignore_unsafe_cert)
-            response.raise_for_status()
-            
-            logger.info("基础信息上报成功")
-            self.last_basic_info_report = time.time()
-            
-        except Exception as e:
-            logger.error(f"基础信息上报失败: {e}")
-    
-    def on_websocket_message(self, ws, message):
-        """处理WebSocket消息（简化版，只记录日志）"""
-        try:
-            data = json.loads(message)
-            logger.info(f"收到WebSocket消息: {data}")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析失败: {e}")
-        except Exception as e:
-            logger.error(f"处理WebSocket消息异常: {e}")
-    
-    def on_websocket_error(self, ws, error):
-        """WebSocket错误处理"""
-        logger.error(f"WebSocket错误: {error}")
-    
-    def on_websocket_close(self, ws, close_status_code, close_msg):
-        """WebSocket连接关闭处理"""
-        logger.info("WebSocket连接已关闭")
-        if self.running:
-            self.schedule_reconnect()
-    
-    def on_websocket_open(self, ws):
-        """WebSocket连接建立处理"""
-        logger.info("WebSocket连接已建立")
-    
-    def schedule_reconnect(self):
-        """安排重连"""
-        logger.info("5秒后尝试重连...")
-        threading.Timer(5, self.start_websocket_connection).start()
-    
-    def start_websocket_connection(self):
-        """启动WebSocket连接"""
-        try:
-            ws_url = f"{self.endpoint.replace('https', 'wss').replace('http', 'ws')}/api/clients/report?token={self.token}"
-            logger.info(f"尝试连接WebSocket: {ws_url}")
-            
-            self.ws = websocket.WebSocketApp(
-                ws_url,
-                on_open=self.on_websocket_open,
-                on_message=self.on_websocket_message,
-                on_error=self.on_websocket_error,
-                on_close=self.on_websocket_close
-            )
-            
-            self.ws_thread = threading.Thread(target=self.ws.run_forever, daemon=True)
-            self.ws_thread.start()
-            
-        except Exception as e:
-            logger.error(f"WebSocket连接失败: {e}")
-            if self.running:
-                self.schedule_reconnect()
-    
-    def monitoring_loop(self):
-        """监控循环"""
-        self.running = True
-        logger.info("开始监控循环...")
-        
-        while self.running:
-            try:
-                monitoring_data = self.format_monitoring_data()
-                
-                if hasattr(self, 'ws') and self.ws and self.ws.sock and self.ws.sock.connected:
-                    self.ws.send(json.dumps(monitoring_data))
-                
-                current_time = time.time()
-                if current_time - self.last_basic_info_report >= self.info_report_interval:
-                    self.report_basic_info()
-                    self.last_basic_info_report = current_time
-                
-                if current_time - self.last_status_report >= 1800:
-                    logger.info("✓ 监控程序运行正常，数据持续上报中...")
-                    self.last_status_report = current_time
-                
-                time.sleep(self.interval)
-                
-            except Exception as e:
-                logger.error(f"监控循环异常: {e}")
-                time.sleep(self.interval)
-        
-        logger.info("监控循环已停止")
-    
-    def start(self):
-        """启动监控代理"""
-        try:
-            logger.info("启动iKuai监控代理...")
-            
-            if not self.ikuai_client.login():
-                logger.error("ikuai登录失败，程序退出")
-                return False
-            
-            self.start_websocket_connection()
-            
-            # 启动时立即上报基础信息
-            self.report_basic_info()
-            
-            self.monitoring_loop()
-            
-            logger.info("✓ iKuai监控代理启动成功！")
-            logger.info("✓ WebSocket连接已建立")
-            logger.info("✓ 开始实时监控iKuai路由器数据...")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"启动失败: {e}")
-            return False
-    
-    def stop(self):
-        """停止Agent"""
-        logger.info("停止iKuai监控代理...")
-        self.running = False
-        if self.ws:
-            self.ws.close()
-        if self.ikuai_client:
-            self.ikuai_client.logout()
-
-def main():
-    """主函数"""
-    parser = argparse.ArgumentParser(description='iKuai监控代理')
-    parser.add_argument('--test', action='store_true', help='测试模式')
-    
-    args = parser.parse_args()
-    
-    try:
-        agent = IkuaiAgent()
-        
-        if args.test:
-            print("=== 测试模式 ===")
-            print("基础信息:")
-            basic_info = agent.format_basic_info()
-            print(json.dumps(basic_info, indent=2, ensure_ascii=False))
-            
-            print("\n监控数据:")
-            monitoring_data = agent.format_monitoring_data()
-            print(json.dumps(monitoring_data, indent=2, ensure_ascii=False))
-            
-            logger.info("测试完成")
-            return
-        
-        # 设置信号处理
-        def signal_handler(signum, frame):
-            logger.info("收到停止信号，正在关闭程序...")
-            agent.stop()
-            sys.exit(0)
-        
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
-        
-        # 启动监控代理
-        if agent.start():
-            logger.info("✓ 程序启动成功，正在运行中...")
-            logger.info("✓ 按 Ctrl+C 停止程序")
-            
-            # 保持程序运行
-            try:
-                while agent.running:
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                logger.info("收到键盘中断信号")
-            finally:
-                agent.stop()
-                logger.info("✓ 程序已正常停止")
-        else:
-            logger.error("程序启动失败")
-            sys.exit(1)
-            
-    except Exception as e:
-        logger.error(f"程序异常: {e}")
-        sys.exit(1)
-
-if __name__ == "__main__":
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+iKuai监控代理 v1.0
+"""
+
+import os
+import logging
+import logging.handlers
+import json
+import math
+import time
+import threading
+import socket
+import platform
+import argparse
+import signal
+import sys
+import gzip
+import ipaddress
+from typing import Dict, Any, Optional, Tuple
+from ikuai_client import IkuaiClient
+from komari_link import KomariLink
+from deadline_fetch import DeadlineFetcher
+from tick_watchdog import TickWatchdog
+from top_talkers import format_rate
+from conntrack import ConnectionSplit
+from jitter import basic_info_due, first_tick, tick_deadline
+from snapshot_export import SnapshotWriter
+from traffic_ledger import TrafficLedger
+from sample_record import MonitoringSample
+from metrics_archive import ArchiveWriter
+from config import IKUAI_CONFIG, KOMARI_CONFIG, LOGGING_CONFIG, WATCHDOG_CONFIG, EXPORT_CONFIG, TRAFFIC_CONFIG, ARCHIVE_CONFIG, CONFIG_FILE, CONFIG_WATCH_INTERVAL, load_config, parse_endpoints
+
+logger = logging.getLogger(__name__)
+
+class IkuaiAgent:
+    def __init__(self, komari_config: Dict[str, Any] = None, ikuai_config: Dict[str, Any] = None,
+                 name: str = None, configure_logging: bool = True, watch_config: bool = True,
+                 watchdog_config: Dict[str, Any] = None):
+        """
+        初始化iKuai监控代理
+        默认使用config.py中的配置，传入的配置项会覆盖对应的默认值
+
+        Args:
+            komari_config: Komari服务器配置（覆盖KOMARI_CONFIG）
+            ikuai_config: iKuai路由器配置（覆盖IKUAI_CONFIG）
+            name: 代理名称，用于多路由器部署时区分日志和统计
+            configure_logging: 是否配置全局日志（同一进程运行多个代理时只需配置一次）
+            watch_config: 是否监视配置文件并响应SIGHUP重新加载配置
+            watchdog_config: 看门狗配置（覆盖WATCHDOG_CONFIG）
+        """
+        # 显式传入的配置在重新加载时保持优先
+        self.komari_overrides = komari_config or {}
+        self.ikuai_overrides = ikuai_config or {}
+        komari_config = {**KOMARI_CONFIG, **self.komari_overrides}
+        ikuai_config = {**IKUAI_CONFIG, **self.ikuai_overrides}
+        self.komari_config = komari_config
+        self.ikuai_config = ikuai_config
+        self.logging_config = LOGGING_CONFIG
+        self.watchdog_config = {**WATCHDOG_CONFIG, **(watchdog_config or {})}
+        self.name = name or "default"
+
+        # 使用配置文件中的默认值
+        self.endpoint = komari_config["endpoint"]
+        self.token = komari_config["token"]
+        self.interval = komari_config["websocket_interval"]
+        self.info_report_interval = komari_config["basic_info_interval"] * 60  # 转换为秒
+        self.ignore_unsafe_cert = komari_config["ignore_unsafe_cert"]
+        self.reconnect_delay = komari_config["reconnect_delay"]
+        self.jitter = komari_config["jitter"]
+        self.jitter_window = komari_config["jitter_window"]
+        self.tick_phase = komari_config["tick_phase"]
+
+        # 服务端调速控制
+        self.remote_control = komari_config["remote_control"]
+        self.min_interval = komari_config["min_interval"]
+        self.max_interval = komari_config["max_interval"]
+        self.default_interval = self.interval
+        self.interval_override_until = 0  # 服务端临时间隔的到期时间，0表示不过期
+        self.detailed_collection = True  # 暂停时只采集CPU/内存/网络等核心数据
+        self.detail_cache = {}  # 暂停详细采集期间复用的上一次详细数据
+        self.fetcher = DeadlineFetcher(ikuai_config["fetch_workers"])  # 按截止时间并行采集各数据源
+        self.last_top_talkers = 0
+        self.top_talkers_summary = ""  # 局域网主机流量排行摘要，两次刷新之间沿用
+        self.last_conntrack = 0
+        self.conntrack_thread = None
+        self.malloc_trim = None  # 低内存模式下定期归还空闲内存，首次使用时加载
+        self.connection_split = ConnectionSplit()  # 连接跟踪表中TCP/UDP的比例，两次读取之间按总连接数估算
+        self.tick_wakeup = threading.Event()  # 间隔变化时唤醒监控循环，无需重连
+
+        # 传输压缩
+        self.ws_compression = komari_config["ws_compression"]
+        self.gzip_upload = komari_config["gzip_upload"]
+
+        # 采集统计
+        self.ticks_completed = 0
+        self.tick_errors = 0
+        self.last_tick_duration = 0.0
+        self.last_tick_time = 0
+
+        # 采集线程状态（供看门狗检测卡住的阶段）
+        self.tick_started = 0
+        self.next_tick_time = 0  # 等待中时下一次采集的开始时间（写入健康状态，间隔很长时不误判为停滞）
+        self.current_stage = "idle"
+        self.stage_started = time.time()
+        self.collector_thread = None
+        self.collector_generation = 0
+        self.collector_restarts = 0
+        self.last_collector_restart = 0
+        self.watchdog = None
+
+        # 本机共享的监控快照（供告警、Prometheus导出器等读取，不增加路由器请求）
+        self.snapshot_writer = None
+        if EXPORT_CONFIG["snapshot_file"]:
+            try:
+                self.snapshot_writer = SnapshotWriter(EXPORT_CONFIG["snapshot_file"].format(name=self.name))
+            except Exception as e:
+                logger.error(f"创建监控快照文件失败: {e}")
+
+        # 流量累计账本（路由器重启后上报的总流量不归零）
+        self.traffic_ledger = None
+        if TRAFFIC_CONFIG["ledger_file"]:
+            try:
+                self.traffic_ledger = TrafficLedger(TRAFFIC_CONFIG["ledger_file"].format(name=self.name),
+                                                    TRAFFIC_CONFIG["flush_interval"])
+            except Exception as e:
+                logger.error(f"创建流量账本失败: {e}")
+
+        # 监控数据长期归档（压缩保存在本机，用于容量规划）
+        self.archive = None
+        self.last_archived = 0
+        if ARCHIVE_CONFIG["file"]:
+            try:
+                self.archive = ArchiveWriter(ARCHIVE_CONFIG["file"].format(name=self.name),
+                                             ARCHIVE_CONFIG["flush_interval"])
+            except Exception as e:
+                logger.error(f"创建监控数据归档失败: {e}")
+
+        # 配置热重载
+        self.configure_logging = configure_logging
+        self.watch_config = watch_config
+        self.reload_requested = threading.Event()
+        self.config_mtime = self.get_config_mtime()
+
+        # 运行状态
+        self.running = False
+        self.started_at = 0
+        self.links = []  # 每个Komari服务端一条独立连接，第一条为主服务器
+        self.last_basic_info_report = 0
+        self.next_basic_info = 0
+        self.last_status_report = 0
+
+        # 设置日志
+        if configure_logging:
+            self.setup_logging()
+        
+        # 创建ikuai客户端
+        self.ikuai_client = self.create_ikuai_client(ikuai_config)
+        
+        logger.info("iKuai监控代理初始化完成")
+    
+    def create_ikuai_client(self, ikuai_config: Dict[str, Any]) -> IkuaiClient:
+        """按配置创建ikuai客户端"""
+        return IkuaiClient(
+            base_url=ikuai_config.get("base_url"),
+            username=ikuai_config.get("username"),
+            password=ikuai_config.get("password"),
+            timeout=ikuai_config.get("timeout"),
+            record_file=ikuai_config.get("record_file", ""),
+            replay_file=ikuai_config.get("replay_file", ""),
+            replay_speed=ikuai_config.get("replay_speed", 1.0)
+        )
+    
+    def is_private_ip(self, ip: str) -> bool:
+        """判断IP是否为内网IP"""
+        try:
+            ip_obj = ipaddress.ip_address(ip)
+            return ip_obj.is_private
+        except:
+            return False
+    
+    def get_public_ip_from_ikuai(self) -> str:
+        """从iKuai路由器获取公网IP（复用监控循环已更新的接口索引）"""
+        try:
+            index = self.ikuai_client.iface_index
+            if not index.generation:
+                index = self.ikuai_client.refresh_interface_index()
+            if index and index.public_ip:
+                logger.debug(f"从接口索引获取到公网IP: {index.public_ip}")
+                return index.public_ip
+            return ""
+        except Exception as e:
+            logger.error(f"获取iKuai公网IP失败: {e}")
+            return ""
+    
+    def setup_logging(self, log_config: Dict[str, Any] = None):
+        """设置日志"""
+        log_config = log_config or self.logging_config
+        
+        # 创建日志格式
+        formatter = logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        
+        # 设置根日志级别
+        logging.basicConfig(level=getattr(logging, log_config["level"]))
+        
+        # 创建文件处理器
+        file_handler = logging.FileHandler(
+            log_config["file"],
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(formatter)
+        
+        # 创建控制台处理器
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        
+        # 配置根日志器
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers:
+            handler.close()  # 重新加载配置时关闭旧的日志文件
+        root_logger.handlers.clear()  # 清除默认处理器
+        root_logger.addHandler(file_handler)
+        root_logger.addHandler(console_handler)
+        root_logger.setLevel(getattr(logging, log_config["level"]))
+        
+        # 设置特定模块的日志级别
+        logging.getLogger('websocket').setLevel(logging.WARNING)
+        logging.getLogger('urllib3').setLevel(logging.WARNING)
+        logging.getLogger('requests').setLevel(logging.WARNING)
+        
+        # 创建全局logger
+        global logger
+        logger = logging.getLogger(__name__)
+    
+    def get_ikuai_data(self) -> Dict[str, Any]:
+        """获取ikuai数据"""
+        try:
+            # 获取硬件信息
+            hardware_info = self.ikuai_client.get_hardware_info()
+            
+            # 获取系统状态信息
+            system_stats = self.ikuai_client.get_system_stats()
+            
+            # 获取网络统计信息
+            network_stats = self.ikuai_client.get_network_stats()
+            
+            # 获取CPU和内存统计信息
+            cpu_memory_stats = self.ikuai_client.get_cpu_memory_stats()
+            
+            return {
+                "hardware": hardware_info or {},
+                "system": system_stats or {},
+                "network": network_stats or {},
+                "cpu_memory": cpu_memory_stats or {}
+            }
+        except Exception as e:
+            logger.error(f"获取ikuai数据异常: {e}")
+            return {}
+    
+
+    
+    def format_basic_info(self) -> Dict[str, Any]:
+        """格式化基础信息上报数据"""
+        ikuai_data = self.get_ikuai_data()
+        
+        ipv4 = self.get_public_ip_from_ikuai()
+        
+        if not ipv4:
+            try:
+                hostname = socket.gethostname()
+                ipv4 = socket.gethostbyname(hostname)
+            except:
+                ipv4 = "127.0.0.1"
+        
+        hw_info = ikuai_data.get("hardware", {})
+        sys_info = ikuai_data.get("system", {})
+        verinfo = sys_info.get("verinfo", {})
+        
+        # 尝试从homepage API获取版本信息
+        try:
+            homepage_data = self.ikuai_client.get_homepage_stats()
+            if homepage_data and "sysstat" in homepage_data:
+                homepage_verinfo = homepage_data["sysstat"].get("verinfo", {})
+                if homepage_verinfo:
+                    verinfo = homepage_verinfo
+                    logger.debug(f"从homepage获取到版本信息: {verinfo}")
+        except Exception as e:
+            logger.error(f"获取homepage版本信息失败: {e}")
+        
+        logger.debug(f"iKuai系统信息: {sys_info}")
+        logger.debug(f"iKuai版本信息: {verinfo}")
+        
+        ikuai_version = verinfo.get("verstring", "")
+        if ikuai_version:
+            os_info = f"iKuai ({ikuai_version})"
+        else:
+            os_info = "iKuai"
+        
+        logger.debug(f"最终操作系统信息: {os_info}")
+        
+        mem_total_bytes = 0
+        try:
+            homepage_data = self.ikuai_client.get_homepage_stats()
+            if homepage_data and "sysstat" in homepage_data:
+                memory_data = homepage_data["sysstat"].get("memory", {})
+                mem_total_kb = memory_data.get("total", 0)
+                mem_total_bytes = mem_total_kb * 1024
+                logger.debug(f"从iKuai API获取内存: {mem_total_kb}KB = {mem_total_bytes}字节")
+            else:
+                if hw_info.get("memory"):
+                    mem_total_bytes = hw_info.get("memory") * 1024 * 1024
+                else:
+                    mem_total_bytes = 0
+        except Exception as e:
+            logger.error(f"获取内存数据失败: {e}")
+            if hw_info.get("memory"):
+                mem_total_bytes = hw_info.get("memory") * 1024 * 1024
+            else:
+                mem_total_bytes = local_info.get("memory", {}).get("mem_total", 0)
+        
+        disk_total_bytes = 0
+        hdd_info = hw_info.get("hdd", "")
+        if hdd_info and "GB" in hdd_info:
+            try:
+                import re
+                match = re.search(r'\((\d+\.?\d*)GB\)', hdd_info)
+                if match:
+                    disk_gb = float(match.group(1))
+                    disk_total_bytes = int(disk_gb * 1024 * 1024 * 1024)
+            except:
+                disk_total_bytes = 0
+        else:
+            disk_total_bytes = 0
+        
+        basic_info = {
+            "arch": platform.machine(),
+            "cpu_cores": hw_info.get("cpucores", 0),
+            "cpu_name": hw_info.get("cpumodel", "Unknown"),
+            "disk_total": disk_total_bytes,
+            "gpu_name": "Unknown",
+            "ipv4": ipv4,
+            "ipv6": "",
+            "mem_total": mem_total_bytes,
+            "os": os_info,
+            "kernel_version": platform.release(),
+            "swap_total": 0,
+            "version": "ikuai-agent-1.0.0",
+            "virtualization": "None"
+        }
+        
+        return basic_info
+    
+    def collect_detailed_stats(self, ikuai_data: Dict[str, Any], ikuai_disk_stats: Optional[Dict],
+                               homepage_data: Optional[Dict]) -> Dict[str, Any]:
+        """
+        整理磁盘和负载等详细数据
+
+        Args:
+            ikuai_data: 包含hardware的路由器数据（磁盘管理数据不可用时按硬盘容量估算）
+            ikuai_disk_stats: 本次采集的磁盘使用统计（get_disk_usage_stats）
+            homepage_data: 本次采集的首页统计，用于取得负载
+        """
+        disk_info = {}
+        
+        try:
+            if ikuai_disk_stats:
+                disk_info = {
+                    "disk_total": ikuai_disk_stats.get("total", 0),
+                    "disk_used": ikuai_disk_stats.get("used", 0),
+                    "disk_free": ikuai_disk_stats.get("available", 0)
+                }
+            else:
+                hw_info = ikuai_data.get("hardware", {})
+                hdd_info = hw_info.get("hdd", "")
+                ikuai_disk_total = 0
+                
+                if hdd_info and "GB" in hdd_info:
+                    try:
+                        import re
+                        match = re.search(r'\((\d+\.?\d*)GB\)', hdd_info)
+                        if match:
+                            disk_gb = float(match.group(1))
+                            ikuai_disk_total = int(disk_gb * 1024 * 1024 * 1024)
+                    except:
+                        ikuai_disk_total = 0
+                else:
+                    ikuai_disk_total = 0
+                
+                ikuai_disk_used = int(ikuai_disk_total * 0.2)
+                
+                disk_info = {
+                    "disk_total": ikuai_disk_total,
+                    "disk_used": ikuai_disk_used,
+                    "disk_free": ikuai_disk_total - ikuai_disk_used
+                }
+        except Exception as e:
+            logger.error(f"获取ikuai磁盘信息失败: {e}")
+            pass
+        
+        load1, load5, load15 = 0, 0, 0
+        try:
+            load_stats = self.ikuai_client.get_load_from_homepage(homepage_data) if homepage_data else None
+            if load_stats:
+                load1 = load_stats.get("load1", 0)
+                load5 = load_stats.get("load5", 0)
+                load15 = load_stats.get("load15", 0)
+            else:
+                pass
+        except Exception as e:
+            logger.error(f"获取负载信息异常: {e}")
+            pass
+        
+        return {
+            "disk_info": disk_info,
+            "load": (load1, load5, load15)
+        }
+    
+    def collect_top_talkers(self) -> str:
+        """按配置的间隔刷新局域网主机流量排行，返回上报消息中的摘要"""
+        interval = self.ikuai_config.get("lan_hosts_interval", 0)
+        if interval <= 0:
+            return ""
+        
+        now = time.time()
+        if now - self.last_top_talkers >= interval:
+            self.last_top_talkers = now
+            top_talkers = self.ikuai_client.refresh_top_talkers(
+                self.ikuai_config.get("top_hosts", 3),
+                self.ikuai_config.get("lan_hosts_limit", 5000)
+            )
+            if top_talkers:
+                self.top_talkers_summary = top_talkers.summary()
+                logger.debug(f"局域网主机 {top_talkers.hosts} 台，{self.top_talkers_summary}")
+        return self.top_talkers_summary
+    
+    def account_traffic(self, sources: Dict[str, Any], homepage_data: Optional[Dict],
+                        total_up: int, total_down: int) -> Tuple[int, int]:
+        """
+        用本次的流量计数器更新账本，返回单调递增的总上传/总下载
+
+        有WAN线路时按线路记账，否则按首页统计的总计数器记账
+        """
+        wan_stats = sources["wan"]
+        if wan_stats and wan_stats.get("totals"):
+            counters = wan_stats["totals"]
+        elif total_up or total_down:
+            counters = [("system", total_up, total_down)]
+        else:
+            counters = []
+        # 沿用上一次结果的数据源与本次的运行时间对不上，不用来判断重启
+        uptime = None
+        if homepage_data and "homepage" not in self.fetcher.late and "wan" not in self.fetcher.late:
+            uptime = homepage_data.get("sysstat", {}).get("uptime")
+        try:
+            if counters:
+                self.traffic_ledger.update(counters, uptime)
+        except Exception as e:
+            logger.error(f"更新流量账本失败: {e}")
+        totals = self.traffic_ledger.totals()
+        return totals["total_up"], totals["total_down"]
+    
+    def collect_conntrack(self) -> Optional[Dict[str, int]]:
+        """
+        按配置的间隔在后台读取连接跟踪表，返回最近一次的计数
+
+        连接很多时读取可能超过一次采集的时间，放在单独的线程中进行，不占用本次采集的截止时间
+        """
+        interval = self.ikuai_config.get("conntrack_interval", 0)
+        if interval <= 0:
+            return None
+        
+        now = time.time()
+        poll_running = self.conntrack_thread and self.conntrack_thread.is_alive()
+        if now - self.last_conntrack >= interval and not poll_running:
+            self.last_conntrack = now
+            self.conntrack_thread = threading.Thread(target=self.poll_conntrack, name="ikuai-conntrack", daemon=True)
+            self.conntrack_thread.start()
+        return self.connection_split.last_counts or None
+    
+    def poll_conntrack(self):
+        """读取一次连接跟踪表并更新TCP/UDP比例"""
+        started = time.time()
+        counts = self.ikuai_client.get_conntrack_counts(self.ikuai_config.get("conntrack_limit", 0))
+        if counts:
+            self.connection_split.update(counts, started)
+            logger.debug(f"连接跟踪: TCP {counts['tcp']}，UDP {counts['udp']}，共 {counts['total']}，"
+                         f"耗时 {time.time() - started:.2f}秒")
+    
+    def format_wan_breakdown(self, lines) -> str:
+        """多条WAN线路的速率明细，只有一条线路时返回空字符串"""
+        if len(lines) < 2:
+            return ""
+        return "WAN: " + ", ".join(
+            f"{name} ↑{format_rate(int(upload / 3))} ↓{format_rate(int(download / 3))}" for name, upload, download in lines
+        )
+    
+    def local_cpu_percent(self) -> float:
+        """路由器没有返回CPU数据时使用本机的CPU使用率（psutil只在这时加载，缩短启动时间）"""
+        import psutil
+        return psutil.cpu_percent(interval=1)
+
+    def monitoring_sources(self, detailed: bool) -> Dict[str, Any]:
+        """
+        一次监控采集需要的数据源，各数据源互不依赖，可以并行请求
+
+        Args:
+            detailed: 是否包含磁盘等详细数据
+        """
+        client = self.ikuai_client
+        sources = {
+            "sysstat": client.get_system_stats,
+            "homepage": self.compact_homepage if self.ikuai_config.get("low_memory") else client.get_homepage_stats,
+            "wan": client.get_wan_network_stats,
+            "top_talkers": self.collect_top_talkers,
+            "conntrack": self.collect_conntrack
+        }
+        if detailed:
+            sources["hardware"] = client.get_hardware_info
+            sources["disk"] = client.get_disk_usage_stats
+        return sources
+
+    def compact_homepage(self) -> Optional[Dict]:
+        """
+        低内存模式下的首页统计：只保留用到的 sysstat 部分
+
+        首页响应中的 ac_status（AC管理的AP列表）等在设备多时可能很大，
+        而该结果会作为超时时的旧值一直保留到下一次采集
+        """
+        homepage_data = self.ikuai_client.get_homepage_stats()
+        return {"sysstat": homepage_data.get("sysstat", {})} if homepage_data else homepage_data
+    
+    def release_memory(self):
+        """把空闲的堆内存归还系统（glibc的malloc_trim），其他C库上不做任何事"""
+        if self.malloc_trim is None:
+            try:
+                import ctypes
+                self.malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+            except (OSError, AttributeError):
+                self.malloc_trim = False
+        if self.malloc_trim:
+            self.malloc_trim(0)
+    
+    def fetch_sources(self, detailed: bool) -> Dict[str, Any]:
+        """按本次采集的截止时间取得各数据源，超时的数据源沿用上一次的值"""
+        ratio = self.ikuai_config.get("fetch_deadline", 0)
+        deadline = self.tick_started + self.interval * ratio if ratio > 0 and self.tick_started else None
+        return self.fetcher.fetch(self.monitoring_sources(detailed), deadline)
+
+    def format_monitoring_data(self) -> Dict[str, Any]:
+        """格式化实时监控数据（Komari上报格式的嵌套字典）"""
+        return self.collect_sample().to_dict()
+    
+    def collect_sample(self) -> MonitoringSample:
+        """采集一次实时监控数据"""
+        # 详细数据（磁盘、负载）在服务端暂停详细采集时复用上一次的结果
+        detailed = self.detailed_collection or not self.detail_cache
+        sources = self.fetch_sources(detailed)
+        homepage_data = sources["homepage"]
+        ikuai_data = {
+            "system": sources["sysstat"] or {},
+            "hardware": sources.get("hardware") or {}
+        }
+        
+        cpu_usage = 0
+        sys_stats = ikuai_data.get("system", {})
+        if sys_stats.get("cpu"):
+            try:
+                cpu_values = [float(x.strip('%')) for x in sys_stats["cpu"] if x.strip('%').replace('.', '').isdigit()]
+                cpu_usage = sum(cpu_values) / len(cpu_values) if cpu_values else 0
+            except:
+                cpu_usage = self.local_cpu_percent()
+        else:
+            cpu_usage = self.local_cpu_percent()
+        
+        process_count = 0
+        try:
+            if homepage_data and "sysstat" in homepage_data:
+                sysstat = homepage_data["sysstat"]
+                if sysstat.get("cputemp"):
+                    cpu_temp_values = sysstat["cputemp"]
+                    if cpu_temp_values and len(cpu_temp_values) > 0:
+                        process_count = int(float(cpu_temp_values[0]))
+        except Exception as e:
+            logger.error(f"获取CPU温度失败: {e}")
+            process_count = 0
+        
+        try:
+            if homepage_data and "sysstat" in homepage_data:
+                memory_data = homepage_data["sysstat"].get("memory", {})
+                mem_total_kb = memory_data.get("total", 0)
+                mem_used_percent = memory_data.get("used", "0%").strip('%')
+                
+                try:
+                    mem_used_percent = float(mem_used_percent)
+                    mem_total_bytes = mem_total_kb * 1024
+                    mem_used_bytes = int(mem_total_bytes * mem_used_percent / 100)
+                    
+                    logger.debug(f"内存数据: 总内存={mem_total_kb}KB, 使用率={mem_used_percent}%, 总字节={mem_total_bytes}, 已用字节={mem_used_bytes}")
+                except Exception as e:
+                    logger.error(f"内存数据计算错误: {e}")
+                    mem_total_bytes = 0
+                    mem_used_bytes = 0
+            else:
+                mem_total_bytes = 0
+                mem_used_bytes = 0
+        except Exception as e:
+            logger.error(f"获取内存数据失败: {e}")
+            mem_total_bytes = 3 * 1024 * 1024 * 1024
+            mem_used_bytes = int(mem_total_bytes * 0.2)
+        
+        wan_breakdown = ""
+        try:
+            wan_net_stats = sources["wan"]
+            if wan_net_stats:
+                net_up = wan_net_stats.get("upload", 0)
+                net_down = wan_net_stats.get("download", 0)
+                net_total_up = wan_net_stats.get("total_up", net_up)
+                net_total_down = wan_net_stats.get("total_down", net_down)
+                
+                net_up_rate = int(net_up / 3)
+                net_down_rate = int(net_down / 3)
+                
+                # 多线路时上报各线路之和，并在消息中附上每条线路的速率
+                wan_breakdown = self.format_wan_breakdown(wan_net_stats.get("lines", []))
+                
+                logger.debug(f"WAN口网络数据: 上传={net_up}, 下载={net_down}, 总上传={net_total_up}, 总下载={net_total_down}")
+            else:
+                net_stats = self.ikuai_client.get_network_stats(homepage_data)
+                if net_stats:
+                    net_up = net_stats.get("upload", 0)
+                    net_down = net_stats.get("download", 0)
+                    net_total_up = net_stats.get("total_up", net_up)
+                    net_total_down = net_stats.get("total_down", net_down)
+                    
+                    net_up_rate = int(net_up / 3)
+                    net_down_rate = int(net_down / 3)
+                else:
+                    net_up = 0
+                    net_down = 0
+                    net_total_up = 0
+                    net_total_down = 0
+                    net_up_rate = 0
+                    net_down_rate = 0
+        except Exception as e:
+            logger.error(f"获取WAN口网络数据失败: {e}")
+            net_stats = self.ikuai_client.get_network_stats(homepage_data)
+            if net_stats:
+                net_up = net_stats.get("upload", 0)
+                net_down = net_stats.get("download", 0)
+                net_total_up = net_stats.get("total_up", net_up)
+                net_total_down = net_stats.get("total_down", net_down)
+                
+                net_up_rate = int(net_up / 3)
+                net_down_rate = int(net_down / 3)
+            else:
+                net_up = 0
+                net_down = 0
+                net_total_up = 0
+                net_total_down = 0
+                net_up_rate = 0
+                net_down_rate = 0
+        
+        traffic_summary = ""
+        if self.traffic_ledger:
+            net_total_up, net_total_down = self.account_traffic(sources, homepage_data, net_total_up, net_total_down)
+            traffic_summary = self.traffic_ledger.summary()
+        
+        try:
+            connection_stats = self.ikuai_client.get_connection_stats(homepage_data) if homepage_data else None
+            if connection_stats:
+                total_connections = connection_stats.get("total", connection_stats.get("tcp", 0))
+                tcp_connections = connection_stats.get("tcp", total_connections)
+                udp_connections = connection_stats.get("udp", 0)
+                # 按最近一次连接跟踪统计的比例拆分当前的总连接数
+                if self.connection_split.ready and self.ikuai_config.get("conntrack_interval", 0) > 0:
+                    tcp_connections, udp_connections = self.connection_split.estimate(total_connections)
+            else:
+                total_connections = 0
+                tcp_connections = 0
+                udp_connections = 0
+        except:
+            total_connections = 0
+            tcp_connections = 0
+            udp_connections = 0
+        
+        if detailed:
+            self.detail_cache = self.collect_detailed_stats(ikuai_data, sources["disk"], homepage_data)
+        disk_info = self.detail_cache["disk_info"]
+        load1, load5, load15 = self.detail_cache["load"]
+        
+        # 超过截止时间的数据源沿用了上一次的值，在消息中标出
+        late = f"超时沿用: {', '.join(self.fetcher.late)}" if self.fetcher.late else ""
+        top_talkers = sources["top_talkers"] or ""
+        extra_message = "".join(f" | {part}" for part in (wan_breakdown, traffic_summary, top_talkers, late) if part)
+        
+        ikuai_uptime = 0
+        try:
+            ikuai_uptime = (homepage_data or {}).get("sysstat", {}).get("uptime", 0) or 0
+        except:
+            import psutil
+            ikuai_uptime = int(time.time() - psutil.boot_time())
+        
+        sample = MonitoringSample()
+        sample.cpu_usage = round(cpu_usage, 2)
+        sample.ram_total = mem_total_bytes
+        sample.ram_used = mem_used_bytes
+        sample.load1, sample.load5, sample.load15 = load1, load5, load15
+        sample.disk_total = disk_info.get("disk_total", 0)
+        sample.disk_used = disk_info.get("disk_used", 0)
+        sample.net_up = net_up_rate
+        sample.net_down = net_down_rate
+        sample.net_total_up = net_total_up
+        sample.net_total_down = net_total_down
+        sample.connections_tcp = tcp_connections
+        sample.connections_udp = udp_connections
+        sample.uptime = ikuai_uptime
+        sample.process = process_count
+        sample.message = (f"ikuai监控 - CPU: {cpu_usage:.1f}%, 内存: {mem_used_bytes/1024/1024/1024:.1f}GB, 连接数: {total_connections}"
+                          + extra_message)
+        return sample
+    
+    def report_basic_info(self):
+        """上报基础信息：只采集和序列化一次，由各连接的发送线程分别上报"""
+        try:
+            basic_info = self.format_basic_info()
+            body = json.dumps(basic_info).encode('utf-8')
+            headers = {"Content-Type": "application/json"}
+            if self.gzip_upload:
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+            for link in self.links:
+                link.submit_basic_info(body, headers)
+            self.last_basic_info_report = time.time()
+            
+        except Exception as e:
+            logger.error(f"基础信息上报失败: {e}")
+    
+    def handle_control_message(self, data: Dict[str, Any]) -> bool:
+        """
+        处理服务端控制指令
+
+        支持的指令（message字段）:
+            set_interval: 设置上报间隔，interval为秒数，可选duration秒后自动恢复
+            reset_interval: 恢复配置中的上报间隔
+            pause_detail: 暂停磁盘、负载等详细数据采集
+            resume_detail: 恢复详细数据采集
+
+        Returns:
+            bool: 是否为已处理的控制指令
+        """
+        command = data.get("message")
+        if command not in ("set_interval", "reset_interval", "pause_detail", "resume_detail"):
+            return False
+
+        if not self.remote_control:
+            logger.info(f"已禁用服务端控制，忽略指令: {command}")
+            return False
+
+        if command == "set_interval":
+            try:
+                interval = float(data.get("interval"))
+                duration = float(data.get("duration", 0) or 0)
+                if not (math.isfinite(interval) and math.isfinite(duration)):
+                    # float() 接受 NaN/inf（包括字符串 "nan"、"inf"），会让间隔失效或覆盖永久生效
+                    raise ValueError("间隔和持续时间必须是有限数值")
+            except (TypeError, ValueError):
+                logger.error(f"无效的上报间隔指令: {data}")
+                return False
+            self.set_interval(interval, duration)
+        elif command == "reset_interval":
+            self.set_interval(self.default_interval)
+        elif command == "pause_detail":
+            self.detailed_collection = False
+            logger.info("服务端暂停详细数据采集")
+        elif command == "resume_detail":
+            self.detailed_collection = True
+            logger.info("服务端恢复详细数据采集")
+
+        return True
+
+    def set_interval(self, interval: float, duration: float = 0):
+        """
+        修改监控上报间隔，立即作用于监控循环
+
+        Args:
+            interval: 新的上报间隔（秒），会被限制在min_interval和max_interval之间
+            duration: 持续时间（秒），到期后恢复默认间隔，0表示一直生效
+        """
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        self.interval = interval
+        self.interval_override_until = time.time() + duration if duration > 0 else 0
+        logger.info(f"上报间隔已调整为 {interval} 秒" + (f"，{duration:.0f}秒后恢复" if duration > 0 else ""))
+        # 唤醒正在等待的监控循环，使新间隔马上生效
+        self.tick_wakeup.set()
+
+    def wait_next_tick(self, tick_started: float):
+        """
+        等待下一次采集
+
+        间隔被修改时会被唤醒并按新间隔重新计算剩余等待时间，停止时立即返回
+
+        Args:
+            tick_started: 本次采集开始的时间戳
+        """
+        if self.interval_override_until and time.time() >= self.interval_override_until:
+            logger.info("服务端临时上报间隔已到期")
+            self.set_interval(self.default_interval)
+
+        while self.running:
+            if self.tick_phase:
+                remaining = tick_deadline(tick_started, self.interval, self.token) - time.time()
+            else:
+                remaining = tick_started + self.interval - time.time()
+            self.next_tick_time = time.time() + max(remaining, 0)
+            if remaining <= 0 or not self.tick_wakeup.wait(remaining):
+                break
+            self.tick_wakeup.clear()
+    
+    def send_report(self, message: str):
+        """
+        把一条序列化后的监控数据交给所有Komari连接，不等待发送完成
+
+        Args:
+            message: 序列化后的JSON字符串
+        """
+        for link in self.links:
+            link.submit(message)
+    
+    def schedule_basic_info(self, startup: bool = False):
+        """计算下一次上报基础信息的时间（启用jitter时按令牌错开）"""
+        self.next_basic_info = basic_info_due(time.time(), self.info_report_interval, self.token,
+                                              self.jitter, self.jitter_window, startup)
+
+    def endpoint_pairs(self) -> list:
+        """需要上报的全部Komari服务端：主服务器在前，其后为镜像服务端"""
+        return [(self.endpoint, self.token)] + parse_endpoints(self.komari_config.get("mirrors"))
+
+    def create_links(self) -> list:
+        """为每个Komari服务端创建连接，只有主服务器的控制指令会被处理"""
+        return [
+            KomariLink(endpoint, token,
+                       ws_compression=self.ws_compression,
+                       reconnect_delay=self.reconnect_delay,
+                       jitter=self.jitter,
+                       jitter_window=self.jitter_window,
+                       ignore_unsafe_cert=self.ignore_unsafe_cert,
+                       on_message=self.handle_control_message if index == 0 else None,
+                       ping_interval=self.komari_config["ping_interval"],
+                       ping_timeout=self.komari_config["ping_timeout"],
+                       send_timeout=self.komari_config["send_timeout"])
+            for index, (endpoint, token) in enumerate(self.endpoint_pairs())
+        ]
+
+    def start_links(self):
+        """建立到所有Komari服务端的WebSocket连接"""
+        self.links = self.create_links()
+        for link in self.links:
+            link.start()
+        if len(self.links) > 1:
+            logger.info(f"同时上报到 {len(self.links)} 个Komari服务端")
+
+    def restart_links(self):
+        """用当前配置重建所有连接（旧连接关闭时不会触发重连）"""
+        old_links = self.links
+        self.start_links()
+        for link in old_links:
+            link.stop()
+
+    @property
+    def ws_connected(self) -> bool:
+        """所有Komari连接是否都已建立"""
+        links = self.links
+        return bool(links) and all(link.connected for link in links)
+
+    def first_frame_seconds(self) -> Optional[float]:
+        """从start()到主服务器收到第一帧数据的时间"""
+        first_sent = self.links[0].first_sent if self.links else 0
+        return round(first_sent - self.started_at, 3) if first_sent and self.started_at else None
+
+    @property
+    def samples_sent(self) -> int:
+        return sum(link.samples_sent for link in self.links)
+
+    @property
+    def bytes_sent(self) -> int:
+        return sum(link.bytes_sent for link in self.links)
+    
+    def set_stage(self, stage: str):
+        """记录采集线程当前所处的阶段"""
+        self.current_stage = stage
+        self.stage_started = time.time()
+
+    def monitoring_loop(self, generation: int = None):
+        """
+        监控循环
+
+        Args:
+            generation: 采集线程代号，看门狗重启采集线程后旧线程据此退出
+        """
+        self.running = True
+        generation = self.collector_generation if generation is None else generation
+        logger.info("开始监控循环...")
+        
+        if self.tick_phase:
+            # 第一次采集也对齐到本代理的相位，避免整站重启后的第一批数据帧同时到达
+            self.tick_wakeup.wait(max(first_tick(time.time(), self.interval, self.token) - time.time(), 0))
+            self.tick_wakeup.clear()
+        
+        while self.running and generation == self.collector_generation:
+            tick_started = time.time()
+            self.tick_started = tick_started
+            try:
+                self.set_stage("collect")
+                sample = self.collect_sample()
+                self.export_snapshot(sample)
+                self.archive_sample(sample)
+                
+                if self.links:
+                    # 只序列化一次，各连接的发送线程分别发送
+                    self.set_stage("send")
+                    self.send_report(sample.to_json())
+                
+                current_time = time.time()
+                if current_time >= self.next_basic_info:
+                    self.set_stage("basic_info")
+                    self.report_basic_info()
+                    self.schedule_basic_info()
+                
+                if current_time - self.last_status_report >= 1800:
+                    logger.info("✓ 监控程序运行正常，数据持续上报中...")
+                    self.last_status_report = current_time
+                
+                self.ticks_completed += 1
+                if self.ikuai_config.get("low_memory") and self.ticks_completed % 60 == 0:
+                    # 主机排行、磁盘等较大的响应解析后留下的空闲内存不会自动还给系统
+                    self.release_memory()
+                self.last_tick_time = current_time
+                self.last_tick_duration = current_time - tick_started
+                self.set_stage("wait")
+                self.wait_next_tick(tick_started)
+                
+            except Exception as e:
+                logger.error(f"监控循环异常: {e}")
+                self.tick_errors += 1
+                self.set_stage("wait")
+                self.wait_next_tick(tick_started)
+        
+        logger.info("监控循环已停止")
+
+    def export_snapshot(self, sample: MonitoringSample):
+        """把本次采集结果写入共享快照，失败不影响上报"""
+        if not self.snapshot_writer:
+            return
+        try:
+            self.snapshot_writer.publish(sample, self.ticks_completed + 1)
+        except Exception as e:
+            logger.error(f"写入监控快照失败: {e}")
+    
+    def archive_sample(self, sample: MonitoringSample):
+        """按归档间隔把本次采集结果追加到归档，失败不影响上报"""
+        if not self.archive:
+            return
+        now = time.time()
+        if now - self.last_archived < ARCHIVE_CONFIG["interval"]:
+            return
+        self.last_archived = now
+        try:
+            self.archive.append(sample, now)
+        except Exception as e:
+            logger.error(f"写入监控数据归档失败: {e}")
+    
+    def start_collector(self):
+        """在独立线程中启动监控循环"""
+        self.collector_generation += 1
+        self.collector_thread = threading.Thread(
+            target=self.monitoring_loop,
+            args=(self.collector_generation,),
+            name=f"collector-{self.collector_generation}",
+            daemon=True
+        )
+        self.collector_thread.start()
+
+    def restart_collector(self):
+        """
+        重启卡住的采集线程
+
+        卡住的线程无法被强制结束：这里关闭它正在使用的路由器会话，
+        让阻塞的调用尽快出错（WebSocket发送在各连接自己的线程中，不会卡住采集线程），并以新的代号启动新线程，旧线程恢复后会自行退出
+        """
+        stage = self.current_stage
+        logger.warning(f"重启采集线程（卡在阶段: {stage}）")
+        self.collector_restarts += 1
+        self.last_collector_restart = time.time()
+        # 重新计时：新线程还没来得及运行时，看门狗不会按旧阶段的耗时接连重启
+        self.set_stage("restarting")
+
+        old_client = self.ikuai_client
+        self.ikuai_client = self.create_ikuai_client(self.ikuai_config)
+        old_client.logout()
+
+        self.start_collector()
+    
+    def start(self):
+        """启动监控代理"""
+        try:
+            logger.info("启动iKuai监控代理...")
+            self.started_at = time.time()
+            # 提前置为运行状态，保证首次WebSocket连接断开时也会重连
+            self.running = True
+            
+            # WebSocket在后台线程中连接，与登录路由器同时进行
+            self.start_links()
+            
+            if not self.ikuai_client.login():
+                logger.error("ikuai登录失败，程序退出")
+                self.stop()
+                return False
+            
+            if self.watch_config:
+                threading.Thread(target=self.config_watch_loop, name="config-watch", daemon=True).start()
+            
+            # 基础信息在第一次监控数据发出之后再上报，不推迟第一帧；
+            # 启用jitter时由监控循环按令牌延后，避免整站重启时同时上报
+            if self.jitter:
+                self.schedule_basic_info(startup=True)
+            else:
+                self.next_basic_info = time.time()
+            
+            self.start_collector()
+            
+            if self.watchdog_config["enabled"]:
+                self.watchdog = TickWatchdog(self, self.watchdog_config)
+                self.watchdog.start()
+            
+            logger.info("✓ iKuai监控代理启动成功！")
+            logger.info("✓ 开始实时监控iKuai路由器数据...")
+            
+            return True
+            
+        except Exception as e:
+            logger.error(f"启动失败: {e}")
+            self.running = False
+            return False
+    
+    def get_config_mtime(self) -> float:
+        """配置文件的修改时间，未配置或不存在时返回0"""
+        try:
+            return os.path.getmtime(CONFIG_FILE) if CONFIG_FILE else 0
+        except OSError:
+            return 0
+
+    def request_reload(self):
+        """请求重新加载配置（可在信号处理函数中调用）"""
+        self.reload_requested.set()
+
+    def config_watch_loop(self):
+        """配置监视线程：响应重新加载请求，并定期检查配置文件是否被修改"""
+        timeout = CONFIG_WATCH_INTERVAL if CONFIG_FILE and CONFIG_WATCH_INTERVAL > 0 else None
+        while self.running:
+            requested = self.reload_requested.wait(timeout)
+            self.reload_requested.clear()
+            if not self.running:
+                break
+
+            mtime = self.get_config_mtime()
+            if requested or mtime != self.config_mtime:
+                self.config_mtime = mtime
+                self.reload_config()
+
+    def reload_config(self):
+        """
+        重新加载配置，只重启受影响的部分
+
+        - 上报间隔、基础信息间隔、日志级别等直接生效
+        - Komari地址、令牌、镜像服务端或压缩设置变化时重建WebSocket连接
+        - 路由器地址或账号变化时重新登录，只有超时变化时不重新登录
+        """
+        try:
+            config = load_config()
+        except Exception as e:
+            logger.error(f"重新加载配置失败，继续使用当前配置: {e}")
+            return
+
+        komari_config = {**config["komari"], **self.komari_overrides}
+        ikuai_config = {**config["ikuai"], **self.ikuai_overrides}
+        komari_changed = {key for key, value in komari_config.items() if self.komari_config.get(key) != value}
+        ikuai_changed = {key for key, value in ikuai_config.items() if self.ikuai_config.get(key) != value}
+        logging_changed = config["logging"] != self.logging_config
+
+        if not (komari_changed or ikuai_changed or logging_changed):
+            logger.info("配置未变化")
+            return
+
+        if logging_changed and self.configure_logging:
+            self.logging_config = config["logging"]
+            self.setup_logging()
+
+        self.komari_config = komari_config
+        self.info_report_interval = komari_config["basic_info_interval"] * 60
+        self.ignore_unsafe_cert = komari_config["ignore_unsafe_cert"]
+        self.reconnect_delay = komari_config["reconnect_delay"]
+        self.jitter = komari_config["jitter"]
+        self.jitter_window = komari_config["jitter_window"]
+        self.tick_phase = komari_config["tick_phase"]
+        self.remote_control = komari_config["remote_control"]
+        self.min_interval = komari_config["min_interval"]
+        self.max_interval = komari_config["max_interval"]
+        self.gzip_upload = komari_config["gzip_upload"]
+        for link in self.links:
+            link.reconnect_delay = self.reconnect_delay
+            link.jitter = self.jitter
+            link.jitter_window = self.jitter_window
+            link.ignore_unsafe_cert = self.ignore_unsafe_cert
+            link.send_timeout = komari_config["send_timeout"]
+
+        if "websocket_interval" in komari_changed:
+            self.default_interval = komari_config["websocket_interval"]
+            # 服务端设置的临时间隔优先，到期后恢复为新的默认值
+            if not self.interval_override_until:
+                self.set_interval(self.default_interval)
+
+        if komari_changed & {"endpoint", "token", "mirrors", "ws_compression", "ping_interval", "ping_timeout"}:
+            self.endpoint = komari_config["endpoint"]
+            self.token = komari_config["token"]
+            self.ws_compression = komari_config["ws_compression"]
+            logger.info("Komari连接配置已变化，重建WebSocket连接")
+            self.restart_links()
+
+        if komari_changed & {"basic_info_interval", "jitter", "token"}:
+            self.schedule_basic_info()
+
+        self.ikuai_config = ikuai_config
+        if ikuai_changed & {"base_url", "username", "password", "record_file", "replay_file", "replay_speed"}:
+            logger.info("路由器连接配置已变化，重新登录")
+            old_client = self.ikuai_client
+            self.ikuai_client = self.create_ikuai_client(ikuai_config)
+            old_client.logout()
+            if not self.ikuai_client.login():
+                logger.error("使用新配置登录ikuai失败，将在下次采集时重试")
+        elif "timeout" in ikuai_changed:
+            self.ikuai_client.timeout = ikuai_config["timeout"]
+        if "fetch_workers" in ikuai_changed:
+            old_fetcher = self.fetcher
+            self.fetcher = DeadlineFetcher(ikuai_config["fetch_workers"], previous=old_fetcher)
+            old_fetcher.shutdown()
+
+        logger.info(f"配置已重新加载: {sorted(komari_changed | ikuai_changed | ({'logging'} if logging_changed else set()))}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取代理运行统计（供多路由器部署汇总）"""
+        return {
+            "name": self.name,
+            "running": self.running,
+            "ws_connected": self.ws_connected,
+            "interval": self.interval,
+            "ticks_completed": self.ticks_completed,
+            "tick_errors": self.tick_errors,
+            "last_tick_duration": round(self.last_tick_duration, 3),
+            "last_tick_time": self.last_tick_time,
+            "stage": self.current_stage,
+            "collector_restarts": self.collector_restarts,
+            "samples_sent": self.samples_sent,
+            "bytes_sent": self.bytes_sent,
+            "first_frame_seconds": self.first_frame_seconds(),
+            "links": [link.get_stats() for link in self.links],
+            "sources": self.fetcher.get_stats(),
+            "traffic": self.traffic_ledger.totals() if self.traffic_ledger else None,
+            "archive": self.archive.get_stats() if self.archive else None,
+            "conntrack": {
+                "polls": self.connection_split.polls,
+                "polled_at": self.connection_split.polled_at,
+                "counts": self.connection_split.last_counts
+            }
+        }
+    
+    def stop(self):
+        """停止Agent"""
+        logger.info("停止iKuai监控代理...")
+        self.running = False
+        self.tick_wakeup.set()
+        self.reload_requested.set()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.snapshot_writer:
+            self.snapshot_writer.close()
+        if self.traffic_ledger:
+            self.traffic_ledger.close()
+        if self.archive:
+            self.archive.close()
+        self.fetcher.shutdown()
+        for link in self.links:
+            link.stop()
+        if self.ikuai_client:
+            self.ikuai_client.logout()
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='iKuai监控代理')
+    parser.add_argument('--test', action='store_true', help='测试模式')
+    
+    args = parser.parse_args()
+    
+    try:
+        agent = IkuaiAgent()
+        
+        if args.test:
+            print("=== 测试模式 ===")
+            print("基础信息:")
+            basic_info = agent.format_basic_info()
+            print(json.dumps(basic_info, indent=2, ensure_ascii=False))
+            
+            print("\n监控数据:")
+            monitoring_data = agent.format_monitoring_data()
+            print(json.dumps(monitoring_data, indent=2, ensure_ascii=False))
+            
+            logger.info("测试完成")
+            return
+        
+        # 设置信号处理
+        def signal_handler(signum, frame):
+            logger.info("收到停止信号，正在关闭程序...")
+            agent.stop()
+            sys.exit(0)
+        
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+        # SIGHUP 重新加载配置
+        signal.signal(signal.SIGHUP, lambda signum, frame: agent.request_reload())
+        
+        # 启动监控代理
+        if agent.start():
+            logger.info("✓ 程序启动成功，正在运行中...")
+            logger.info("✓ 按 Ctrl+C 停止程序")
+            
+            # 保持程序运行
+            try:
+                while agent.running:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                logger.info("收到键盘中断信号")
+            finally:
+                agent.stop()
+                logger.info("✓ 程序已正常停止")
+        else:
+            logger.error("程序启动失败")
+            sys.exit(1)
+            
+    except Exception as e:
+        logger.error(f"程序异常: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+由令牌推导的确定性相位偏移
+同一站点的容器一起重启、或Komari重启后，所有代理会在同一时刻上报基础信息和重连。
+每个代理按自己的令牌得到固定的相位，把这些请求均匀分散到一个时间窗口内；
+同一令牌每次启动得到的相位相同，便于排查
+"""
+
+import math
+import hashlib
+
+
+def token_phase(token: str, purpose: str) -> float:
+    """
+    令牌对应的相位
+
+    Args:
+        token: Komari令牌
+        purpose: 用途（basic_info/reconnect/tick等），不同用途的相位相互独立
+
+    Returns:
+        float: [0, 1) 之间的固定值
+    """
+    digest = hashlib.sha256(f"{purpose}:{token}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def next_aligned(after: float, period: float, offset: float) -> float:
+    """after之后第一个满足 (t - offset) 为 period 整数倍的时间点"""
+    return (math.floor((after - offset) / period) + 1) * period + offset
+
+
+def basic_info_due(now: float, interval: float, token: str, jitter: bool, window: float, startup: bool = False) -> float:
+    """
+    下一次上报基础信息的时间
+
+    启动时在 [0, window) 内按相位延后；之后对齐到以相位为偏移的固定时间网格上，
+    与上一次上报至少间隔半个周期，避免启动后很快又上报一次
+
+    Args:
+        now: 当前时间
+        interval: 上报间隔（秒）
+        jitter: 是否启用相位偏移（关闭时与原先一样启动立即上报、之后每隔interval上报）
+        window: 启动时的分散窗口（秒）
+        startup: 是否为启动后的第一次上报
+    """
+    if not jitter:
+        return now if startup else now + interval
+    if startup:
+        return now + token_phase(token, "basic_info_startup") * window
+    return next_aligned(now + interval / 2, interval, token_phase(token, "basic_info") * interval)
+
+
+def reconnect_delay(base: float, token: str, jitter: bool, window: float) -> float:
+    """WebSocket断开后的重连等待：固定等待 + 按相位分散到 [0, window) 内"""
+    if not jitter:
+        return base
+    return base + token_phase(token, "reconnect") * window
+
+
+def first_tick(now: float, interval: float, token: str) -> float:
+    """启动后第一次采集的时间：now之后第一个对齐到相位的时间点"""
+    return next_aligned(now, interval, token_phase(token, "tick") * interval)
+
+
+def tick_deadline(tick_started: float, interval: float, token: str) -> float:
+    """
+    按相位对齐的下一次采集时间，各代理的采集在一个间隔内均匀错开
+
+    与本次采集开始至少间隔半个周期；已对齐时恰好是 tick_started + interval
+    """
+    return next_aligned(tick_started + interval / 2, interval, token_phase(token, "tick") * interval)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Komari上报连接
+每个Komari服务端（主服务器、迁移或备用服务器）一条独立的WebSocket连接，各自维护重连状态。
+采集线程每次只序列化一次监控数据，交给各连接自己的发送线程；发送线程只保留最新的一条，
+某个服务端变慢或断开时只会丢弃它自己积压的旧数据，不会拖慢采集和其他服务端
+"""
+
+import json
+import time
+import socket
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable
+
+import requests
+import websocket
+
+from ws_compression import PerMessageDeflate, frame_size
+from jitter import reconnect_delay
+
+logger = logging.getLogger(__name__)
+
+
+class KomariLink:
+    def __init__(self, endpoint: str, token: str, ws_compression: bool = False, reconnect_delay: float = 5,
+                 jitter: bool = True, jitter_window: float = 10, ignore_unsafe_cert: bool = False,
+                 on_message: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 ping_interval: float = 5, ping_timeout: float = 3, send_timeout: float = 5):
+        """
+        Args:
+            endpoint: Komari服务器地址
+            token: 该服务器上的客户端令牌
+            ws_compression: 是否协商permessage-deflate压缩
+            reconnect_delay: 断开后的重连等待时间（秒）
+            jitter: 是否按令牌错开重连时间
+            jitter_window: 重连的分散窗口（秒）
+            ignore_unsafe_cert: 上报基础信息时忽略不安全的证书
+            on_message: 收到服务端JSON消息时的回调（只有主服务器的控制指令需要处理）
+            ping_interval: 发送ping的间隔（秒，0表示不发送）
+            ping_timeout: 等待pong的时间（秒），超时视为连接已断开
+            send_timeout: 单条数据发送阻塞超过该时间（秒）视为连接已断开，0表示不限时
+        """
+        self.endpoint = endpoint
+        self.token = token
+        self.ws_deflate = PerMessageDeflate() if ws_compression else None
+        self.reconnect_delay = reconnect_delay
+        self.jitter = jitter
+        self.jitter_window = jitter_window
+        self.ignore_unsafe_cert = ignore_unsafe_cert
+        self.on_message = on_message
+        self.ping_interval = ping_interval
+        if ping_interval > 0 and not 0 < ping_timeout < ping_interval:
+            # 超时不小于间隔时下一个ping会在判定超时前发出，配置不满足时明确提示后再调整
+            adjusted = ping_interval / 2
+            logger.warning(f"KOMARI_PING_TIMEOUT={ping_timeout:g} 需大于0且小于KOMARI_PING_INTERVAL={ping_interval:g}，"
+                           f"{endpoint} 按 {adjusted:g} 秒处理")
+            ping_timeout = adjusted
+        self.ping_timeout = ping_timeout if ping_interval > 0 else 0
+        self.send_timeout = send_timeout
+        self.last_ping = 0  # 最近一次发送ping的时间
+        self.ping_waiting = 0  # 最早一个还没有收到回应的ping的发送时间，0表示没有
+        self.aborted_ping = 0  # 已因超时断开的那次ping，避免重复断开
+
+        self.running = False
+        self.ws = None
+        self.ws_thread = None
+        self.reconnect_timer = None
+
+        # 发送线程的待发送数据：监控数据只保留最新一条，基础信息只保留最新一份
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = None
+        self.pending_basic_info = None
+        self.sender_thread = None
+        self.basic_info_thread = None  # 正在上报基础信息的线程，没有上报时为None
+
+        # 统计
+        self.samples_sent = 0
+        self.bytes_sent = 0  # WebSocket帧在线路上的字节数（不含TLS开销）
+        self.dropped = 0  # 发送跟不上时被更新的数据替换掉的条数
+        self.send_errors = 0
+        self.connects = 0
+        self.first_sent = 0  # 第一帧发出的时间
+        self.last_basic_info_report = 0
+
+        # 断线检测：Komari不确认上报帧，以最后一次收到服务端数据（pong或消息）作为连接存活的依据
+        self.last_alive = 0
+        self.send_started = 0  # 正在进行的发送开始的时间，0表示没有发送
+        self.disconnects = 0
+        self.last_detect_seconds = None  # 最近一次从最后存活到判定断开的时间
+        self.max_detect_seconds = 0.0
+
+    @property
+    def connected(self) -> bool:
+        ws = self.ws
+        return bool(ws and ws.sock and ws.sock.connected)
+
+    def start(self):
+        """启动发送线程并建立WebSocket连接"""
+        self.running = True
+        self.sender_thread = threading.Thread(target=self.sender_loop, name=f"komari-send-{self.endpoint}", daemon=True)
+        self.sender_thread.start()
+        self.connect()
+
+    def stop(self):
+        """关闭连接（之后不会再重连）"""
+        self.running = False
+        self.wakeup.set()
+        if self.reconnect_timer:
+            self.reconnect_timer.cancel()
+        if self.ws:
+            self.ws.close()
+
+    def connect(self):
+        """建立WebSocket连接"""
+        if not self.running:
+            return
+        try:
+            ws_url = f"{self.endpoint.replace('https', 'wss').replace('http', 'ws')}/api/clients/report?token={self.token}"
+            logger.info(f"尝试连接WebSocket: {ws_url}")
+
+            header = None
+            if self.ws_deflate:
+                # 新连接在握手确认前不能发送压缩帧
+                self.ws_deflate.enabled = False
+                header = [self.ws_deflate.offer_header()]
+            self.ws = websocket.WebSocketApp(
+                ws_url,
+                header=header,
+                on_open=self.on_open,
+                on_message=self.on_ws_message,
+                on_error=self.on_error,
+                on_close=self.on_close,
+                on_pong=self.on_pong
+            )
+
+            # ping由本连接的发送线程发送（见sender_loop），不再为每条连接单独启动ping线程
+            self.ws_thread = threading.Thread(target=self.ws.run_forever, daemon=True)
+            self.ws_thread.start()
+
+        except Exception as e:
+            logger.error(f"WebSocket连接失败({self.endpoint}): {e}")
+            self.schedule_reconnect()
+
+    def schedule_reconnect(self):
+        """安排重连（启用jitter时按本连接的令牌错开）"""
+        if not self.running:
+            return
+        delay = reconnect_delay(self.reconnect_delay, self.token, self.jitter, self.jitter_window)
+        logger.info(f"{delay:.1f}秒后尝试重连 {self.endpoint}...")
+        self.reconnect_timer = threading.Timer(delay, self.connect)
+        self.reconnect_timer.daemon = True
+        self.reconnect_timer.start()
+
+    def on_open(self, ws):
+        logger.info(f"WebSocket连接已建立: {self.endpoint}")
+        self.connects += 1
+        self.last_alive = time.time()
+        self.last_ping = self.ping_waiting = 0
+        # 发出连接建立前提交的最新一条数据
+        self.wakeup.set()
+        if self.ws_deflate:
+            if self.ws_deflate.accept(ws.sock.getheaders()):
+                self.ws_deflate.install(ws.sock)
+                logger.info("WebSocket已协商permessage-deflate压缩")
+            else:
+                logger.info("服务端未接受permessage-deflate，使用未压缩传输")
+
+    def on_pong(self, ws, data):
+        self.last_alive = time.time()
+        self.ping_waiting = 0
+
+    def on_ws_message(self, ws, message):
+        self.last_alive = time.time()
+        try:
+            data = json.loads(message)
+            logger.info(f"收到WebSocket消息({self.endpoint}): {data}")
+            if isinstance(data, dict) and self.on_message:
+                self.on_message(data)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析失败: {e}")
+        except Exception as e:
+            logger.error(f"处理WebSocket消息异常: {e}")
+
+    def on_error(self, ws, error):
+        logger.error(f"WebSocket错误({self.endpoint}): {error}")
+
+    def on_close(self, ws, close_status_code, close_msg):
+        logger.info(f"WebSocket连接已关闭: {self.endpoint}")
+        if ws is not self.ws or not self.running:
+            # 主动关闭或已被替换的旧连接
+            return
+        if self.last_alive:
+            detect = time.time() - self.last_alive
+            self.last_detect_seconds = round(detect, 3)
+            self.max_detect_seconds = max(self.max_detect_seconds, self.last_detect_seconds)
+            logger.info(f"{self.endpoint} 距最后一次收到服务端数据 {detect:.1f} 秒后判定断开")
+        self.disconnects += 1
+        self.last_alive = 0
+        self.schedule_reconnect()
+
+    def abort(self, reason: str):
+        """
+        判定连接已失效：直接关闭底层socket，阻塞中的发送和接收会立即出错，
+        随后由on_close触发重连（正常关闭需要先发送关闭帧，在失效的连接上同样会阻塞）
+        """
+        ws = self.ws
+        logger.warning(f"{self.endpoint} {reason}，断开重连")
+        try:
+            ws.sock.sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+    def submit(self, message: str):
+        """
+        提交一条已序列化的监控数据，立即返回
+
+        上一条还没发出时用新数据替换；未连接时保留最新一条，连接建立后立即发送，
+        启动时不必等到下一次采集才发出第一帧。上一条发送阻塞超过send_timeout时判定连接已失效
+        """
+        send_started = self.send_started
+        if self.send_timeout > 0 and send_started and time.time() - send_started > self.send_timeout:
+            self.send_started = 0
+            self.abort(f"发送阻塞超过{self.send_timeout:g}秒")
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = message
+        self.wakeup.set()
+
+    def submit_basic_info(self, body: bytes, headers: Dict[str, str]):
+        """
+        提交一份已序列化的基础信息，立即返回
+
+        上报是可能阻塞30秒的HTTP请求，在单独的线程中进行，不占用发送线程（监控数据和ping照常发送）；
+        上一份还在上报时只保留最新一份，由该线程随后上报
+        """
+        with self.lock:
+            self.pending_basic_info = (body, headers)
+            if self.basic_info_thread is not None:
+                return
+            self.basic_info_thread = threading.Thread(target=self.basic_info_loop, daemon=True,
+                                                      name=f"komari-info-{self.endpoint}")
+            thread = self.basic_info_thread
+        thread.start()
+
+    def basic_info_loop(self):
+        """基础信息上报线程：上报完待上报的基础信息后退出"""
+        while True:
+            with self.lock:
+                basic_info, self.pending_basic_info = self.pending_basic_info, None
+                if basic_info is None or not self.running:
+                    self.basic_info_thread = None
+                    return
+            self.upload_basic_info(*basic_info)
+
+    def sender_loop(self):
+        """
+        发送线程：阻塞只影响本连接
+
+        启用ping时每隔ping_interval发送一个ping，数据帧不等待pong；失效的连接由ping_timeout
+        （见keepalive）和send_timeout（见submit）发现
+        """
+        while self.running:
+            self.wakeup.wait(self.keepalive())
+            self.wakeup.clear()
+            connected = self.connected
+            with self.lock:
+                message = None
+                if connected:
+                    message, self.pending = self.pending, None
+
+            if message is not None:
+                self.send_started = time.time()
+                try:
+                    self.send(message)
+                except Exception as e:
+                    self.send_errors += 1
+                    logger.error(f"发送监控数据失败({self.endpoint}): {e}")
+                finally:
+                    self.send_started = 0
+
+    def keepalive(self) -> Optional[float]:
+        """
+        发送线程中的ping：按间隔发送，ping发出后超过ping_timeout、且这段时间内没有收到服务端的
+        任何数据时判定连接已失效。服务端处理得慢时pong排在积压的数据帧之后，只要仍在陆续回应就不会被断开
+
+        Returns:
+            发送线程最多等待多久（秒）需要再检查一次，None表示不需要
+        """
+        if self.ping_interval <= 0:
+            return None
+        if not self.connected:
+            return self.ping_interval
+        now = time.time()
+        waiting = self.ping_waiting
+        if waiting:
+            deadline = max(waiting, self.last_alive) + self.ping_timeout
+            if now > deadline:
+                if waiting != self.aborted_ping:
+                    self.aborted_ping = waiting
+                    self.abort(f"{self.ping_timeout:g}秒内未收到pong")
+                return self.ping_interval
+        if now - self.last_ping >= self.ping_interval:
+            self.ping()
+            now = self.last_ping
+        wait = self.last_ping + self.ping_interval - now
+        if self.ping_waiting:
+            wait = min(wait, max(self.ping_waiting, self.last_alive) + self.ping_timeout - now)
+        return max(wait, 0.05)
+
+    def ping(self):
+        self.last_ping = time.time()
+        if not self.ping_waiting:
+            self.ping_waiting = self.last_ping
+        try:
+            self.ws.sock.ping()
+        except Exception as e:
+            logger.debug(f"发送ping失败({self.endpoint}): {e}")
+
+    def send(self, message: str):
+        """通过WebSocket发送一条监控数据"""
+        if self.ws_deflate and self.ws_deflate.enabled:
+            frame = self.ws_deflate.build_frame(message)
+            self.ws.sock.send_frame(frame)
+            self.bytes_sent += frame_size(len(frame.data))
+        else:
+            self.ws.send(message)
+            self.bytes_sent += frame_size(len(message.encode('utf-8')))
+        self.samples_sent += 1
+        if not self.first_sent:
+            self.first_sent = time.time()
+
+    def upload_basic_info(self, body: bytes, headers: Dict[str, str]):
+        """上报基础信息"""
+        try:
+            url = f"{self.endpoint}/api/clients/uploadBasicInfo?token={self.token}"
+            response = requests.post(url, data=body, headers=headers, timeout=30, verify=not self.ignore_unsafe_cert)
+            response.raise_for_status()
+            logger.info(f"基础信息上报成功: {self.endpoint}")
+            self.last_basic_info_report = time.time()
+        except Exception as e:
+            logger.error(f"基础信息上报失败({self.endpoint}): {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.endpoint,
+            "connected": self.connected,
+            "connects": self.connects,
+            "samples_sent": self.samples_sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "send_errors": self.send_errors,
+            "disconnects": self.disconnects,
+            "last_detect_seconds": self.last_detect_seconds,
+            "max_detect_seconds": self.max_detect_seconds,
+            "last_basic_info_report": self.last_basic_info_report
+        }
@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控数据长期归档
+在代理所在主机上保存数月的每台路由器历史，用于容量规划，与Komari的保留期无关。
+按Gorilla的思路压缩：时间戳（毫秒）和累计流量等单调增长的字段保存二阶差分，
+其他整数字段保存与上一个值的差，浮点字段与上一个值的位模式异或，都用变长前缀编码，
+字段不变时只占1位。CPU、负载只有两位小数，异或后有效位很长，按百分之一取整后同样保存差值。
+
+文件由固定大小的块组成，每块独立解码。写入方只在内存中维护当前块，
+定期把它写回原位置（一次块大小的写入），写满后封存，之后不再修改；
+读取方逐块读取块头，跳过时间范围之外的块，内存占用与文件大小无关。
+
+文件布局（小端）:
+    文件头（占一个块）:
+        0   4s  魔数 b"IKMA"
+        4   H   版本
+        6   H   字段数量 N
+        8   I   块大小
+        12      字段名（逗号分隔的ASCII，以\\0结尾），随后每个字段的编码方式（f/d/i，见 field_kind，以\\0结尾）
+    数据块:
+        0   4s  魔数 b"IKAB"
+        4   H   样本数
+        6   H   标志（1表示已封存）
+        8   q   第一个样本的时间戳（毫秒，解码起点）
+        16  q   最小时间戳
+        24  q   最大时间戳
+        32  I   数据位数
+        36  I   CRC32（块头其余部分和数据）
+        40      位流：每个样本依次为时间戳二阶差分、各字段的值
+
+用法:
+    python metrics_archive.py info /app/logs/archive-default.ika
+    python metrics_archive.py dump /app/logs/archive-default.ika --start 1d --fields cpu_usage,net_down
+    python metrics_archive.py agg /app/logs/archive-default.ika --start 2026-10-01 --bucket 1d
+"""
+
+import os
+import re
+import json
+import sys
+import time
+import zlib
+import struct
+import logging
+import argparse
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sample_record import NAMES
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IKMA"
+BLOCK_MAGIC = b"IKAB"
+VERSION = 1
+BLOCK_SIZE = 4096
+FILE_HEADER = struct.Struct("<4sHHI")
+BLOCK_HEADER = struct.Struct("<4sHHqqqII")
+SEALED = 1
+
+# 字段的编码方式：
+#   f 浮点：两位小数以内的值（CPU、负载）按百分之一取整后保存差值，其他值与上一个值的位模式异或
+#   d 单调增长的整数（累计流量、运行时间）：与时间戳一样保存二阶差分
+#   i 其他整数：保存与上一个值的差
+FLOAT_FIELDS = ("cpu_usage", "load1", "load5", "load15")
+DELTA2_FIELDS = ("net_total_up", "net_total_down", "uptime")
+# 单调累加的计数器，聚合时额外给出区间内的增量
+COUNTER_FIELDS = ("net_total_up", "net_total_down")
+
+DOUBLE = struct.Struct(">d")
+UINT64 = struct.Struct(">Q")
+SCALE = 100
+INT_BITS_MAX = 69  # 整数编码最长的一种：5位前缀 + 64位
+FLOAT_BITS_MAX = 78  # 浮点编码最长的一种：1位方式 + 2位前缀 + 5位前导零 + 6位长度 + 64位
+# 整数编码：(前缀, 前缀位数, 数值位数)，0单独用1位 '0' 表示
+INT_BUCKETS = ((0b10, 2, 8), (0b110, 3, 16), (0b1110, 4, 24), (0b11110, 5, 32), (0b11111, 5, 64))
+
+
+def field_kind(name: str) -> str:
+    if name in FLOAT_FIELDS:
+        return "f"
+    return "d" if name in DELTA2_FIELDS else "i"
+
+
+def max_sample_bits(kinds: str) -> int:
+    """一个样本最长的编码位数（时间戳 + 各字段），块中剩余的位数不足时封存该块"""
+    return INT_BITS_MAX + sum(FLOAT_BITS_MAX if kind == "f" else INT_BITS_MAX for kind in kinds)
+
+
+def zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def scaled(value: float) -> int:
+    """按百分之一取整，超出范围（或NaN）时为0"""
+    return round(value * SCALE) if abs(value) < 1e13 else 0
+
+
+class BitWriter:
+    """按位追加，满8字节后转为bytes"""
+
+    __slots__ = ("data", "acc", "bits")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.acc = 0
+        self.bits = 0
+
+    def write(self, value: int, width: int):
+        self.acc = (self.acc << width) | value
+        self.bits += width
+        if self.bits >= 64:
+            rest = self.bits & 7
+            self.data += (self.acc >> rest).to_bytes(self.bits >> 3, "big")
+            self.acc &= (1 << rest) - 1
+            self.bits = rest
+
+    @property
+    def size(self) -> int:
+        """已写入的位数"""
+        return len(self.data) * 8 + self.bits
+
+    def getvalue(self) -> bytes:
+        if not self.bits:
+            return bytes(self.data)
+        pad = -self.bits & 7
+        return bytes(self.data) + (self.acc << pad).to_bytes((self.bits + pad) >> 3, "big")
+
+
+class BlockEncoder:
+    """一个数据块的编码状态"""
+
+    def __init__(self, kinds: str, first_ts: int):
+        self.kinds = kinds
+        self.first_ts = first_ts
+        self.min_ts = self.max_ts = first_ts
+        self.prev_ts = first_ts
+        self.prev_delta = 0
+        self.prev = [0] * len(kinds)  # 整数字段为上一个值，浮点字段为上一个值的位模式
+        self.deltas = [0] * len(kinds)  # 二阶差分字段上一次的差值
+        self.scaled = [0] * len(kinds)  # 浮点字段上一个值按百分之一取整的结果
+        self.window = [None] * len(kinds)  # 浮点字段上一次异或的 (前导零, 末尾零)
+        self.count = 0  # 已完整写入的样本数
+        self.bits = 0  # 已完整写入的样本占用的位数，写入中途出错时只保存这些位
+        self.writer = BitWriter()
+
+    def append(self, ts: int, values: Sequence[Any]):
+        write = self.writer.write
+        write_int = self.write_int
+        delta = ts - self.prev_ts
+        write_int(zigzag(delta - self.prev_delta))
+        self.prev_ts, self.prev_delta = ts, delta
+
+        prev = self.prev
+        for index, kind in enumerate(self.kinds):
+            value = values[index]
+            if kind == "i":
+                value = round(value)
+                write_int(zigzag(value - prev[index]))
+                prev[index] = value
+                continue
+            if kind == "d":
+                value = round(value)
+                delta = value - prev[index]
+                write_int(zigzag(delta - self.deltas[index]))
+                prev[index], self.deltas[index] = value, delta
+                continue
+
+            value = float(value)
+            bits = UINT64.unpack(DOUBLE.pack(value))[0]
+            xor = bits ^ prev[index]
+            prev[index] = bits
+            count = scaled(value)
+            if count / SCALE == value:
+                write(0, 1)
+                write_int(zigzag(count - self.scaled[index]))
+            else:
+                write(1, 1)
+                self.write_xor(index, xor)
+            self.scaled[index] = count
+        self.min_ts = min(self.min_ts, ts)
+        self.max_ts = max(self.max_ts, ts)
+        self.count += 1
+        self.bits = self.writer.size
+
+    def write_int(self, value: int):
+        """0 → '0'；其余按大小用 '10'+8位、'110'+16位、'1110'+24位、'11110'+32位、'11111'+64位"""
+        if not value:
+            self.writer.write(0, 1)
+            return
+        for prefix, prefix_bits, width in INT_BUCKETS:
+            if value < 1 << width:
+                self.writer.write((prefix << width) | value, prefix_bits + width)
+                return
+        raise ValueError("数值超出64位范围")
+
+    def write_xor(self, index: int, xor: int):
+        """Gorilla的浮点编码：相同 '0'；有效位落在上一次的窗口内 '10'+窗口；否则 '11'+前导零+长度+有效位"""
+        write = self.writer.write
+        if not xor:
+            write(0, 1)
+            return
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        last = self.window[index]
+        if last is not None and leading >= last[0] and trailing >= last[1]:
+            width = 64 - last[0] - last[1]
+            write((0b10 << width) | (xor >> last[1]), 2 + width)
+        else:
+            width = 64 - leading - trailing
+            write((0b11 << 11) | (leading << 6) | (width - 1), 13)
+            write(xor >> trailing, width)
+            self.window[index] = (leading, trailing)
+
+    def encode(self, block_size: int, sealed: bool) -> bytes:
+        """生成完整的块（补零到块大小），只包含已完整写入的样本"""
+        payload = self.writer.getvalue()[:(self.bits + 7) >> 3]
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, self.count, SEALED if sealed else 0,
+                                   self.first_ts, self.min_ts, self.max_ts, self.bits, 0)
+        crc = zlib.crc32(payload, zlib.crc32(header[:-4]))
+        block = header[:-4] + struct.pack("<I", crc) + payload
+        if len(block) > block_size:
+            raise ValueError(f"块数据 {len(block)} 字节超出块大小 {block_size}")
+        return block + bytes(block_size - len(block))
+
+
+def parse_block(block: bytes) -> Optional[tuple]:
+    """检查块头和CRC，返回 (样本数, 标志, 起始时间戳, 最小时间戳, 最大时间戳, 位数, 数据)，无效时返回None"""
+    if len(block) < BLOCK_HEADER.size:
+        return None
+    magic, count, flags, first_ts, min_ts, max_ts, bits, crc = BLOCK_HEADER.unpack_from(block)
+    if magic != BLOCK_MAGIC or bits > (len(block) - BLOCK_HEADER.size) * 8:
+        return None
+    payload = block[BLOCK_HEADER.size:BLOCK_HEADER.size + ((bits + 7) >> 3)]
+    if zlib.crc32(payload, zlib.crc32(block[:BLOCK_HEADER.size - 4])) != crc:
+        return None
+    return count, flags, first_ts, min_ts, max_ts, bits, payload
+
+
+def decode_block(kinds: str, count: int, first_ts: int, bits: int, payload: bytes) -> Iterator[Tuple[int, list]]:
+    """逐个解码块中的样本，产出 (毫秒时间戳, 各字段的值)"""
+    # 转成'0'/'1'字符串后按下标读取，比逐位移位快得多
+    stream = bin(int.from_bytes(payload, "big"))[2:].zfill(len(payload) * 8) if payload else ""
+    pos = 0
+
+    def read_int() -> int:
+        """读取一个整数（已还原zigzag）"""
+        nonlocal pos
+        if stream[pos] == "0":
+            pos += 1
+            return 0
+        if stream[pos + 1] == "0":
+            width, pos = 8, pos + 2
+        elif stream[pos + 2] == "0":
+            width, pos = 16, pos + 3
+        elif stream[pos + 3] == "0":
+            width, pos = 24, pos + 4
+        elif stream[pos + 4] == "0":
+            width, pos = 32, pos + 5
+        else:
+            width, pos = 64, pos + 5
+        value = int(stream[pos:pos + width], 2)
+        pos += width
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    ts, delta = first_ts, 0
+    prev = [0] * len(kinds)
+    deltas = [0] * len(kinds)
+    counts = [0] * len(kinds)
+    window = [(0, 0)] * len(kinds)
+    floats = [0.0] * len(kinds)
+    for _ in range(count):
+        delta += read_int()
+        ts += delta
+        values = []
+        for index, kind in enumerate(kinds):
+            if kind == "i":
+                prev[index] += read_int()
+                values.append(prev[index])
+                continue
+            if kind == "d":
+                deltas[index] += read_int()
+                prev[index] += deltas[index]
+                values.append(prev[index])
+                continue
+
+            if stream[pos] == "0":
+                pos += 1
+                counts[index] += read_int()
+                value = counts[index] / SCALE
+                prev[index] = UINT64.unpack(DOUBLE.pack(value))[0]
+            else:
+                pos += 1
+                if stream[pos] == "1":
+                    if stream[pos + 1] == "0":
+                        leading, trailing = window[index]
+                        pos += 2
+                    else:
+                        leading = int(stream[pos + 2:pos + 7], 2)
+                        width = int(stream[pos + 7:pos + 13], 2) + 1
+                        trailing = 64 - leading - width
+                        window[index] = (leading, trailing)
+                        pos += 13
+                    width = 64 - leading - trailing
+                    prev[index] ^= int(stream[pos:pos + width], 2) << trailing
+                    pos += width
+                    value = DOUBLE.unpack(UINT64.pack(prev[index]))[0]
+                else:
+                    pos += 1
+                    value = floats[index]
+                counts[index] = scaled(value)
+            floats[index] = value
+            values.append(value)
+        yield ts, values
+    if pos > bits:
+        raise ValueError("块数据不完整")
+
+
+def read_file_header(f, path: str) -> Tuple[List[str], str, int]:
+    """读取文件头，返回 (字段名, 字段类型, 块大小)"""
+    f.seek(0)
+    head = f.read(FILE_HEADER.size)
+    if len(head) < FILE_HEADER.size:
+        raise ValueError(f"{path} 不是归档文件（文件头不完整）")
+    magic, version, field_count, block_size = FILE_HEADER.unpack(head)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} 不是归档文件或版本不支持")
+    names, kinds = f.read(block_size - FILE_HEADER.size).split(b"\0")[:2]
+    names = names.decode("ascii").split(",")
+    kinds = kinds.decode("ascii")
+    if len(names) != field_count or len(kinds) != field_count:
+        raise ValueError(f"{path} 文件头中的字段信息不一致")
+    return names, kinds, block_size
+
+
+class ArchiveWriter:
+    def __init__(self, path: str, flush_interval: float = 60, block_size: int = BLOCK_SIZE,
+                 fields: Sequence[str] = NAMES):
+        """
+        Args:
+            path: 归档文件路径
+            flush_interval: 把当前块写回文件的间隔（秒），块写满时立即写入
+            block_size: 块大小（字节），只在新建文件时使用
+            fields: 归档的字段，从样本记录中按名称读取
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fields = list(fields)
+        self.kinds = "".join(field_kind(name) for name in self.fields)
+        self.max_sample_bits = max_sample_bits(self.kinds)
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.encoder: Optional[BlockEncoder] = None
+        self.offset = block_size  # 当前块在文件中的位置
+        self.dirty = False
+        self.flushed_at = time.time()
+        self.samples = 0  # 本次运行写入的样本数
+        self.blocks_sealed = 0
+        self.open()
+
+    def open(self):
+        """打开或新建归档文件；字段不同的旧文件改名保留，未封存的最后一块解码后继续写入"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            try:
+                with open(self.path, "rb") as f:
+                    names, kinds, block_size = read_file_header(f, self.path)
+                if names != self.fields or kinds != self.kinds:
+                    raise ValueError("字段与当前版本不同")
+                self.block_size = block_size
+            except Exception as e:
+                old = f"{self.path}.old-{int(time.time())}"
+                logger.warning(f"归档文件 {self.path} 无法继续写入({e})，已改名为 {old}")
+                os.replace(self.path, old)
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self.fd).st_size
+        if size == 0:
+            names = ",".join(self.fields).encode("ascii") + b"\0" + self.kinds.encode("ascii") + b"\0"
+            header = FILE_HEADER.pack(MAGIC, VERSION, len(self.fields), self.block_size) + names
+            os.pwrite(self.fd, header + bytes(self.block_size - len(header)), 0)
+            size = self.block_size
+        elif size % self.block_size:
+            # 扩展文件时中断留下的不完整块
+            size -= size % self.block_size
+            os.ftruncate(self.fd, size)
+
+        self.offset = size
+        if size > self.block_size:
+            last = parse_block(os.pread(self.fd, self.block_size, size - self.block_size))
+            if last is None:
+                logger.warning(f"归档文件 {self.path} 最后一块已损坏，丢弃该块")
+                self.offset = size - self.block_size
+            elif not last[1] & SEALED:
+                # 重新编码最后一块的样本，得到相同的位流和编码状态
+                count, _, first_ts, _, _, bits, payload = last
+                self.offset = size - self.block_size
+                self.encoder = BlockEncoder(self.kinds, first_ts)
+                for ts, values in decode_block(self.kinds, count, first_ts, bits, payload):
+                    self.encoder.append(ts, values)
+
+    @property
+    def capacity(self) -> int:
+        """每块可用的位数"""
+        return (self.block_size - BLOCK_HEADER.size) * 8
+
+    def append(self, sample, timestamp: float = None):
+        """
+        追加一个样本
+
+        Args:
+            sample: MonitoringSample，或字段名相同的其他对象
+            timestamp: 采集时间，默认为当前时间
+        """
+        now = time.time()
+        ts = int((timestamp if timestamp is not None else now) * 1000)
+        values = [getattr(sample, name, 0) or 0 for name in self.fields]
+        with self.lock:
+            if self.fd is None:
+                return
+            encoder = self.encoder
+            if encoder is not None and (encoder.bits + self.max_sample_bits > self.capacity or encoder.count >= 0xFFFF):
+                self.seal()
+                encoder = None
+            if encoder is None:
+                encoder = self.encoder = BlockEncoder(self.kinds, ts)
+            committed = (encoder.count, encoder.bits, encoder.min_ts, encoder.max_ts)
+            try:
+                encoder.append(ts, values)
+                if encoder.bits > self.capacity:
+                    raise ValueError("样本超出块的剩余空间")
+            except Exception:
+                # 编码状态可能停在样本中途：只保留之前完整的样本并封存，下一个样本从新块开始
+                encoder.count, encoder.bits, encoder.min_ts, encoder.max_ts = committed
+                if encoder.count:
+                    self.seal()
+                else:
+                    self.encoder = None
+                raise
+            self.samples += 1
+            self.dirty = True
+            flush = now - self.flushed_at >= self.flush_interval
+        if flush:
+            self.flush()
+
+    def seal(self):
+        """封存写满的当前块，调用时已持有锁"""
+        os.pwrite(self.fd, self.encoder.encode(self.block_size, sealed=True), self.offset)
+        self.offset += self.block_size
+        self.encoder = None
+        self.dirty = False
+        self.blocks_sealed += 1
+
+    def flush(self):
+        """把当前块写回文件"""
+        with self.lock:
+            self.flushed_at = time.time()
+            if not self.dirty or self.encoder is None or self.fd is None:
+                return
+            block = self.encoder.encode(self.block_size, sealed=False)
+            self.dirty = False
+        try:
+            os.pwrite(self.fd, block, self.offset)
+            os.fsync(self.fd)
+        except Exception as e:
+            logger.error(f"写入归档文件失败: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "samples": self.samples,
+            "blocks_sealed": self.blocks_sealed,
+            "bytes": self.offset + (self.block_size if self.encoder else 0)
+        }
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+class ArchiveReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.f = open(path, "rb")
+        self.fields, self.kinds, self.block_size = read_file_header(self.f, path)
+        self.bad_blocks = 0
+
+    def blocks(self, start_ms: int = None, end_ms: int = None) -> Iterator[tuple]:
+        """逐块读取，只读块头即可跳过时间范围之外的块"""
+        f, block_size = self.f, self.block_size
+        offset = block_size
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        while offset + block_size <= size:
+            f.seek(offset)
+            head = f.read(BLOCK_HEADER.size)
+            offset += block_size
+            _, count, _, _, min_ts, max_ts, _, _ = BLOCK_HEADER.unpack(head)
+            if not count or (start_ms is not None and max_ts < start_ms) or (end_ms is not None and min_ts >= end_ms):
+                continue
+            block = parse_block(head + f.read(block_size - BLOCK_HEADER.size))
+            if block is None:
+                self.bad_blocks += 1
+                continue
+            yield block
+
+    def scan(self, start: float = None, end: float = None,
+             fields: Sequence[str] = None) -> Iterator[Tuple[float, list]]:
+        """
+        按时间范围逐个产出样本
+
+        Args:
+            start: 起始时间戳（秒，含）
+            end: 结束时间戳（秒，不含）
+            fields: 需要的字段，默认为全部
+
+        Yields:
+            (时间戳, 各字段的值)
+        """
+        start_ms = int(start * 1000) if start is not None else None
+        end_ms = int(end * 1000) if end is not None else None
+        columns = [self.fields.index(name) for name in fields] if fields else None
+        for count, _, first_ts, _, _, bits, payload in self.blocks(start_ms, end_ms):
+            for ts, values in decode_block(self.kinds, count, first_ts, bits, payload):
+                if (start_ms is not None and ts < start_ms) or (end_ms is not None and ts >= end_ms):
+                    continue
+                yield ts / 1000, [values[i] for i in columns] if columns else values
+
+    def info(self) -> Dict[str, Any]:
+        """块数、样本数和时间范围（只读块头）"""
+        blocks = samples = 0
+        first = last = None
+        f = self.f
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        for offset in range(self.block_size, size - self.block_size + 1, self.block_size):
+            f.seek(offset)
+            magic, count, _, _, min_ts, max_ts, _, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            if magic != BLOCK_MAGIC or not count:
+                continue
+            blocks += 1
+            samples += count
+            first = min_ts if first is None else min(first, min_ts)
+            last = max_ts if last is None else max(last, max_ts)
+        return {"size": size, "blocks": blocks, "samples": samples,
+                "first": first / 1000 if first is not None else None,
+                "last": last / 1000 if last is not None else None}
+
+    def close(self):
+        self.f.close()
+
+
+def aggregate(rows: Iterator[Tuple[float, list]], fields: Sequence[str], bucket: float) -> Iterator[Dict[str, Any]]:
+    """
+    按时间区间流式聚合，每个区间产出各字段的 样本数/最小/平均/最大；
+    计数器字段另给出区间内的增量（计数器变小时视为重置，从0重新累计）
+    """
+    counters = [index for index, name in enumerate(fields) if name in COUNTER_FIELDS]
+    current, stats, increase = None, None, None
+    previous = [None] * len(fields)
+    offset = time.localtime().tm_gmtoff  # 按本地时间对齐区间（例如按天聚合时从0点开始）
+    for ts, values in rows:
+        key = int((ts + offset) // bucket * bucket - offset)
+        if key != current:
+            if current is not None:
+                yield summarize(current, fields, stats, increase)
+            current = key
+            stats = [[0, None, None, 0.0] for _ in fields]
+            increase = [0] * len(fields)
+        for index, value in enumerate(values):
+            entry = stats[index]
+            entry[0] += 1
+            entry[1] = value if entry[1] is None or value < entry[1] else entry[1]
+            entry[2] = value if entry[2] is None or value > entry[2] else entry[2]
+            entry[3] += value
+        for index in counters:
+            value, last = values[index], previous[index]
+            if last is not None:
+                increase[index] += value - last if value >= last else value
+            previous[index] = value
+    if current is not None:
+        yield summarize(current, fields, stats, increase)
+
+
+def summarize(key: int, fields: Sequence[str], stats: list, increase: list) -> Dict[str, Any]:
+    result = {"time": key, "samples": stats[0][0] if stats else 0}
+    for index, name in enumerate(fields):
+        count, low, high, total = stats[index]
+        result[name] = {"min": low, "avg": total / count if count else None, "max": high}
+        if name in COUNTER_FIELDS:
+            result[name]["increase"] = increase[index]
+    return result
+
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_duration(text: str) -> float:
+    """'30s'、'10m'、'1h'、'1d'、'1w' 或秒数"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw]?)", text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"无法识别的时长: {text}")
+    return float(match.group(1)) * DURATION_UNITS.get(match.group(2) or "s")
+
+
+def parse_time(text: str) -> float:
+    """'7d'、'-7d' 等表示多久之前、'2026-10-01'、'2026-10-01 12:00[:00]'（本地时间）或时间戳"""
+    text = text.strip()
+    if re.fullmatch(r"-?\d+(?:\.\d+)?[smhdw]", text):
+        return time.time() - parse_duration(text.lstrip("-"))
+    for layout in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(text, layout))
+        except ValueError:
+            pass
+    try:
+        return float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法识别的时间: {text}")
+
+
+def format_time(ts: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def format_value(value) -> str:
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='读取监控数据归档')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info = subparsers.add_parser('info', help='文件概况')
+    info.add_argument('path', help='归档文件路径（ARCHIVE_FILE）')
+
+    for name, help_text in (('dump', '按时间范围输出样本（CSV）'), ('agg', '按时间区间聚合')):
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument('path', help='归档文件路径（ARCHIVE_FILE）')
+        command.add_argument('--start', type=parse_time, help='起始时间，如 7d（7天前）、2026-10-01、2026-10-01 12:00')
+        command.add_argument('--end', type=parse_time, help='结束时间（不含）')
+        command.add_argument('--fields', help='逗号分隔的字段名，默认为全部')
+        if name == 'agg':
+            command.add_argument('--bucket', type=parse_duration, default=3600, help='聚合区间，如 10m、1h、1d')
+            command.add_argument('--json', action='store_true', help='每个区间输出一行JSON')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"归档文件不存在: {args.path}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        reader = ArchiveReader(args.path)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if args.command == 'info':
+        summary = reader.info()
+        print(f"文件大小: {summary['size']} 字节，块 {summary['blocks']} 个（每块 {reader.block_size} 字节），"
+              f"样本 {summary['samples']} 个")
+        if summary["samples"]:
+            payload = summary["size"] - reader.block_size
+            print(f"时间范围: {format_time(summary['first'])} ~ {format_time(summary['last'])}")
+            print(f"平均每个样本 {payload / summary['samples']:.1f} 字节（含块头和块末空余）")
+        print(f"字段: {', '.join(reader.fields)}")
+        return
+
+    fields = [name.strip() for name in args.fields.split(",")] if args.fields else reader.fields
+    unknown = [name for name in fields if name not in reader.fields]
+    if unknown:
+        print(f"归档中没有这些字段: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+    rows = reader.scan(args.start, args.end, fields)
+    try:
+        if args.command == 'dump':
+            print("time," + ",".join(fields))
+            for ts, values in rows:
+                print(f"{format_time(ts)}," + ",".join(str(value) for value in values))
+        elif args.json:
+            for result in aggregate(rows, fields, args.bucket):
+                print(json.dumps(result, ensure_ascii=False))
+        else:
+            print(f"{'区间开始':<20}{'样本':>6}  " + "  ".join(f"{name}(min/avg/max)" for name in fields))
+            for result in aggregate(rows, fields, args.bucket):
+                columns = []
+                for name in fields:
+                    entry = result[name]
+                    text = "/".join(format_value(entry[key]) for key in ("min", "avg", "max"))
+                    if "increase" in entry:
+                        text += f" +{entry['increase']}"
+                    columns.append(text)
+                print(f"{format_time(result['time']):<20}{result['samples']:>6}  " + "  ".join(columns))
+    except BrokenPipeError:
+        pass
+    if reader.bad_blocks:
+        print(f"跳过了 {reader.bad_blocks} 个损坏的块", file=sys.stderr)
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控样本记录
+一次采集的结果用带 __slots__ 的扁平记录保存，不再为每次采集构造十来个嵌套字典；
+上报时直接按模板生成Komari需要的JSON，共享快照按字段名读取属性。
+共享快照的字段（snapshot_export.FIELDS）也由这里的布局生成
+"""
+
+import json
+from typing import Dict, Any
+
+# Komari上报格式中的位置：(字段名, 所在分组, 分组中的键)，分组为None时位于顶层
+LAYOUT = (
+    ("cpu_usage", "cpu", "usage"),
+    ("ram_total", "ram", "total"),
+    ("ram_used", "ram", "used"),
+    ("swap_total", "swap", "total"),
+    ("swap_used", "swap", "used"),
+    ("load1", "load", "load1"),
+    ("load5", "load", "load5"),
+    ("load15", "load", "load15"),
+    ("disk_total", "disk", "total"),
+    ("disk_used", "disk", "used"),
+    ("net_up", "network", "up"),
+    ("net_down", "network", "down"),
+    ("net_total_up", "network", "totalUp"),
+    ("net_total_down", "network", "totalDown"),
+    ("connections_tcp", "connections", "tcp"),
+    ("connections_udp", "connections", "udp"),
+    ("uptime", None, "uptime"),
+    ("process", None, "process"),
+)
+
+
+def build_fragments() -> tuple:
+    """上报JSON中每个数值字段之前的固定文本（与 json.dumps 的默认格式一致），以及 message 前后的文本"""
+    fragments, text, group, opened = [], "{", None, False
+    for name, section, key in LAYOUT:
+        if not opened or section != group:
+            if group is not None:
+                text += "}"
+            if opened:
+                text += ", "
+            if section is not None:
+                text += f'"{section}": {{'
+            group, opened = section, True
+        else:
+            text += ", "
+        fragments.append(text + f'"{key}": ')
+        text = ""
+    if group is not None:
+        text += "}"
+    return tuple(fragments), text + ', "message": '
+
+
+FRAGMENTS, MESSAGE_PREFIX = build_fragments()
+NAMES = tuple(name for name, _, _ in LAYOUT)
+
+
+class MonitoringSample:
+    """一次采集的监控数据"""
+
+    __slots__ = NAMES + ("message",)
+
+    def __init__(self):
+        for name in NAMES:
+            setattr(self, name, 0)
+        self.message = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Komari上报格式（嵌套字典），供测试模式、回放检查等使用"""
+        data: Dict[str, Any] = {}
+        for name, section, key in LAYOUT:
+            if section is None:
+                data[key] = getattr(self, name)
+            else:
+                data.setdefault(section, {})[key] = getattr(self, name)
+        data["message"] = self.message
+        return data
+
+    def to_json(self) -> str:
+        """直接拼接上报的JSON，与 json.dumps(self.to_dict()) 的结果相同"""
+        parts = []
+        for fragment, name in zip(FRAGMENTS, NAMES):
+            value = getattr(self, name)
+            parts.append(fragment)
+            # 整数和有限浮点数的repr与JSON相同；其他值（固件返回的字符串、None、NaN等）交给json.dumps
+            kind = type(value)
+            if kind is int or (kind is float and value - value == 0):
+                parts.append(repr(value))
+            else:
+                parts.append(json.dumps(value))
+        parts.append(MESSAGE_PREFIX)
+        parts.append(json.dumps(self.message))
+        parts.append("}")
+        return "".join(parts)
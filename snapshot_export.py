@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控快照共享内存导出
+每次采集后把监控数据写入固定布局的内存映射文件（建议放在 /dev/shm），
+本机的告警脚本、Prometheus导出器等可以直接读取，不必各自登录路由器。
+写入采用seqlock：写入前后各递增一次序号，读取方在序号为偶数且前后一致时得到完整的快照，
+读写双方都不需要加锁。
+代理重启时布局不变的快照文件原地复用，正在 --watch 的读取方不会停留在已删除的旧文件上；
+布局变化需要重建文件时，--watch 发现文件被替换后重新打开
+
+文件布局（小端）:
+    0   4s  魔数 b"IKSN"
+    4   H   版本
+    6   H   字段数量 N
+    8   Q   序号（奇数表示正在写入）
+    16  d   快照时间戳
+    24  Q   采集次数
+    32  N*d 字段值，顺序见 FIELDS
+    32+8N   字段名（逗号分隔的ASCII，以\\0结尾），便于其他语言的读取方自描述
+
+用法:
+    python snapshot_export.py /dev/shm/ikuai-agent.snap
+    python snapshot_export.py /dev/shm/ikuai-agent.snap --prometheus
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+import argparse
+from typing import Dict, Any, Optional
+
+from sample_record import LAYOUT
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IKSN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQdQ")
+SEQ_OFFSET = 8
+
+# (字段名, 在 format_monitoring_data 结果中的路径)，与上报记录使用同一份字段布局
+FIELDS = tuple((name, (key,) if section is None else (section, key)) for name, section, key in LAYOUT)
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+VALUES = struct.Struct(f"<{len(FIELDS)}d")
+NAMES = ",".join(FIELD_NAMES).encode("ascii") + b"\0"
+FILE_SIZE = HEADER.size + VALUES.size + len(NAMES)
+LAYOUT_PREFIX = struct.pack("<4sHH", MAGIC, VERSION, len(FIELDS))
+
+
+def extract_values(data) -> tuple:
+    """
+    按 FIELDS 的顺序取出各字段，缺失或非数值的字段记为0
+
+    Args:
+        data: format_monitoring_data 的结果，或字段名相同的 MonitoringSample 记录
+    """
+    if not isinstance(data, dict):
+        values = (getattr(data, name, 0) for name in FIELD_NAMES)
+        return tuple(float(value) if isinstance(value, (int, float)) else 0.0 for value in values)
+    values = []
+    for _, path in FIELDS:
+        value = data
+        for key in path:
+            value = value.get(key, 0) if isinstance(value, dict) else 0
+        values.append(float(value) if isinstance(value, (int, float)) else 0.0)
+    return tuple(values)
+
+
+class SnapshotWriter:
+    def __init__(self, path: str):
+        """
+        打开快照文件：布局相同的已有文件原地复用，否则重新创建
+
+        Args:
+            path: 快照文件路径，建议放在 /dev/shm 下避免写磁盘
+        """
+        self.path = path
+        self.published = 0
+        self.file = self.open_existing(path)
+        if self.file is None:
+            # 先写到临时文件再改名，读取方不会看到尺寸不完整的文件
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, len(FIELDS), 0, 0.0, 0))
+                f.write(VALUES.pack(*([0.0] * len(FIELDS))))
+                f.write(NAMES)
+            os.replace(tmp_path, path)
+            self.file = open(path, "r+b")
+        self.mm = mmap.mmap(self.file.fileno(), FILE_SIZE)
+        # 接着原有的序号写入；上次写到一半退出（序号为奇数）时补成偶数，读取方不必一直重试
+        seq, = struct.unpack_from("<Q", self.mm, SEQ_OFFSET)
+        self.seq = seq + (seq & 1)
+        struct.pack_into("<Q", self.mm, SEQ_OFFSET, self.seq)
+        logger.info(f"监控快照导出到: {path}")
+
+    @staticmethod
+    def open_existing(path: str):
+        """打开布局（版本、字段数量和字段名）与当前一致的已有快照文件，不存在或不一致时返回None"""
+        try:
+            f = open(path, "r+b")
+        except OSError:
+            return None
+        try:
+            head = f.read(FILE_SIZE + 1)
+            if (len(head) == FILE_SIZE and head.startswith(LAYOUT_PREFIX)
+                    and head[HEADER.size + VALUES.size:] == NAMES):
+                return f
+        except OSError:
+            pass
+        f.close()
+        return None
+
+    def publish(self, data, ticks: int = 0):
+        """写入一次快照（单写入方）"""
+        values = extract_values(data)
+        mm = self.mm
+        self.seq += 1
+        struct.pack_into("<Q", mm, SEQ_OFFSET, self.seq)  # 奇数：正在写入
+        struct.pack_into("<dQ", mm, SEQ_OFFSET + 8, time.time(), ticks)
+        VALUES.pack_into(mm, HEADER.size, *values)
+        self.seq += 1
+        struct.pack_into("<Q", mm, SEQ_OFFSET, self.seq)  # 偶数：写入完成
+        self.published += 1
+
+    def close(self):
+        try:
+            self.mm.close()
+            self.file.close()
+        except (OSError, ValueError):
+            pass
+
+
+class SnapshotReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, _, _, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是有效的监控快照文件: {path}")
+        self.values = struct.Struct(f"<{count}d")
+        names_offset = HEADER.size + self.values.size
+        self.names = self.mm[names_offset:self.mm.find(b"\0", names_offset)].decode("ascii").split(",")
+        self.retries = 0
+
+    def read(self, max_retries: int = 1000) -> Optional[Dict[str, Any]]:
+        """
+        读取一份一致的快照
+
+        Returns:
+            Dict: {"seq", "time", "ticks", "values": {字段名: 值}}，写入方一直在写入时返回None
+        """
+        mm = self.mm
+        for _ in range(max_retries):
+            seq_before, = struct.unpack_from("<Q", mm, SEQ_OFFSET)
+            if seq_before & 1:
+                self.retries += 1
+                continue
+            timestamp, ticks = struct.unpack_from("<dQ", mm, SEQ_OFFSET + 8)
+            values = self.values.unpack_from(mm, HEADER.size)
+            seq_after, = struct.unpack_from("<Q", mm, SEQ_OFFSET)
+            if seq_before == seq_after:
+                return {"seq": seq_before, "time": timestamp, "ticks": ticks, "values": dict(zip(self.names, values))}
+            self.retries += 1
+        return None
+
+    def replaced(self) -> bool:
+        """快照文件是否已被替换（写入方重新创建了文件），此时需要重新打开"""
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except OSError:
+            return False
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+def format_prometheus(snapshot: Dict[str, Any]) -> str:
+    """Prometheus文本格式"""
+    lines = [f"ikuai_{name} {value!r}" for name, value in snapshot["values"].items()]
+    lines.append(f"ikuai_snapshot_timestamp_seconds {snapshot['time']:.3f}")
+    lines.append(f"ikuai_snapshot_ticks_total {snapshot['ticks']}")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='读取iKuai监控快照')
+    parser.add_argument('path', help='快照文件路径（EXPORT_SNAPSHOT_FILE）')
+    parser.add_argument('--prometheus', action='store_true', help='输出Prometheus文本格式')
+    parser.add_argument('--watch', type=float, default=0, help='每隔多少秒重复读取（0为只读取一次）')
+    args = parser.parse_args()
+
+    reader = SnapshotReader(args.path)
+    while True:
+        if reader.replaced():
+            reader.close()
+            reader = SnapshotReader(args.path)
+        snapshot = reader.read()
+        if snapshot is None:
+            print("读取快照失败：写入方一直在写入", file=sys.stderr)
+            sys.exit(1)
+        print(format_prometheus(snapshot) if args.prometheus else json.dumps(snapshot, ensure_ascii=False))
+        if args.watch <= 0:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
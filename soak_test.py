@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长时间运行压力测试（soak test）
+使用本地模拟的iKuai路由器和Komari服务器驱动完整的监控代理，
+以缩短的上报间隔压缩模拟数小时的运行，期间定期断开WebSocket并使路由器会话失效，
+跟踪RSS、tracemalloc、线程数和文件描述符，任何一项持续增长则判定失败
+
+用法:
+    python soak_test.py --duration 600 --interval 0.01
+"""
+
+import sys
+import time
+import logging
+import argparse
+import threading
+import tracemalloc
+import psutil
+from typing import Dict, Any, List
+from stub_servers import StubIkuaiServer, StubKomariServer
+
+logger = logging.getLogger(__name__)
+
+# 各指标允许的增长量：(固定余量, 相对比例)
+GROWTH_TOLERANCE = {
+    "rss": (4 * 1024 * 1024, 0.10),
+    "traced": (1 * 1024 * 1024, 0.20),
+    "threads": (3, 0),
+    "fds": (6, 0)
+}
+
+
+def take_sample(process: psutil.Process) -> Dict[str, Any]:
+    """采集一次资源占用"""
+    return {
+        "time": time.time(),
+        "rss": process.memory_info().rss,
+        "traced": tracemalloc.get_traced_memory()[0],
+        "threads": threading.active_count(),
+        "fds": process.num_fds() if hasattr(process, "num_fds") else len(process.open_files())
+    }
+
+
+def check_growth(samples: List[Dict[str, Any]], warmup: float = 0.2) -> Dict[str, Dict[str, Any]]:
+    """
+    判断各指标是否持续增长
+
+    跳过预热阶段后把剩余样本分成三段，比较最后一段与第一段的峰值，
+    增长超过允许余量，并且中间段也高于第一段（排除一次性的突增）时判定为泄漏
+
+    Returns:
+        Dict: 每个指标的首段峰值、末段峰值和是否通过
+    """
+    samples = samples[int(len(samples) * warmup):]
+    third = max(len(samples) // 3, 1)
+    first, middle, last = samples[:third], samples[third:2 * third], samples[-third:]
+
+    results = {}
+    for metric, (absolute, relative) in GROWTH_TOLERANCE.items():
+        first_peak = max(s[metric] for s in first)
+        middle_peak = max(s[metric] for s in middle) if middle else first_peak
+        last_peak = max(s[metric] for s in last)
+        limit = first_peak + max(absolute, first_peak * relative)
+        leaking = last_peak > limit and middle_peak > first_peak
+        results[metric] = {"first": first_peak, "last": last_peak, "limit": int(limit), "ok": not leaking}
+    return results
+
+
+def run_soak(args) -> bool:
+    """运行压力测试，返回是否通过"""
+    from ikuai_komari_agent import IkuaiAgent
+
+    ikuai_server = StubIkuaiServer(interfaces=args.interfaces).start()
+    komari_server = StubKomariServer().start()
+
+    agent = IkuaiAgent(
+        komari_config={
+            "endpoint": komari_server.url,
+            "token": "soak-test",
+            "websocket_interval": args.interval,
+            "basic_info_interval": args.basic_info_interval / 60,
+            "reconnect_delay": args.reconnect_delay
+        },
+        ikuai_config={"base_url": ikuai_server.url, "username": "admin", "password": "admin", "timeout": 5},
+        name="soak",
+        configure_logging=False,
+        watch_config=False
+    )
+
+    tracemalloc.start(args.trace_frames)
+    process = psutil.Process()
+    agent_thread = threading.Thread(target=agent.start, name="soak-agent", daemon=True)
+    agent_thread.start()
+
+    # 先运行一小段时间再记录基线，排除模块加载和连接建立的一次性分配
+    time.sleep(min(args.duration * 0.05, 10))
+    baseline = tracemalloc.take_snapshot()
+
+    samples = []
+    started = time.time()
+    last_disconnect = last_expire = last_sample = started
+    disconnects = expirations = 0
+
+    while time.time() - started < args.duration:
+        now = time.time()
+        if args.disconnect_every and now - last_disconnect >= args.disconnect_every:
+            komari_server.drop_connections()
+            disconnects += 1
+            last_disconnect = now
+        if args.expire_every and now - last_expire >= args.expire_every:
+            ikuai_server.expire_sessions()
+            expirations += 1
+            last_expire = now
+        if now - last_sample >= args.sample_every:
+            sample = take_sample(process)
+            samples.append(sample)
+            last_sample = now
+            logger.info(f"RSS={sample['rss'] / 1024 / 1024:.1f}MB traced={sample['traced'] / 1024:.0f}KB "
+                        f"threads={sample['threads']} fds={sample['fds']} ticks={agent.ticks_completed} "
+                        f"frames={komari_server.frames}")
+        time.sleep(0.1)
+
+    snapshot = tracemalloc.take_snapshot()
+    agent.stop()
+    agent_thread.join(timeout=10)
+    ikuai_server.stop()
+    komari_server.stop()
+
+    simulated = agent.ticks_completed * 1.0  # 按正常1秒间隔折算的运行时间
+    print(f"\n实际运行 {args.duration:.0f} 秒，完成 {agent.ticks_completed} 次采集（相当于正常间隔下 {simulated / 3600:.1f} 小时）")
+    print(f"Komari收到 {komari_server.frames} 帧, {komari_server.websocket_connects} 次WebSocket连接, "
+          f"{komari_server.basic_info_uploads} 次基础信息上报; 路由器登录 {ikuai_server.logins} 次")
+    print(f"注入 {disconnects} 次断线, {expirations} 次会话失效; 采集异常 {agent.tick_errors} 次")
+
+    print("\ntracemalloc 增长最多的分配位置:")
+    for stat in snapshot.compare_to(baseline, "lineno")[:args.top]:
+        print(f"  {stat}")
+
+    if len(samples) < 6:
+        print("\n样本不足，无法判断资源增长（请延长 --duration 或缩短 --sample-every）")
+        return False
+
+    results = check_growth(samples)
+    print(f"\n{'指标':<10}{'首段峰值':>16}{'末段峰值':>16}{'上限':>16}  结果")
+    for metric, result in results.items():
+        print(f"{metric:<10}{result['first']:>16}{result['last']:>16}{result['limit']:>16}  {'通过' if result['ok'] else '持续增长'}")
+
+    passed = all(result["ok"] for result in results.values())
+    if komari_server.frames == 0:
+        print("Komari未收到任何数据帧")
+        passed = False
+    print("\n压力测试" + ("通过" if passed else "失败"))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='iKuai Komari Agent 长时间运行压力测试')
+    parser.add_argument('--duration', type=float, default=600, help='实际运行时间（秒）')
+    parser.add_argument('--interval', type=float, default=0.01, help='代理上报间隔（秒），越小模拟的时间越长')
+    parser.add_argument('--basic-info-interval', type=float, default=5, help='基础信息上报间隔（秒）')
+    parser.add_argument('--reconnect-delay', type=float, default=0.2, help='WebSocket重连等待（秒）')
+    parser.add_argument('--disconnect-every', type=float, default=15, help='每隔多少秒断开一次WebSocket（0为不断开）')
+    parser.add_argument('--expire-every', type=float, default=20, help='每隔多少秒使路由器会话失效（0为不失效）')
+    parser.add_argument('--sample-every', type=float, default=5, help='资源采样间隔（秒）')
+    parser.add_argument('--interfaces', type=int, default=4, help='模拟路由器的接口数量')
+    parser.add_argument('--top', type=int, default=10, help='显示的tracemalloc分配位置数量')
+    parser.add_argument('--trace-frames', type=int, default=1, help='tracemalloc记录的调用栈深度（越深越慢）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    for name in ('ikuai_komari_agent', 'ikuai_client', 'ws_compression', 'websocket', 'urllib3'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    sys.exit(0 if run_soak(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
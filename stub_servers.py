@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟服务器
+模拟iKuai路由器API和Komari服务器（HTTP上报 + WebSocket），供压力测试和基准测试使用
+"""
+
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class StubServer:
+    """在后台线程中运行的本地HTTP服务器"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), self.handler_class)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class IkuaiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data: Dict[str, Any], headers: Dict[str, str] = None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        with stub.lock:
+            stub.requests += 1
+
+        if self.path == "/Action/login":
+            session = stub.login()
+            self.send_json({"Result": 10000, "ErrMsg": "Success"}, {"Set-Cookie": f"sess_key={session}; path=/"})
+            return
+
+        if not stub.check_session(self.headers.get("Cookie", "")):
+            self.send_json({"Result": 10014, "ErrMsg": "no login authentication"})
+            return
+
+        delay = stub.delay + stub.slow.get(payload.get("func_name"), 0)
+        if delay:
+            time.sleep(delay)
+        data = stub.respond(payload.get("func_name"), payload.get("param") or {})
+        self.send_json({"Result": 30000, "ErrMsg": "Success", "Data": data})
+
+
+class StubIkuaiServer(StubServer):
+    """模拟iKuai路由器的登录和 /Action/call 接口"""
+
+    handler_class = IkuaiHandler
+
+    def __init__(self, interfaces: int = 1, delay: float = 0, hosts: int = 50, wans: int = 1,
+                 slow: Dict[str, float] = None, conntrack: int = 1000, **kwargs):
+        """
+        Args:
+            interfaces: monitor_iface 返回的接口数量（包含WAN口）
+            delay: 每次API调用的额外延迟（秒），模拟慢速路由器
+            slow: 个别接口的额外延迟，如 {"disk_mgmt": 3}，模拟机械硬盘上很慢的接口
+            hosts: monitor_lanip 返回的局域网主机数量
+            wans: 其中WAN线路的数量（排在接口列表最前面）
+            conntrack: conntrack 返回的连接跟踪条目数量
+        """
+        super().__init__(**kwargs)
+        self.interfaces = interfaces
+        self.hosts = hosts
+        self.wans = wans
+        self.conntrack = conntrack
+        self.delay = delay
+        self.slow = slow or {}
+        self.sessions = set()
+        self.logins = 0
+        self.started = time.time()
+        self.rng = random.Random(1)
+
+    def login(self) -> str:
+        with self.lock:
+            self.logins += 1
+            session = hashlib.md5(f"{self.logins}-{time.time()}".encode()).hexdigest()
+            self.sessions.add(session)
+        return session
+
+    def check_session(self, cookie: str) -> bool:
+        session = cookie.split("sess_key=")[1].split(";")[0] if "sess_key=" in cookie else ""
+        with self.lock:
+            return session in self.sessions
+
+    def expire_sessions(self):
+        """使所有会话失效，模拟路由器重启或登录超时"""
+        with self.lock:
+            self.sessions.clear()
+
+    def stream(self) -> Dict[str, Any]:
+        uptime = int(time.time() - self.started)
+        return {
+            "upload": self.rng.randint(100_000, 500_000),
+            "download": self.rng.randint(1_000_000, 5_000_000),
+            "total_up": 50 * 1024 ** 3 + uptime * 300_000,
+            "total_down": 800 * 1024 ** 3 + uptime * 3_000_000,
+            "connect_num": self.rng.randint(2000, 4000)
+        }
+
+    def sysstat(self) -> Dict[str, Any]:
+        return {
+            "verinfo": {"verstring": "3.7.15 x64 Build202409101144"},
+            "cpu": [f"{self.rng.uniform(5, 30):.2f}%" for _ in range(4)],
+            "cputemp": [45],
+            "memory": {"total": 4 * 1024 * 1024, "used": f"{self.rng.randint(20, 40)}%"},
+            "stream": self.stream(),
+            "uptime": int(time.time() - self.started) + 86400
+        }
+
+    def iface_stream(self) -> list:
+        interfaces = []
+        for index in range(self.interfaces):
+            if index < self.wans:
+                iface = {"interface": f"wan{index + 1}", "ip_addr": f"203.0.113.{10 + index}"}
+            else:
+                iface = {"interface": f"vlan{index}", "ip_addr": f"10.{index // 250}.{index % 250}.1"}
+            iface.update(self.stream())
+            interfaces.append(iface)
+        return interfaces
+
+    def lan_hosts(self, limit: int) -> list:
+        hosts = []
+        for index in range(min(self.hosts, limit)):
+            hosts.append({
+                "ip_addr": f"192.168.{index // 250}.{index % 250 + 2}",
+                "mac": f"02:00:00:00:{index // 256:02x}:{index % 256:02x}",
+                "hostname": f"host-{index}", "comment": "",
+                # 少数主机占用大部分流量，接近真实网络的长尾分布
+                "upload": int(self.rng.paretovariate(1.2) * 2000),
+                "download": int(self.rng.paretovariate(1.2) * 20000),
+                "connect_num": self.rng.randint(0, 200)
+            })
+        return hosts
+
+    def connections(self, limit: int) -> list:
+        """连接跟踪条目：约70% TCP、25% UDP，其余为ICMP"""
+        connections = []
+        for index in range(min(self.conntrack, limit) if limit else self.conntrack):
+            roll = self.rng.random()
+            protocol = "tcp" if roll < 0.7 else "udp" if roll < 0.95 else "icmp"
+            connections.append({
+                "id": index, "protocol": protocol,
+                "src_addr": f"192.168.{index // 250 % 250}.{index % 250 + 2}", "src_port": 10000 + index % 50000,
+                "dst_addr": f"198.51.100.{index % 250}", "dst_port": 443 if protocol == "tcp" else 53,
+                "upload": self.rng.randint(0, 5000), "download": self.rng.randint(0, 50000),
+                "timeout": self.rng.randint(1, 7200)
+            })
+        return connections
+
+    def respond(self, func_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """按func_name返回与真实固件结构一致的数据"""
+        if func_name == "hardwareinfo":
+            return {"hardwareinfo": {"cpucores": 4, "cpumodel": "Intel(R) Celeron(R) J4125 CPU @ 2.00GHz",
+                                     "memory": 4096, "hdd": "SSD(64GB)"}}
+        if func_name in ("sysstat", "homepage"):
+            return {"sysstat": self.sysstat()}
+        if func_name == "monitor_iface":
+            stream = self.iface_stream()
+            return {"iface_check": [{"interface": i["interface"], "ip_addr": i["ip_addr"]} for i in stream],
+                    "iface_stream": stream}
+        if func_name == "monitor_lanip":
+            limit = int(str(params.get("limit", "0,100")).split(",")[-1])
+            return {"data": self.lan_hosts(limit), "total": self.hosts}
+        if func_name == "conntrack":
+            limit = int(str(params.get("limit", "0,0")).split(",")[-1])
+            return {"data": self.connections(limit), "total": self.conntrack}
+        if func_name == "disk_mgmt":
+            total = 64 * 1024 ** 3
+            used = 12 * 1024 ** 3
+            return {"data": [{"size": total, "partition": [{"mounted": {"mt_total": total, "mt_used": used,
+                                                                        "mt_avail": total - used}}]}]}
+        return {}
+
+
+class KomariHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if stub.delay:
+            time.sleep(stub.delay)
+        with stub.lock:
+            stub.requests += 1
+            stub.basic_info_uploads += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() != "websocket":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        stub = self.server.stub
+        stub.add_connection(self.connection)
+        try:
+            self.websocket_loop(stub)
+        except (OSError, ConnectionError, struct.error):
+            pass
+        finally:
+            stub.remove_connection(self.connection)
+        self.close_connection = True
+
+    def recv_exact(self, length: int) -> bytes:
+        data = self.rfile.read(length)
+        if len(data) < length:
+            raise ConnectionError("连接已关闭")
+        return data
+
+    def send_frame(self, opcode: int, payload: bytes = b""):
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 65536:
+            header += bytes([126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([127]) + struct.pack("!Q", len(payload))
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+    def websocket_loop(self, stub):
+        while True:
+            while self.connection in stub.frozen:
+                # 模拟半开连接：不再读取数据、不回应ping，也不关闭连接
+                time.sleep(0.05)
+            first, second = self.recv_exact(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self.recv_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self.recv_exact(8))[0]
+            mask = self.recv_exact(4) if second & 0x80 else b""
+            payload = self.recv_exact(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            if opcode == 0x8:
+                self.send_frame(0x8, payload[:2])
+                return
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)
+            elif opcode in (0x1, 0x2, 0x0):
+                if stub.delay:
+                    time.sleep(stub.delay)
+                stub.on_frame(2 + len(mask) + length + (0 if length < 126 else 2 if length < 65536 else 8))
+
+
+class StubKomariServer(StubServer):
+    """模拟Komari服务器的基础信息上报接口和WebSocket上报接口"""
+
+    handler_class = KomariHandler
+
+    def __init__(self, delay: float = 0, **kwargs):
+        """
+        Args:
+            delay: 每帧数据和每次基础信息上报的处理延迟（秒），模拟慢速服务端
+        """
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.connections = set()
+        self.frozen = set()
+        self.basic_info_uploads = 0
+        self.frames = 0
+        self.frame_bytes = 0
+        self.first_frame_time = None
+        self.websocket_connects = 0
+
+    def add_connection(self, connection):
+        with self.lock:
+            self.connections.add(connection)
+            self.websocket_connects += 1
+
+    def remove_connection(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+            self.frozen.discard(connection)
+
+    def on_frame(self, size: int):
+        with self.lock:
+            self.frames += 1
+            self.frame_bytes += size
+            if self.first_frame_time is None:
+                self.first_frame_time = time.time()
+
+    def freeze_connections(self):
+        """
+        冻结当前所有WebSocket连接，模拟NAT超时或服务端主机宕机后的半开连接；
+        之后建立的新连接不受影响
+        """
+        with self.lock:
+            self.frozen.update(self.connections)
+
+    def drop_connections(self):
+        """强制断开所有WebSocket连接，模拟服务端重启或网络中断"""
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
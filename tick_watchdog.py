@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采集线程看门狗
+监控循环卡在路由器API调用或WebSocket发送上时，进程依然存活，Docker基于pgrep的健康检查发现不了。
+看门狗在独立线程中检查每次采集的耗时和所处阶段，超时时记录卡住的位置和调用栈，
+把健康状态写入文件（可选HTTP端点），并可在卡住过久后重启采集线程
+
+用法（Docker健康检查）:
+    python tick_watchdog.py --check /app/logs/health.json --max-age 60
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import traceback
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TickWatchdog:
+    def __init__(self, agent, config: Dict[str, Any]):
+        """
+        初始化看门狗
+
+        Args:
+            agent: IkuaiAgent 实例
+            config: 看门狗配置（见 config.WATCHDOG_CONFIG）
+        """
+        self.agent = agent
+        self.config = config
+        self.check_interval = max(config.get("check_interval", 5), 0.05)
+        self.stall_timeout = config.get("stall_timeout", 60)
+        self.restart_after = config.get("restart_after", 0)
+        self.health_file = config.get("health_file", "")
+        self.health_port = config.get("health_port", 0)
+
+        self.status = "starting"
+        self.problem = ""
+        self.reported_stage = None  # 已输出过调用栈的卡顿（阶段, 开始时间），避免重复刷屏
+        self.stalls = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.http_server = None
+
+    @property
+    def tick_budget(self) -> float:
+        """单次采集的时间预算，未配置时按当前上报间隔推算"""
+        budget = self.config.get("tick_budget", 0)
+        if budget > 0:
+            return budget
+        return max(self.agent.interval * 3, 10)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="tick-watchdog", daemon=True)
+        self.thread.start()
+        if self.health_port:
+            self.start_http_server()
+        logger.info(f"看门狗已启动（采集预算 {self.tick_budget:.1f}秒，阶段超时 {self.stall_timeout}秒）")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+    def run(self):
+        while not self.stop_event.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"看门狗检查异常: {e}")
+
+    def check(self):
+        """检查一次采集线程的状态并更新健康信息"""
+        agent = self.agent
+        now = time.time()
+        stage = agent.current_stage
+        stage_age = now - agent.stage_started
+        collector = agent.collector_thread
+        # 数据源在线程池中并行请求，卡住的调用不一定在采集线程中
+        call = agent.ikuai_client.oldest_call()
+        report_key, report_thread = (stage, agent.stage_started), collector
+
+        if collector is None:
+            status, problem = "starting", ""
+        elif not collector.is_alive() and agent.running:
+            status, problem = "stalled", "采集线程已退出"
+        elif stage != "wait" and stage_age > self.stall_timeout:
+            status, problem = "stalled", f"阶段 {stage} 已持续 {stage_age:.1f}秒"
+        elif call and now - call[1] > self.stall_timeout:
+            status, problem = "stalled", f"路由器调用 {call[0]} 已等待 {now - call[1]:.1f}秒"
+            report_key, report_thread = call[1:], call[2]
+        elif stage != "wait" and now - agent.tick_started > self.tick_budget:
+            status, problem = "slow", f"本次采集已耗时 {now - agent.tick_started:.1f}秒（预算 {self.tick_budget:.1f}秒）"
+        else:
+            status, problem = "ok", ""
+
+        if status in ("slow", "stalled"):
+            self.report_problem(status, problem, report_key, report_thread)
+        elif self.status in ("slow", "stalled"):
+            logger.info(f"采集线程已恢复（阶段: {stage}）")
+            self.reported_stage = None
+
+        self.status, self.problem = status, problem
+        self.write_health_file()
+
+        # 只有采集线程本身卡住时重启才有意义；线程池中卡住的调用超时后会自行结束。
+        # 两次重启至少间隔restart_after，新线程启动前不会接连重启、堆积多代线程
+        if (status == "stalled" and self.restart_after > 0 and agent.running
+                and now - agent.last_collector_restart >= self.restart_after
+                and ((stage != "wait" and stage_age > self.restart_after) or not collector.is_alive())):
+            agent.restart_collector()
+
+    def report_problem(self, status: str, problem: str, key: tuple, thread):
+        """
+        记录卡住的位置，同一次卡顿只输出一次调用栈
+
+        Args:
+            key: 区分不同卡顿的键（阶段和开始时间，或卡住的调用）
+            thread: 输出调用栈的线程（采集线程或线程ID）
+        """
+        if key == self.reported_stage:
+            return
+        self.reported_stage = key
+        if status == "stalled":
+            self.stalls += 1
+
+        call = self.agent.ikuai_client.oldest_call()
+        call_info = ""
+        if call and key != call[1:]:
+            call_info = f"，路由器调用 {call[0]} 已等待 {time.time() - call[1]:.1f}秒"
+        logger.warning(f"看门狗: {problem}{call_info}")
+
+        stack = self.thread_stack(thread)
+        if stack:
+            name = "采集线程" if thread is self.agent.collector_thread else "请求线程"
+            logger.warning(f"{name}调用栈:\n{stack}")
+
+    @staticmethod
+    def thread_stack(thread) -> str:
+        """线程当前的调用栈"""
+        ident = getattr(thread, "ident", thread)
+        if ident is None:
+            return ""
+        frame = sys._current_frames().get(ident)
+        if frame is None:
+            return ""
+        return "".join(traceback.format_stack(frame))
+
+    def health(self) -> Dict[str, Any]:
+        """当前健康状态"""
+        agent = self.agent
+        now = time.time()
+        return {
+            "status": self.status,
+            "problem": self.problem,
+            "time": now,
+            "stage": agent.current_stage,
+            "stage_age": round(now - agent.stage_started, 3),
+            "last_tick_time": agent.last_tick_time,
+            "last_tick_age": round(now - agent.last_tick_time, 3) if agent.last_tick_time else None,
+            "last_tick_duration": round(agent.last_tick_duration, 3),
+            "interval": agent.interval,
+            "next_tick": agent.next_tick_time,
+            "ticks": agent.ticks_completed,
+            "tick_errors": agent.tick_errors,
+            "ws_connected": agent.ws_connected,
+            "source_misses": dict(agent.fetcher.misses),
+            "stalls": self.stalls,
+            "collector_restarts": agent.collector_restarts
+        }
+
+    def write_health_file(self):
+        """原子地写入健康状态文件"""
+        if not self.health_file:
+            return
+        tmp_path = f"{self.health_file}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.health(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.health_file)
+        except OSError as e:
+            logger.error(f"写入健康状态文件失败: {e}")
+
+    def start_http_server(self):
+        """启动健康检查HTTP端点：正常返回200，卡住返回503"""
+        # 只有启用HTTP端点时才需要，不在启动时加载
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        watchdog = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                health = watchdog.health()
+                body = json.dumps(health, ensure_ascii=False).encode("utf-8")
+                self.send_response(503 if health["status"] == "stalled" else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            self.http_server = ThreadingHTTPServer(("0.0.0.0", self.health_port), HealthHandler)
+            self.http_server.daemon_threads = True
+            threading.Thread(target=self.http_server.serve_forever, name="health-http", daemon=True).start()
+            logger.info(f"健康检查端点: http://0.0.0.0:{self.health_port}/")
+        except OSError as e:
+            logger.error(f"健康检查端点启动失败: {e}")
+            self.http_server = None
+
+
+def check_health_file(path: str, max_age: float) -> Optional[str]:
+    """
+    检查健康状态文件
+
+    上报间隔可以比 max_age 长（配置或服务端调速），等待下一次采集时按文件中的下次采集时间判断，
+    采集中按上报间隔加 max_age 判断距上次完成采集的时间
+
+    Returns:
+        Optional[str]: 不健康的原因，健康时返回None
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            health = json.load(f)
+    except (OSError, ValueError) as e:
+        return f"无法读取健康状态文件: {e}"
+
+    if time.time() - health.get("time", 0) > max_age:
+        return "健康状态文件长时间未更新，看门狗可能已停止"
+    if health.get("status") == "stalled":
+        return health.get("problem") or "采集线程卡住"
+    next_tick = health.get("next_tick")
+    if health.get("stage") == "wait" and next_tick:
+        overdue = health["time"] - next_tick
+        if overdue > max_age:
+            return f"下一次采集已推迟 {overdue:.0f}秒"
+        return None
+    last_tick_age = health.get("last_tick_age")
+    limit = max_age + health.get("interval", 0)
+    if last_tick_age is not None and last_tick_age > limit:
+        return f"已有 {last_tick_age:.0f}秒 没有完成采集"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='iKuai Komari Agent 健康检查')
+    parser.add_argument('--check', required=True, help='健康状态文件路径')
+    parser.add_argument('--max-age', type=float, default=60, help='允许的最长未更新时间（秒），上报间隔之外额外允许的采集延迟')
+    args = parser.parse_args()
+
+    problem = check_health_file(args.check, args.max_age)
+    if problem:
+        print(f"unhealthy: {problem}")
+        sys.exit(1)
+    print("healthy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+局域网主机流量排行模块
+遍历 monitor_lanip 返回的主机列表，用固定大小的小顶堆找出上传/下载速率最高的前K台主机。
+只保留K个条目，内存不随主机数量增长，每台主机只做一次常数时间的比较
+"""
+
+import heapq
+from typing import Dict, Any, Iterable, List, Tuple
+
+
+def format_rate(rate: float) -> str:
+    """把字节/秒格式化为简短的速率文本"""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if rate < 1024:
+            return f"{rate:.0f}{unit}" if unit == "B/s" else f"{rate:.1f}{unit}"
+        rate /= 1024
+    return f"{rate:.1f}GB/s"
+
+
+def host_label(host: Dict[str, Any]) -> str:
+    """主机的显示名称：优先使用备注或主机名，没有时使用IP"""
+    name = host.get("comment") or host.get("hostname") or ""
+    ip_addr = host.get("ip_addr", "")
+    if name and name != ip_addr:
+        return f"{name[:16]}({ip_addr})"
+    return ip_addr or host.get("mac", "?")
+
+
+class TopTalkers:
+    def __init__(self, size: int = 3):
+        """
+        Args:
+            size: 上传和下载各保留的主机数量
+        """
+        self.size = max(size, 1)
+        self.top_upload: List[Tuple[int, str]] = []
+        self.top_download: List[Tuple[int, str]] = []
+        self.hosts = 0
+        self.total_upload = 0
+        self.total_download = 0
+
+    def update(self, hosts: Iterable[Dict[str, Any]]):
+        """
+        用一次主机列表刷新排行
+
+        上传和下载的两个堆在同一次遍历中维护，堆中只引用入选的主机，
+        主机名称只为最终入选的条目生成
+
+        Args:
+            hosts: monitor_lanip 返回的主机列表
+        """
+        size = self.size
+        up_heap, down_heap = [], []
+        up_floor = down_floor = -1  # 堆满后各自的入选门槛，大多数主机只需与它比较一次
+        count = total_up = total_down = 0
+
+        for seq, host in enumerate(hosts):
+            upload = host.get("upload", 0)
+            download = host.get("download", 0)
+            if type(upload) is not int or type(download) is not int:
+                try:
+                    upload, download = int(upload), int(download)
+                except (TypeError, ValueError):
+                    continue
+            count += 1
+            total_up += upload
+            total_down += download
+
+            # seq 保证速率相同时不去比较主机字典本身
+            if upload > up_floor:
+                if len(up_heap) < size:
+                    heapq.heappush(up_heap, (upload, seq, host))
+                else:
+                    heapq.heapreplace(up_heap, (upload, seq, host))
+                if len(up_heap) == size:
+                    up_floor = up_heap[0][0]
+
+            if download > down_floor:
+                if len(down_heap) < size:
+                    heapq.heappush(down_heap, (download, seq, host))
+                else:
+                    heapq.heapreplace(down_heap, (download, seq, host))
+                if len(down_heap) == size:
+                    down_floor = down_heap[0][0]
+
+        self.top_upload = [(rate, host_label(host)) for rate, _, host in sorted(up_heap, reverse=True) if rate > 0]
+        self.top_download = [(rate, host_label(host)) for rate, _, host in sorted(down_heap, reverse=True) if rate > 0]
+        self.hosts = count
+        self.total_upload = total_up
+        self.total_download = total_down
+
+    def summary(self) -> str:
+        """排行摘要，附加在上报消息中"""
+        parts = []
+        if self.top_download:
+            parts.append("下载Top: " + ", ".join(f"{label} {format_rate(rate)}" for rate, label in self.top_download))
+        if self.top_upload:
+            parts.append("上传Top: " + ", ".join(f"{label} {format_rate(rate)}" for rate, label in self.top_upload))
+        return " | ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hosts": self.hosts,
+            "total_upload": self.total_upload,
+            "total_download": self.total_download,
+            "top_upload": [{"host": label, "rate": rate} for rate, label in self.top_upload],
+            "top_download": [{"host": label, "rate": rate} for rate, label in self.top_download]
+        }
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流量累计账本
+路由器重启后接口的 total_up/total_down 从0开始，Komari上的总流量随之归零。
+账本按接口记录上一次的计数器，每次采集把增量累加到总流量、当天和当月的流量中，
+上报单调递增的总流量；每次更新只处理WAN线路的几个条目，与历史长短无关。
+
+判断计数器重置：路由器运行时间变小，或比上一次的运行时间加上期间经过的单调时钟时间明显少时判定为重启，
+当前计数器整个视为增量。单调时钟不受NTP校时和手动改时间影响；账本记录单调时钟读数和本机的boot_id，
+本机没有重启时（包括只重启了代理或容器）停机期间路由器重启、重启后的运行时间已超过原先的情况同样能识别。
+计数器变小（例如PPPoE重新拨号）同样视为重置。
+
+账本定期写入JSON文件：先写临时文件并fsync，再原子地替换，进程或主机崩溃时
+文件要么是旧版本、要么是新版本。代理重启后按文件中的计数器继续计算，
+路由器没有重启时停机期间的流量也不会丢失
+
+用法:
+    python traffic_ledger.py /app/logs/traffic-default.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+PERIOD_KEYS = ("total_up", "total_down", "day_up", "day_down", "month_up", "month_down")
+# 运行时间允许比预期少的秒数：运行时间按秒取整、采集耗时都会带来少量偏差
+UPTIME_TOLERANCE = 60
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+
+def host_boot_id() -> str:
+    """本机内核的boot_id（Linux），同一个boot_id下 time.monotonic() 的读数可以跨进程比较"""
+    try:
+        with open(BOOT_ID_PATH, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def format_bytes(value: float) -> str:
+    """把字节数格式化为简短的文本"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.2f}TB"
+
+
+class TrafficLedger:
+    def __init__(self, path: str, flush_interval: float = 60, history_days: int = 31, history_months: int = 24):
+        """
+        Args:
+            path: 账本文件路径
+            flush_interval: 写入文件的间隔（秒），检测到重置或跨天时立即写入
+            history_days: 保留的每日流量条数
+            history_months: 保留的每月流量条数
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.history_days = history_days
+        self.history_months = history_months
+        self.lock = threading.Lock()
+
+        self.interfaces: Dict[str, Dict[str, int]] = {}  # 接口名 → 上一次的计数器和各周期的累计流量
+        self.uptime = None  # 上一次的路由器运行时间
+        self.uptime_clock = None  # 得到上一次运行时间时的单调时钟读数
+        self.boot_id = host_boot_id()
+        self.day = ""
+        self.month = ""
+        self.days: Dict[str, list] = {}  # 已结束的日期 → [上传, 下载]
+        self.months: Dict[str, list] = {}
+        self.resets = 0
+        self.sums = dict.fromkeys(PERIOD_KEYS, 0)  # 所有接口之和，随增量更新
+        self.fresh = True  # 新建的账本，第一次看到的计数器计入总流量，避免上报的总流量比原先小
+        self.dirty = False
+        self.flushed_at = time.time()
+        self.load()
+
+    def load(self):
+        """读取账本文件；文件损坏时改名保留，重新开始记录"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.interfaces = {name: {key: int(entry.get(key, 0)) for key in ("counter_up", "counter_down") + PERIOD_KEYS}
+                               for name, entry in state.get("interfaces", {}).items()}
+            self.uptime = state.get("uptime")
+            if self.boot_id and state.get("boot_id") == self.boot_id:
+                # 本机没有重启过，文件中的单调时钟读数仍然可以比较
+                self.uptime_clock = state.get("uptime_clock")
+            self.day = state.get("day", "")
+            self.month = state.get("month", "")
+            self.days = state.get("days", {})
+            self.months = state.get("months", {})
+            self.resets = state.get("resets", 0)
+            for entry in self.interfaces.values():
+                for key in PERIOD_KEYS:
+                    self.sums[key] += entry[key]
+            self.fresh = False
+            logger.info(f"已读取流量账本 {self.path}：累计上传 {format_bytes(self.sums['total_up'])}，"
+                        f"下载 {format_bytes(self.sums['total_down'])}")
+        except Exception as e:
+            broken = f"{self.path}.broken-{int(time.time())}"
+            logger.error(f"流量账本 {self.path} 无法读取({e})，已改名为 {broken} 并重新记录")
+            try:
+                os.replace(self.path, broken)
+            except OSError:
+                pass
+
+    def update(self, counters: Iterable[Tuple[str, int, int]], uptime: Optional[int], now: float = None,
+               clock: float = None) -> bool:
+        """
+        用本次采集的接口计数器更新账本
+
+        Args:
+            counters: (接口名, total_up, total_down)
+            uptime: 路由器运行时间（秒），未知或数据不是本次采集的时传入None
+            now: 当前时间戳
+            clock: 当前的单调时钟读数，默认为 time.monotonic()
+
+        Returns:
+            bool: 是否检测到路由器重启
+        """
+        now = now or time.time()
+        clock = time.monotonic() if clock is None else clock
+        local = time.localtime(now)
+        day = time.strftime("%Y-%m-%d", local)
+        with self.lock:
+            if day != self.day:
+                self.roll(day, day[:7])
+
+            rebooted = False
+            if uptime is not None and self.uptime is not None:
+                expected = self.uptime
+                if self.uptime_clock is not None:
+                    expected += max(clock - self.uptime_clock, 0)
+                rebooted = uptime < self.uptime or uptime + UPTIME_TOLERANCE < expected
+            if rebooted:
+                self.resets += 1
+                logger.info(f"路由器运行时间从 {self.uptime} 秒变为 {uptime} 秒（按单调时钟应不少于 {expected:.0f} 秒），"
+                            f"判定已重启，流量计数器从0重新累计")
+
+            sums = self.sums
+            for name, up, down in counters:
+                entry = self.interfaces.get(name)
+                if entry is None:
+                    # 新出现的接口：新账本计入已有的计数器，之后出现的接口从此刻开始累计
+                    base_up, base_down = (up, down) if self.fresh else (0, 0)
+                    self.interfaces[name] = {"counter_up": up, "counter_down": down,
+                                             "total_up": base_up, "total_down": base_down,
+                                             "day_up": 0, "day_down": 0, "month_up": 0, "month_down": 0}
+                    sums["total_up"] += base_up
+                    sums["total_down"] += base_down
+                    continue
+
+                if rebooted or up < entry["counter_up"] or down < entry["counter_down"]:
+                    delta_up, delta_down = up, down
+                else:
+                    delta_up, delta_down = up - entry["counter_up"], down - entry["counter_down"]
+                entry["counter_up"] = up
+                entry["counter_down"] = down
+                for period in ("total", "day", "month"):
+                    entry[f"{period}_up"] += delta_up
+                    entry[f"{period}_down"] += delta_down
+                    sums[f"{period}_up"] += delta_up
+                    sums[f"{period}_down"] += delta_down
+
+            if uptime is not None:
+                self.uptime = uptime
+                self.uptime_clock = clock
+            self.fresh = False
+            self.dirty = True
+            flush = rebooted or now - self.flushed_at >= self.flush_interval
+        if flush:
+            self.flush()
+        return rebooted
+
+    def roll(self, day: str, month: str):
+        """跨天（或跨月）时把已结束周期的流量移入历史，调用时已持有锁"""
+        if self.day:
+            self.days[self.day] = [self.sums["day_up"], self.sums["day_down"]]
+            for key in sorted(self.days)[:-self.history_days]:
+                del self.days[key]
+            self.reset_period("day")
+        if self.month != month:
+            if self.month:
+                self.months[self.month] = [self.sums["month_up"], self.sums["month_down"]]
+                for key in sorted(self.months)[:-self.history_months]:
+                    del self.months[key]
+                self.reset_period("month")
+            self.month = month
+        self.day = day
+        self.flushed_at = 0  # 跨天后立即写入
+
+    def reset_period(self, period: str):
+        for entry in self.interfaces.values():
+            entry[f"{period}_up"] = 0
+            entry[f"{period}_down"] = 0
+        self.sums[f"{period}_up"] = 0
+        self.sums[f"{period}_down"] = 0
+
+    def flush(self):
+        """原子地写入账本文件"""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {
+                "version": VERSION,
+                "updated": time.time(),
+                "uptime": self.uptime,
+                "uptime_clock": self.uptime_clock,
+                "boot_id": self.boot_id,
+                "day": self.day,
+                "month": self.month,
+                "resets": self.resets,
+                "interfaces": self.interfaces,
+                "days": self.days,
+                "months": self.months
+            }
+            data = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+            self.dirty = False
+            self.flushed_at = time.time()
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            # 同步目录项，确保替换本身在断电后仍然有效
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+        except Exception as e:
+            logger.error(f"写入流量账本失败: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def totals(self) -> Dict[str, int]:
+        """总流量、当天和当月的流量（所有接口之和）"""
+        with self.lock:
+            return dict(self.sums)
+
+    def summary(self) -> str:
+        """当月流量摘要，附加在上报消息中"""
+        sums = self.sums
+        return f"本月 ↑{format_bytes(sums['month_up'])} ↓{format_bytes(sums['month_down'])}"
+
+    def close(self):
+        self.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查看流量累计账本')
+    parser.add_argument('path', help='账本文件路径')
+    parser.add_argument('--json', action='store_true', help='输出原始JSON')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"账本文件不存在: {args.path}", file=sys.stderr)
+        sys.exit(1)
+    with open(args.path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if args.json:
+        print(json.dumps(state, ensure_ascii=False, indent=2))
+        return
+
+    updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state.get("updated", 0)))
+    print(f"更新时间: {updated}，检测到路由器重启 {state.get('resets', 0)} 次\n")
+    print(f"{'接口':<12}{'总上传':>12}{'总下载':>12}{'本月上传':>12}{'本月下载':>12}{'今日上传':>12}{'今日下载':>12}")
+    for name, entry in state.get("interfaces", {}).items():
+        print(f"{name:<12}" + "".join(f"{format_bytes(entry.get(key, 0)):>12}"
+                                      for key in ("total_up", "total_down", "month_up", "month_down", "day_up", "day_down")))
+    for title, history in (("每月", state.get("months", {})), ("每日", state.get("days", {}))):
+        if history:
+            print(f"\n{title}:")
+            for key in sorted(history):
+                up, down = history[key]
+                print(f"  {key}  ↑{format_bytes(up):>10}  ↓{format_bytes(down):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket permessage-deflate (RFC 7692) 压缩支持
+websocket-client 本身不实现压缩扩展，这里在握手成功后接管帧的压缩与解压
+"""
+
+import zlib
+import logging
+from typing import Dict, Optional
+from websocket import ABNF
+
+logger = logging.getLogger(__name__)
+
+# 每条压缩消息末尾固定的空块标记，发送时去掉，接收时补回
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+class PerMessageDeflate:
+    def __init__(self, client_max_window_bits: int = 15):
+        """
+        初始化permessage-deflate扩展
+
+        Args:
+            client_max_window_bits: 客户端压缩窗口大小（9-15）
+        """
+        self.client_max_window_bits = client_max_window_bits
+        self.client_no_context_takeover = False
+        self.server_no_context_takeover = False
+        self.server_max_window_bits = 15
+        self.enabled = False
+
+        self.compressor = None
+        self.decompressor = None
+        self.inflating = False  # 当前是否处于一条压缩消息的分片中
+
+    def offer_header(self) -> str:
+        """握手请求中的扩展协商头"""
+        return f"Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits={self.client_max_window_bits}"
+
+    def accept(self, headers: Optional[Dict[str, str]]) -> bool:
+        """
+        解析服务端握手响应，确认是否启用压缩
+
+        Args:
+            headers: 握手响应头（websocket-client的键为小写）
+
+        Returns:
+            bool: 服务端是否接受了permessage-deflate
+        """
+        self.enabled = False
+        extensions = (headers or {}).get("sec-websocket-extensions", "")
+        for extension in extensions.split(","):
+            params = [p.strip() for p in extension.split(";")]
+            if params[0] != "permessage-deflate":
+                continue
+
+            for param in params[1:]:
+                name, _, value = param.partition("=")
+                value = value.strip('"')
+                if name == "client_no_context_takeover":
+                    self.client_no_context_takeover = True
+                elif name == "server_no_context_takeover":
+                    self.server_no_context_takeover = True
+                elif name == "client_max_window_bits" and value:
+                    self.client_max_window_bits = int(value)
+                elif name == "server_max_window_bits" and value:
+                    self.server_max_window_bits = int(value)
+
+            self.enabled = True
+            break
+
+        self.reset()
+        return self.enabled
+
+    def reset(self):
+        """重置压缩上下文（新连接时调用）"""
+        # zlib 不支持 8 位窗口的原始deflate，按规范可以用 9 位代替
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -max(self.client_max_window_bits, 9))
+        self.decompressor = zlib.decompressobj(-max(self.server_max_window_bits, 9))
+        self.inflating = False
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        压缩一条消息
+
+        开启上下文保持时，重复的JSON键会直接引用上一条消息的内容，压缩后几乎不占空间
+        """
+        payload = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if payload.endswith(DEFLATE_TAIL):
+            payload = payload[:-len(DEFLATE_TAIL)]
+        if self.client_no_context_takeover:
+            self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -max(self.client_max_window_bits, 9))
+        return payload
+
+    def decompress(self, data: bytes, fin: bool) -> bytes:
+        """解压一个帧的数据，消息结束时补回空块标记"""
+        payload = self.decompressor.decompress(data)
+        if fin:
+            payload += self.decompressor.decompress(DEFLATE_TAIL)
+            if self.server_no_context_takeover:
+                self.decompressor = zlib.decompressobj(-max(self.server_max_window_bits, 9))
+        return payload
+
+    def build_frame(self, message: str) -> ABNF:
+        """构造压缩后的文本帧（RSV1置位）"""
+        return ABNF(1, 1, 0, 0, ABNF.OPCODE_TEXT, 1, self.compress(message.encode("utf-8")))
+
+    def install(self, sock):
+        """
+        接管WebSocket的帧接收，解压服务端发来的压缩帧
+
+        websocket-client 遇到RSV1置位的帧会直接报协议错误，
+        这里替换连接实例上的recv_frame，先解压再交给原有的校验逻辑
+
+        Args:
+            sock: websocket.WebSocket 实例（WebSocketApp.sock）
+        """
+        buffer = sock.frame_buffer
+
+        def recv_frame() -> ABNF:
+            with buffer.lock:
+                if buffer.needs_header():
+                    buffer.recv_header()
+                fin, rsv1, rsv2, rsv3, opcode, has_mask, _ = buffer.header
+
+                if buffer.needs_length():
+                    buffer.recv_length()
+                length = buffer.length
+
+                if buffer.needs_mask():
+                    buffer.recv_mask()
+                mask_value = buffer.mask_value
+
+                payload = buffer.recv_strict(length)
+                if has_mask:
+                    payload = ABNF.mask(mask_value, payload)
+                buffer.clear()
+
+            if rsv1 and opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+                self.inflating = True
+                rsv1 = 0
+            if self.inflating and opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY, ABNF.OPCODE_CONT):
+                payload = self.decompress(payload, fin)
+                if fin:
+                    self.inflating = False
+
+            frame = ABNF(fin, rsv1, rsv2, rsv3, opcode, has_mask, payload)
+            frame.validate(buffer.skip_utf8_validation)
+            return frame
+
+        buffer.recv_frame = recv_frame
+        logger.debug("WebSocket已启用permessage-deflate压缩")
+
+
+def frame_size(payload_length: int, masked: bool = True) -> int:
+    """计算帧在线路上的字节数（帧头 + 掩码 + 数据）"""
+    header = 2 + (0 if payload_length < 126 else 2 if payload_length < 65536 else 8)
+    return header + (4 if masked else 0) + payload_length